@@ -0,0 +1,57 @@
+"""
+Bounding box extraction of the annotated widgets of a sample, shared by the design and random mode.
+
+After the layout of a sample is updated, the extractor sweeps the widgets once and adds one box per widget to the annotation store of the sample
+(class ID, center x, center y, width and height, see `ui.UI`). A single coordinate area is re-used for all widgets and the size of a box
+is computed from its coordinates, so each widget costs one `get_coords` call. The class ID is looked up in the class registry (see `class_registry.py`).
+"""
+import sys
+if sys.implementation.name == "micropython":
+    import lvgl as lv
+    from ui import UI
+    from class_registry import class_id
+else:
+    import mock
+    from .mock.lvgl import lv
+    from .ui import UI
+    from .class_registry import class_id
+
+class BoxExtractor:
+    """
+    A re-usable extractor of widget bounding boxes.
+
+    **Object Attributes:**
+    - `class_ids` A dictionary of LVGL class to class ID, caching the registry lookups of the class names.
+    """
+    def __init__(self):
+        self.class_ids = {}
+        self._coords = None
+
+    def extract(self, widgets, ui: UI) -> int:
+        """
+        **Params:**
+        - `widgets` An iterable of the widgets to annotate, in annotation order. The layout of the widgets must be up to date.
+        - `ui` The annotation store, which is cleared and filled with the boxes of the widgets.
+
+        **Returns:**
+        - `int` The amount of extracted boxes.
+
+        **Raises:**
+        - `ValueError` If the class of a widget is not a known widget class.
+
+        Sweep the widgets and add their bounding boxes to the annotation store.
+        The center is `(x1 + x2) // 2` and the size `x2 - x1 + 1` of the widget coordinates (the same as `get_width` and `get_height`).
+        """
+        if self._coords is None:
+            self._coords = lv.area_t()
+        coords = self._coords
+        class_ids = self.class_ids
+        ui.clear()
+        for widget in widgets:
+            cls = widget.__class__
+            widget_class = class_ids.get(cls, None)
+            if widget_class is None:
+                widget_class = class_ids[cls] = class_id(cls.__name__)
+            widget.get_coords(coords)
+            ui.add(widget_class, (coords.x1 + coords.x2) // 2, (coords.y1 + coords.y2) // 2, coords.x2 - coords.x1 + 1, coords.y2 - coords.y1 + 1)
+        return ui.count
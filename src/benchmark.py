@@ -0,0 +1,140 @@
+"""
+Benchmark of the generation pipeline, which measures the time per sample and per stage (see `profiler.stages`) of fixed-seed workloads.
+
+A benchmark run uses a single display, so all workloads of a run share the display size:
+- Random workloads: every combination of the widget counts and layouts, using the random mode at the display size.
+- Design workloads: the design files, which must match the display size.
+
+The results are written as JSON:
+
+```json
+{"display": [640, 640], "samples": 3, "seed": 0, "driver_init_ms": 12.5,
+ "workloads": {"random-none-10": {"mode": "random", "samples": 3, "widgets": 9.3, "ms_per_sample": 85.1, "heap_peak": 123456,
+                                  "stages": {"widget_creation": {"total_ms": 3.2, "count": 30, "ms_per_sample": 1.07}, ...}}}}
+```
+
+The `benchmark` task of `tasks.py` runs one benchmark per display size (random workloads and each design in `designs/`), merges the results and compares them to a baseline.
+"""
+import sys
+if sys.implementation.name == "micropython":
+    import argparse
+    import json
+    import random
+    import lvgl as lv
+    from display_driver_utils import driver
+    from profiler import profiler, ticks_us, ticks_diff
+    from seeding import derive_seed
+    from random_ui import RandomUI
+    from design_template import DesignTemplate
+    from main import generate_sample
+else:
+    import mock
+    import argparse
+    import json
+    import random
+    from .mock.lvgl import lv
+    from .mock.display import driver
+    from .profiler import profiler, ticks_us, ticks_diff
+    from .seeding import derive_seed
+    from .random_ui import RandomUI
+    from .design_template import DesignTemplate
+    from .main import generate_sample
+
+default_widget_types = ['arc', 'bar', 'button', 'buttonmatrix', 'calendar', 'checkbox', 'dropdown', 'label', 'roller', 'scale', 'slider', 'spinbox', 'switch', 'table', 'textarea']
+"""The widget types of the random workloads"""
+
+def run_workload(mode: str, generator, samples: int, seed: int, output_file: str, idle_screen: lv.obj) -> dict:
+    """
+    **Params:**
+    - `mode` The mode of the generator (`design` or `random`).
+    - `generator` The `DesignTemplate` or `RandomUI` object of the workload.
+    - `samples` The amount of measured samples.
+    - `seed` The base seed, each sample is seeded with a seed derived from the base seed and its index (see `seeding.derive_seed`).
+    - `output_file` The file path of the screenshots, which is overwritten by each sample.
+    - `idle_screen` The screen which is loaded while a sample screen is deleted.
+
+    **Returns:**
+    - `dict` The result of the workload: `mode`, `samples`, `widgets` (average annotated widgets), `ms_per_sample`, `heap_peak` (only if the LVGL heap can be measured, see `Profiler.sample_heap`) and `stages` (see `Profiler.results`).
+
+    Generate the samples of a workload like `main.generate_sample` and measure them.
+    """
+    profiler.reset()
+    widgets = 0
+    elapsed = 0
+    for index in range(samples):
+        random.seed(derive_seed(seed, index))
+        start = ticks_us()
+        sample_ui = generate_sample(mode, generator, output_file, False, idle_screen)
+        elapsed += ticks_diff(ticks_us(), start)
+        widgets += sample_ui.count
+    result = {'mode': mode, 'samples': samples, 'widgets': widgets / samples, 'ms_per_sample': elapsed / 1000 / samples, 'stages': profiler.results(samples)}
+    if profiler.heap_peak is not None:
+        result['heap_peak'] = profiler.heap_peak
+    return result
+
+def run_benchmark(width: int, height: int, widget_counts: list, layouts: list, design_files: list, samples: int = 3, seed: int = 0, output_file: str = 'benchmark.jpg') -> dict:
+    """
+    **Params:**
+    - `width` The width of the display.
+    - `height` The height of the display.
+    - `widget_counts` The widget counts of the random workloads.
+    - `layouts` The layouts of the random workloads.
+    - `design_files` The design files of the design workloads.
+    - `samples` The amount of measured samples per workload.
+    - `seed` The base seed of all workloads.
+    - `output_file` The file path of the screenshots, which is overwritten by each sample.
+
+    **Returns:**
+    - `dict` The results of the benchmark (see the module documentation).
+
+    **Raises:**
+    - `ValueError` If the window size of a design file does not match the display size.
+
+    Create the display and run all workloads.
+    """
+    profiler.enabled = True
+    profiler.track_heap = True
+    start = profiler.start()
+    driver(width=width, height=height)
+    profiler.stop('driver_init', start)
+    results = {'display': [width, height], 'samples': samples, 'seed': seed, 'driver_init_ms': profiler.results()['driver_init']['total_ms'], 'workloads': {}}
+    idle_screen = lv.screen_active()
+    for layout in layouts:
+        for widget_count in widget_counts:
+            name = f'random-{layout}-{widget_count}'
+            print(f'Benchmark: {name}')
+            generator = RandomUI(width, height, widget_count, default_widget_types, output_file, layout, create_driver=False)
+            results['workloads'][name] = run_workload('random', generator, samples, seed, output_file, idle_screen)
+    for design_file in design_files:
+        name = 'design-' + design_file[design_file.rfind('/') + 1:].replace('.json', '')
+        print(f'Benchmark: {name}')
+        generator = DesignTemplate(design_file)
+        if generator.width != width or generator.height != height:
+            raise ValueError(f'Design size {generator.width}x{generator.height} of {design_file} does not match the display size {width}x{height}')
+        results['workloads'][name] = run_workload('design', generator, samples, seed, output_file, idle_screen)
+    profiler.enabled = False
+    return results
+
+def parse_args():
+    """
+    **Returns:**
+    - `args.Namespace` The parsed arguments of the benchmark.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the generation pipeline.')
+    parser.add_argument('-W', '--width', dest='width', type=int, default=640, help='the width of the display')
+    parser.add_argument('-H', '--height', dest='height', type=int, default=640, help='the height of the display')
+    parser.add_argument('-c', '--widget-counts', dest='widget_counts', type=int, nargs='*', default=[], help='the widget counts of the random workloads')
+    parser.add_argument('-l', '--layouts', dest='layouts', type=str, nargs='*', default=[], help='the layouts of the random workloads')
+    parser.add_argument('-f', '--designs', dest='designs', type=str, nargs='*', default=[], help='the design files of the design workloads (must match the display size)')
+    parser.add_argument('-s', '--samples', dest='samples', type=int, default=3, help='the number of measured samples per workload')
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help='the base seed of all workloads')
+    parser.add_argument('-o', '--output', dest='output', type=str, default='benchmark.json', help='the JSON file to write the results to')
+    parser.add_argument('--screenshot', dest='screenshot', type=str, default='benchmark.jpg', help='the screenshot file, which is overwritten by each sample')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_benchmark(int(args.width), int(args.height), [int(count) for count in args.widget_counts], args.layouts, args.designs, int(args.samples), int(args.seed), args.screenshot)
+    with open(args.output, 'w') as f:
+        json.dump(results, f)
+    print(f'Benchmark results written to {args.output}')
@@ -6,9 +6,19 @@ The script can convert binary image data to JPEG images.
 The script requires the width and height of the image to be provided as arguments.
 
 The binary image file should contain the raw pixel data of the image (i.e. bytes representing the pixel values, no headers).
+
+Multiple binary image files can be converted in one run by providing a glob pattern (`-g`), the files are then converted by a pool of worker processes.
+
+In watch mode (`-w`), the script runs as an encoding sidecar of the generator (`--format bin`): the spool directory is polled for new raw snapshots,
+which are converted by the pool of worker processes and removed afterwards. Annotations (`.txt`) next to the snapshots are moved to the output directory.
 """
 
 import argparse
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from PIL import Image
 
@@ -21,11 +31,20 @@ def parse_args():
     parser.add_argument('-H', '--height', type=int, required=True, help='Height of the image.')
     parser.add_argument('-i', '--input', type=str, default='screenshot.bin', help='Input file name.')
     parser.add_argument('-o', '--output', type=str, default='screenshot.jpg', help='Output file name.')
+    parser.add_argument('-g', '--glob', type=str, default=None, help='Glob pattern of input files to convert in batch mode (e.g. "dumps/*.bin"), overrides the input file.')
+    parser.add_argument('-d', '--output-dir', type=str, default=None, help='Output directory in batch mode (default is the directory of each input file).')
+    parser.add_argument('-e', '--extension', type=str, default='.jpg', help='Output file extension in batch mode, which determines the image format.')
+    parser.add_argument('-w', '--watch', type=str, default=None, help='Spool directory to watch for raw snapshots (*.bin) of the generator, which are converted and removed (sidecar mode).')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='Interval in seconds to poll the spool directory in watch mode.')
+    parser.add_argument('--idle-timeout', type=float, default=None, help='Stop watching after this many seconds without new snapshots (default is to watch until interrupted).')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes in batch mode.')
     return parser.parse_args()
 
 def rgb565_to_rgb888(rgb565):
     """
     Convert RGB565 pixel data to RGB888 pixel data.
+
+    Works on single pixel values as well as on whole NumPy arrays of pixel values.
     """
     # Mask out the components
     r = (rgb565 & 0xF800) >> 11
@@ -37,6 +56,121 @@ def rgb565_to_rgb888(rgb565):
     b = (b * 255) // 31
     return r, g, b
 
+def convert_raw(raw_data: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Convert raw image data (RGB565 or BGR888 bytes as a flat uint8 array) to an RGB888 array of shape (height, width, 3).
+
+    The format of the data is determined based on its size.
+    """
+    # Determine whether the data is RGB565 or RGB888 based on its size
+    expected_size_565 = width * height * 2  # 2 bytes per pixel for RGB565
+    expected_size_888 = width * height * 3  # 3 bytes per pixel for RGB888
+
+    if len(raw_data) == expected_size_565:
+        image_data_565 = raw_data.view(np.uint16).reshape((height, width))
+        return np.stack(rgb565_to_rgb888(image_data_565), axis=-1).astype(np.uint8)
+    elif len(raw_data) == expected_size_888:
+        bgr888_data = raw_data.reshape((height, width, 3))
+        return bgr888_data[..., ::-1]
+    raise ValueError(f"The size ({len(raw_data)}) of the raw data does not match expected sizes for RGB565 ({expected_size_565}) or RGB888 ({expected_size_888}).")
+
+def convert_file(input_file: str, output_file: str, width: int, height: int) -> str:
+    """
+    Convert a binary image file to an image file, the format is determined by the extension of the output file.
+
+    The input file is memory-mapped instead of read into memory.
+    """
+    raw_data = np.memmap(input_file, dtype=np.uint8, mode='r')
+    Image.fromarray(convert_raw(raw_data, width, height), 'RGB').save(output_file)
+    return output_file
+
+def batch_output_file(input_file: str, output_dir: str, extension: str) -> str:
+    """
+    Create the output file name of an input file in batch mode.
+    """
+    name = os.path.splitext(os.path.basename(input_file))[0] + extension
+    return os.path.join(output_dir if output_dir else os.path.dirname(input_file), name)
+
+def convert_batch(input_files: list[str], output_dir: str, extension: str, width: int, height: int, jobs: int) -> int:
+    """
+    Convert multiple binary image files using a pool of worker processes.
+
+    Returns the amount of converted files.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    output_files = [batch_output_file(input_file, output_dir, extension) for input_file in input_files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        converted = pool.map(convert_file, input_files, output_files, [width] * len(input_files), [height] * len(input_files), chunksize=max(1, len(input_files) // (jobs * 4)))
+        return sum(1 for _ in converted)
+
+def convert_spooled(input_file: str, output_file: str, width: int, height: int) -> str:
+    """
+    Convert a raw snapshot of the spool directory and remove it afterwards.
+
+    If the output file is written to another directory, the annotation of the snapshot (`.txt`) is moved there as well.
+    """
+    convert_file(input_file, output_file, width, height)
+    label_file = os.path.splitext(input_file)[0] + '.txt'
+    output_label_file = os.path.splitext(output_file)[0] + '.txt'
+    if label_file != output_label_file and os.path.exists(label_file):
+        shutil.move(label_file, output_label_file)
+    os.remove(input_file)
+    return output_file
+
+def collect_spooled(input_file: str, future) -> bool:
+    """
+    Collect the result of the conversion of a raw snapshot of the spool directory.
+
+    A failed snapshot is logged and renamed to `<name>.bin.failed`, so it is not picked up again and the watcher keeps running.
+
+    Returns whether the snapshot was converted.
+    """
+    try:
+        future.result()
+        return True
+    except Exception as e:
+        print(f"Failed to convert {input_file}: {e!r}")
+        if os.path.exists(input_file):
+            os.replace(input_file, input_file + '.failed')
+        return False
+
+def watch(spool_dir: str, output_dir: str, extension: str, width: int, height: int, jobs: int, poll_interval: float = 0.1, idle_timeout: float = None) -> int:
+    """
+    Watch a spool directory and convert all raw snapshots (`*.bin`) written to it using a pool of worker processes.
+
+    The generator writes the snapshots as `<name>.bin.part` and renames them when complete, so only complete snapshots are picked up.
+    Snapshots which fail to convert are renamed to `<name>.bin.failed` (see `collect_spooled`).
+    Watching stops on a keyboard interrupt or after `idle_timeout` seconds without new snapshots, once all pending conversions are done.
+
+    Returns the amount of converted files.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    pending = {}
+    count = 0
+    last_activity = time.monotonic()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        try:
+            while True:
+                for input_file in sorted(glob.glob(os.path.join(spool_dir, '*.bin'))):
+                    if input_file not in pending:
+                        pending[input_file] = pool.submit(convert_spooled, input_file, batch_output_file(input_file, output_dir, extension), width, height)
+                        last_activity = time.monotonic()
+                for input_file in [input_file for input_file, future in pending.items() if future.done()]:
+                    if collect_spooled(input_file, pending.pop(input_file)):
+                        count += 1
+                if not pending and idle_timeout is not None and time.monotonic() - last_activity > idle_timeout:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print("Interrupted, finishing pending conversions...")
+        for input_file, future in pending.items():
+            if collect_spooled(input_file, future):
+                count += 1
+    return count
+
 def main():
     """
     Main function for the script.
@@ -45,39 +179,26 @@ def main():
     If the data is in RGB565 format, it converts it to RGB888 format.
 
     The script then creates a Pillow image from the pixel data and saves it as a JPEG image.
+
+    In batch mode, all files matching the glob pattern are converted.
+    In watch mode, raw snapshots are converted as they are written to the spool directory.
     """
     args = parse_args()
 
-    # Constants for image dimensions
-    WIDTH, HEIGHT = args.width, args.height
-
-    # Load the raw image data from the file
-    with open(args.input, 'rb') as file:
-        raw_data = file.read()
-
-    # Determine whether the data is RGB565 or RGB888 based on its size
-    expected_size_565 = WIDTH * HEIGHT * 2  # 2 bytes per pixel for RGB565
-    expected_size_888 = WIDTH * HEIGHT * 3  # 3 bytes per pixel for RGB888
-
-    if len(raw_data) == expected_size_565:
-        print("Converting RGB565 to RGB888...")
-        image_data_565 = np.frombuffer(raw_data, dtype=np.uint16).reshape((HEIGHT, WIDTH))
-        rgb888_data = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
-        for y in range(HEIGHT):
-            for x in range(WIDTH):
-                rgb888_data[y, x] = rgb565_to_rgb888(image_data_565[y, x])
-    elif len(raw_data) == expected_size_888:
-        print("Assuming RGB888 and converting to JPEG...")
-        bgr888_data = np.frombuffer(raw_data, dtype=np.uint8).reshape((HEIGHT, WIDTH, 3))
-        rgb888_data = bgr888_data[..., ::-1]
-    else:
-        raise ValueError(f"The size ({len(raw_data)}) of the raw data does not match expected sizes for RGB565 ({expected_size_565}) or RGB888 ({expected_size_888}).")
+    if args.watch:
+        print(f"Watching {args.watch} for raw snapshots using {args.jobs} processes...")
+        count = watch(args.watch, args.output_dir, args.extension, args.width, args.height, args.jobs, args.poll_interval, args.idle_timeout)
+        print(f"Watching stopped. {count} images saved.")
+        return
 
-    # Create the image using Pillow
-    img = Image.fromarray(rgb888_data, 'RGB')
+    if args.glob:
+        input_files = sorted(glob.glob(args.glob))
+        print(f"Converting {len(input_files)} files using {args.jobs} processes...")
+        count = convert_batch(input_files, args.output_dir, args.extension, args.width, args.height, args.jobs)
+        print(f"Conversion completed. {count} images saved.")
+        return
 
-    # Save the image
-    img.save(args.output)
+    convert_file(args.input, args.output, args.width, args.height)
     print(f"Conversion completed. Image saved as {args.output}.")
 
 if __name__ == '__main__':
@@ -0,0 +1,47 @@
+"""
+The registry of integer class IDs of the annotated widgets, which are written as class labels of the YOLO annotations.
+
+The class ID of a widget type is its index in `global_definitions.widget_types` (all LVGL widget types, a superset of `implemented_types`),
+so the IDs do not depend on the widget types of a run and are the same for every dataset. New widget types must therefore only be appended to that list.
+Widgets are looked up by the name of their LVGL class, which is the widget type except for the classes in `lvgl_class_types`.
+"""
+import sys
+if sys.implementation.name == "micropython":
+    from global_definitions import widget_types
+else:
+    from .global_definitions import widget_types
+
+class_names = widget_types
+"""The class names, indexed by class ID"""
+
+lvgl_class_types = {'msgbox': 'messagebox', 'win': 'window'}
+"""A mapping of the LVGL class names, which differ from their widget type, to the widget type"""
+
+class_ids = dict([(name, class_id) for class_id, name in enumerate(class_names)] + [(lvgl_class, class_names.index(widget_type)) for lvgl_class, widget_type in lvgl_class_types.items()])
+"""A mapping of widget types and LVGL class names to class IDs"""
+
+def class_id(name: str) -> int:
+    """
+    **Params:**
+    - `name` The widget type or LVGL class name of a widget.
+
+    **Returns:**
+    - `int` The class ID of the widget.
+
+    **Raises:**
+    - `ValueError` If the name is not a known widget class.
+    """
+    registered = class_ids.get(name, None)
+    if registered is None:
+        raise ValueError(f'Unknown widget class: {name} (valid options: {",".join(class_names)})')
+    return registered
+
+def write_class_names(output_file: str):
+    """
+    **Params:**
+    - `output_file` The file path to write the class names to.
+
+    Write the class names in the order of their IDs, one per line (`classes.txt` of YOLO datasets).
+    """
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(class_names) + '\n')
@@ -17,6 +17,7 @@ def process_design_arguments(parser: argparse.ArgumentParser, print_help: bool =
         parser.usage(True)
         sys.exit(0)
     args = parser.parse_args()
+    require_output_file(parser, args)
     return args
 
 def process_generator_arguments(parser: argparse.ArgumentParser, print_help: bool = False):
@@ -36,12 +37,45 @@ def process_generator_arguments(parser: argparse.ArgumentParser, print_help: boo
     parser.add_argument('-t', '--widget_types', type=str, nargs='+', required=True, help='A list of widget types')
     parser.add_argument('-l', '--layout', type=str, required=True, help='the layout option')
     parser.add_argument('--random-state', action='store_true', help='Use a random state for each created widget (experimental)')
+    parser.add_argument('--spatial-map', dest='spatial_map', type=str, default='free', help='the spatial map used to place widgets in layout none (free, grid or linear)')
     if print_help:
         parser.usage(True)
         sys.exit(0)
     args = parser.parse_args()
+    require_output_file(parser, args)
     return args
 
+def process_server_arguments(parser: argparse.ArgumentParser, print_help: bool = False):
+    """
+    **Params:**
+    - `parser` The parser object to process the arguments with.
+    - `print_help` A flag to determine if the help message for this mode should be printed. Default is False.
+
+    **Returns:**
+    - `args.Namespace` The parsed arguments for the server mode, including the initial general arguments.
+
+    Process the arguments for the server mode subparser.
+    The display size is fixed for the lifetime of the server, jobs are read from stdin (see `main.serve`).
+    """
+    parser.add_argument('-W', '--width', type=int, default=640, help='the width of the display')
+    parser.add_argument('-H', '--height', type=int, default=640, help='the height of the display')
+    if print_help:
+        parser.usage(True)
+        sys.exit(0)
+    args = parser.parse_args()
+    return args
+
+def require_output_file(parser: argparse.ArgumentParser, args):
+    """
+    **Params:**
+    - `parser` The parser object the arguments were parsed with.
+    - `args` The parsed arguments.
+
+    Exit with an error if no output file was provided. (The output file is only optional in server mode, when writing shards and in a heap check)
+    """
+    if args.output_file is None and args.shard is None and not args.heap_check:
+        parser.error('argument -o/--output_file (or --shard) is required')
+
 def process_arguments():
     """
     **Returns:**
@@ -54,7 +88,18 @@ def process_arguments():
     parser.add_argument('-m', '--mode', type=str, help='the mode to run the program in')
     parser.add_argument('-?', '--usage', required=False, action='store_true', help='Print usage information for that mode.')
     parser.add_argument('-n', '--normalize', action='store_true', help='normalize the bounding boxes')
-    parser.add_argument('-o', '--output_file', type=str, required=True, help='The output file (screenshot)')
+    parser.add_argument('-o', '--output_file', type=str, default=None, help='The output file (screenshot), required in design and random mode unless shards are written')
+    parser.add_argument('-b', '--batch', '--count', '--samples', dest='count', type=int, default=1, help='the number of samples to generate in one run (output files are numbered)')
+    parser.add_argument('--start-index', dest='start_index', type=int, default=None, help='the index of the first sample, used for numbering the output files')
+    parser.add_argument('--seed', dest='seed', type=int, default=None, help='the base seed, each sample is seeded with a seed derived from the base seed and its index (random if not provided)')
+    parser.add_argument('--shard', dest='shard', type=str, default=None, help='write the samples into tar shards with this path prefix instead of single files (see shards.py)')
+    parser.add_argument('--shard-size', dest='shard_size', type=int, default=1000, help='the maximum number of samples per shard')
+    parser.add_argument('--style-budget', dest='style_budget', type=int, default=262144, help='the memory budget of cached style objects in bytes (estimated LVGL heap usage)')
+    parser.add_argument('--crops', dest='crops', action='store_true', help='crop mode: annotate pixel bounding boxes to extract every widget as its own image with crop_extractor.py (overrides --normalize)')
+    parser.add_argument('--pipeline', dest='pipeline', type=int, default=0, help='the number of snapshot buffers of the encode pipeline, screenshots are written by a worker thread while the next samples are built (0 disables the pipeline)')
+    parser.add_argument('--manifest', dest='manifest', type=str, default=None, help='append the annotations of all samples to this JSON Lines file instead of writing a .txt file per sample (see yolo.LabelManifest)')
+    parser.add_argument('--heap-check', dest='heap_check', type=int, default=0, help='only create and clean up this number of samples and check that the LVGL heap (or object count) returns to its baseline (no files are written)')
+    parser.add_argument('--format', dest='image_format', type=str, default=None, help='the output format of the screenshot (jpg, png, npy or bin), inferred from the output file extension by default')
     # NOTE Micropythons argparse is very limited and does not support groups, which is why this is a bit of a workaround
     args = parser.parse_known_args()[0] # NOTE Parse initially to determine mode and then parse again with the correct mode
 
@@ -62,7 +107,9 @@ def process_arguments():
         return process_design_arguments(parser, args.usage)
     elif args.mode == 'random':
         return process_generator_arguments(parser, args.usage)
-    raise ValueError('Invalid mode argument provided. Please provide either "design" or "random" as the mode.')
+    elif args.mode == 'server':
+        return process_server_arguments(parser, args.usage)
+    raise ValueError('Invalid mode argument provided. Please provide either "design", "random" or "server" as the mode.')
 
 if __name__ == "__main__":
     args = process_arguments()
@@ -0,0 +1,130 @@
+"""
+A script to extract the widgets of generated samples as single images, e.g. for training widget classifiers.
+
+Every sample is rendered once: the generator writes the screenshot of the whole UI and its annotation with pixel bounding boxes (crop mode, `--crops`).
+This script slices the bounding box of every annotated widget out of the screenshot, so one render gives one training image per widget.
+
+The crops are written in the ImageFolder layout (`<output dir>/<class>/<sample>_<index>.png`), the class label is the directory name (the class name of the class ID, see `class_registry.py`).
+With a fixed crop size (`-s`), all crops of a screenshot are resampled in a single vectorized NumPy operation.
+
+Screenshots can be NumPy files (`.npy`, memory-mapped), raw snapshots (`.bin`, requires the width and height) or images readable by Pillow.
+"""
+
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from bin_to_jpg_conversion import convert_raw
+from global_definitions import widget_types as class_names # NOTE The class IDs of the annotations are indices of the widget types (see class_registry.py)
+
+def parse_args():
+    """
+    Parse command line arguments for the script.
+    """
+    parser = argparse.ArgumentParser(description='Extract the annotated widgets of generated screenshots as single images.')
+    parser.add_argument('-g', '--glob', type=str, required=True, help='Glob pattern of the screenshots (e.g. "dataset/*.npy"), the annotation is read from the .txt file next to each screenshot.')
+    parser.add_argument('-o', '--output-dir', type=str, default='crops', help='Output directory, crops are written to a sub-directory per class.')
+    parser.add_argument('-p', '--padding', type=int, default=0, help='Padding around each bounding box in pixels (clipped to the screenshot).')
+    parser.add_argument('-s', '--size', type=int, default=None, help='Resample all crops to this square size (e.g. 64), default is to keep the size of the bounding boxes.')
+    parser.add_argument('-W', '--width', type=int, default=None, help='Width of raw (.bin) screenshots.')
+    parser.add_argument('-H', '--height', type=int, default=None, help='Height of raw (.bin) screenshots.')
+    parser.add_argument('-e', '--extension', type=str, default='.png', help='File extension of the crops, which determines the image format.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    return parser.parse_args()
+
+def load_frame(input_file: str, width: int = None, height: int = None) -> np.ndarray:
+    """
+    Load a screenshot as an RGB888 array of shape (height, width, 3).
+    """
+    extension = os.path.splitext(input_file)[1].lower()
+    if extension == '.npy':
+        return np.load(input_file, mmap_mode='r')
+    if extension == '.bin':
+        if width is None or height is None:
+            raise ValueError(f'The width and height are required to load raw screenshots: {input_file}')
+        return convert_raw(np.memmap(input_file, dtype=np.uint8, mode='r'), width, height)
+    return np.asarray(Image.open(input_file).convert('RGB'))
+
+def read_boxes(label_file: str) -> tuple[list[str], np.ndarray]:
+    """
+    Read an annotation file with pixel bounding boxes (`<class ID> <center x> <center y> <width> <height>` per line).
+
+    Returns the class names and the boxes as an integer array of shape (N, 4) with the columns x1, y1, x2, y2 (exclusive).
+    """
+    classes = []
+    values = []
+    with open(label_file, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            classes.append(class_names[int(parts[0])] if parts[0].isdigit() else parts[0])
+            values.append([float(value) for value in parts[1:]])
+    if any(value != int(value) for row in values for value in row):
+        raise ValueError(f'The annotation contains normalized bounding boxes, generate the samples with pixel bounding boxes (--crops): {label_file}')
+    centers = np.array(values, dtype=np.int64).reshape(-1, 4)
+    x1 = centers[:, 0] - (centers[:, 2] - 1) // 2 # NOTE The generator annotates the center as (x1 + x2) // 2
+    y1 = centers[:, 1] - (centers[:, 3] - 1) // 2
+    return classes, np.stack([x1, y1, x1 + centers[:, 2], y1 + centers[:, 3]], axis=1)
+
+def pad_boxes(boxes: np.ndarray, padding: int, width: int, height: int) -> np.ndarray:
+    """
+    Add padding to the boxes and clip them to the screenshot.
+    """
+    padded = boxes + np.array([-padding, -padding, padding, padding])
+    return np.clip(padded, 0, [width, height, width, height])
+
+def crop_boxes(frame: np.ndarray, boxes: np.ndarray, size: int = None) -> list[np.ndarray] | np.ndarray:
+    """
+    Crop the boxes out of a screenshot.
+
+    Without a size, a list of views into the screenshot is returned (no pixel data is copied).
+    With a size, all crops are resampled (nearest neighbor) to size x size pixels by a single gather and returned as an array of shape (N, size, size, 3).
+    """
+    if size is None:
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+    steps = (np.arange(size) + 0.5) / size
+    xs = (boxes[:, 0:1] + steps * (boxes[:, 2:3] - boxes[:, 0:1])).astype(np.int64)
+    ys = (boxes[:, 1:2] + steps * (boxes[:, 3:4] - boxes[:, 1:2])).astype(np.int64)
+    return np.asarray(frame)[ys[:, :, None], xs[:, None, :]]
+
+def extract_file(input_file: str, output_dir: str, padding: int, size: int, width: int, height: int, extension: str) -> int:
+    """
+    Extract the crops of a single screenshot and write them to the class directories.
+
+    Returns the amount of written crops.
+    """
+    label_file = os.path.splitext(input_file)[0] + '.txt'
+    classes, boxes = read_boxes(label_file)
+    frame = load_frame(input_file, width, height)
+    boxes = pad_boxes(boxes, padding, frame.shape[1], frame.shape[0])
+    valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+    crops = crop_boxes(frame, boxes[valid], size)
+    classes = [label for label, keep in zip(classes, valid) if keep]
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    for index, (label, crop) in enumerate(zip(classes, crops)):
+        class_dir = os.path.join(output_dir, label)
+        os.makedirs(class_dir, exist_ok=True)
+        Image.fromarray(np.ascontiguousarray(crop), 'RGB').save(os.path.join(class_dir, f'{name}_{index:03d}{extension}'))
+    return len(classes)
+
+def main():
+    """
+    Main function for the script.
+
+    All screenshots matching the glob pattern are processed by a pool of worker processes.
+    """
+    args = parse_args()
+    input_files = sorted(glob.glob(args.glob))
+    print(f"Extracting crops of {len(input_files)} screenshots using {args.jobs} processes...")
+    os.makedirs(args.output_dir, exist_ok=True)
+    count = len(input_files)
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        crops = pool.map(extract_file, input_files, [args.output_dir] * count, [args.padding] * count, [args.size] * count, [args.width] * count, [args.height] * count, [args.extension] * count, chunksize=max(1, count // (args.jobs * 4)))
+        total = sum(crops)
+    print(f"Extraction completed. {total} crops saved to {args.output_dir}.")
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,9 @@ if sys.implementation.name == "micropython":
     from ui import UI
     from widget import *
     from global_definitions import widget_types
+    from style_cache import default_style_cache
+    from profiler import profiler
+    from bbox import BoxExtractor
 else:
     import mock
     import random
@@ -16,6 +19,9 @@ else:
     from .ui import UI
     from .widget import *
     from .global_definitions import widget_types
+    from .style_cache import default_style_cache
+    from .profiler import profiler
+    from .bbox import BoxExtractor
 
 class UiLoader:
     """
@@ -32,19 +38,24 @@ class UiLoader:
     - `data` The JSON data loaded from the file.
     - `ui` The 'ui' object from the JSON data.
     - `widgets` A dictionary to store references to created widgets.
-    - `styles` A dictionary to store references to created styles.
+    - `type_counts` A dictionary of widget type to the amount of created widgets of that type, used to create IDs.
+    - `reserved_ids` A set of the explicit IDs in the design, which are never used as created IDs.
+    - `styles` A dictionary of style names to their style cache keys and selectors.
+    - `style_cache` The cache of style objects, shared with other generators by default (see `style_cache.StyleCache`).
     - `width` The width of the screen.
     - `height` The height of the screen.
     - `title` The title of the window (not used, reference for author).
     - `screen` The display driver object.
     - `root_widget` The root widget object of the UI.
+    - `box_extractor` The bounding box extractor of the annotated widgets (see `bbox.BoxExtractor`).
+    - `annotations` The annotation store of the UI, which is re-used for every created UI (see `get_ui`).
     """
     special_types = ["container", "random"]
     valid_types = special_types + widget_types
     valid_layouts = ["none", "grid", "flex"]
     valid_flow = ["row", "column", "row_wrap", "column_wrap", "row_reverse", "column_reverse"]
     _options = "options"
-    def __init__(self, json_file: str):
+    def __init__(self, json_file: str, style_cache = None):
         # Load JSON data
         self.data = self.load_json_file(json_file)
         if "ui" not in self.data or type(self.data["ui"]) is not dict:
@@ -52,7 +63,12 @@ class UiLoader:
         self.ui = self.data["ui"]
         # Create a dictionary to store references to created widgets
         self.widgets = {}
+        self.type_counts = {}
+        self.reserved_ids = set()
         self.styles = {}
+        self.style_cache = style_cache if style_cache is not None else default_style_cache
+        self.box_extractor = BoxExtractor()
+        self.annotations = UI()
 
     @staticmethod
     def load_json_file(filepath: str):
@@ -68,8 +84,11 @@ class UiLoader:
         with open(filepath, 'r') as file:
             return json.load(file)
     
-    def initialize_screen(self):
+    def initialize_screen(self, create_driver: bool = True):
         """
+        **Params:**
+        - `create_driver` A flag to determine if the display driver should be created. Disable it if a display of the same size already exists.
+
         **Returns:**
         - `driver` The display driver object.
 
@@ -90,7 +109,10 @@ class UiLoader:
         self.height = self.ui["window"]["height"]
         if "title" in self.ui["window"]:
             self.title = self.ui["window"]["title"] # FIXME window title is not used
-        self.screen = driver(width=self.width, height=self.height)
+        if create_driver:
+            start = profiler.start()
+            self.screen = driver(width=self.width, height=self.height)
+            profiler.stop('driver_init', start)
 
     def parse_ui(self):
         """
@@ -98,15 +120,36 @@ class UiLoader:
         - `ValueError` If the `root` JSON property is missing or invalid.
 
         Parse the UI elements under the `root` object of the JSON data.
+        The loader can parse the UI multiple times (batch mode), references of previously created widgets are discarded on each call.
         """
         if "root" not in self.ui or type(self.ui["root"]) is not dict:
             raise ValueError(f"UI must have 'root' property of type dict: {self.ui}")
+        self.widgets = {}
+        self.type_counts = {}
+        self.reserved_ids = self.collect_ids(self.ui["root"])
         self.root_widget = self.parse_element(self.ui["root"])
         self.root_widget.set_parent(lv.screen_active())
         # NOTE The below can be accomplished by setting the width and height of the root widget via style properties
         self.root_widget.set_width(self.width)
         self.root_widget.set_height(self.height)
 
+    @staticmethod
+    def collect_ids(element, ids: set = None) -> set:
+        """
+        **Params:**
+        - `element` The JSON element to collect the IDs of.
+        - `ids` The set to add the IDs to, a new set is created if not provided.
+
+        **Returns:**
+        - `set` The explicit IDs of the element and all of its children.
+        """
+        ids = ids if ids is not None else set()
+        if element.get("id", None) is not None:
+            ids.add(element["id"])
+        for child in element.get("children", []):
+            UiLoader.collect_ids(child, ids)
+        return ids
+
     def parse_element(self, element):
         """
         **Params:**
@@ -169,37 +212,86 @@ class UiLoader:
             widget.set_width(element['width'])
         if 'height' in element:
             widget.set_height(element['height'])
-        # Create a unique ID for the widget if it wasn't provided
-        if "id" not in element:
-            # Count types of the widget
-            count = sum([1 for w in self.widgets.values() if type(w) == type(widget)])
+        self.register_widget(element.get("id", None), widget_type, widget)
+        return widget
+
+    def register_widget(self, id, widget_type: str, widget):
+        """
+        **Params:**
+        - `id` The explicit ID of the widget or `None` to create one.
+        - `widget_type` The type of the widget.
+        - `widget` The created widget object.
+
+        **Returns:**
+        - `str` The ID of the widget.
+
+        **Raises:**
+        - `ValueError` If the specified `id` already exists in previously created widgets.
+        - `ValueError` If the specified `id` is not in `reserved_ids`.
+
+        Store a reference to a created widget under its ID, creating a unique ID for the widget if it wasn't provided.
+        Created IDs are numbered per widget type (`<type>_<count>`), skipping numbers whose ID is reserved by an explicit ID of the design or already taken.
+        Explicit IDs must have been collected into `reserved_ids` before the UI is parsed, otherwise a created ID could take the ID before its widget is created.
+        """
+        count = self.type_counts.get(widget_type, 0)
+        if id is None:
             id = f"{widget_type}_{count}"
-            self.widgets[id] = widget
-            print(f"Created widget '{id}': {element}")
-        elif element["id"] in self.widgets:
-            raise ValueError(f"Widget with ID '{element['id']}' already exists. IDs must be unique.")
+            while id in self.reserved_ids or id in self.widgets:
+                count += 1
+                id = f"{widget_type}_{count}"
         else:
-            self.widgets[element["id"]] = widget
-            print(f"Created widget '{element['id']}': {element}")
-        return widget
+            if id not in self.reserved_ids:
+                raise ValueError(f"Explicit ID '{id}' is not reserved, the reserved IDs must be collected before parsing the UI")
+            if id in self.widgets:
+                raise ValueError(f"Widget with ID '{id}' already exists. IDs must be unique.")
+        self.type_counts[widget_type] = count + 1
+        self.widgets[id] = widget
+        print(f"Created widget '{id}' ({widget_type})")
+        return id
 
 # NOTE ------------ SPECIAL CREATION METHODS ------------
 
-    def create_container(self, element) -> lv.obj:
+    def create_container(self, element, layout: tuple = None) -> lv.obj:
         """
         **Params:**
         - `element` The JSON element to create the container widget from.
+        - `layout` The resolved layout of the container (see `resolve_container`), resolved from the element if not provided.
 
         **Returns:**
         - `lv.obj` The created container widget object.
 
+        **Raises:**
+        - `ValueError` If the container element is invalid (see `resolve_container`).
+
+        Create a container widget based on the JSON element.
+        If the layout type is 'grid' or 'flex', the 'layout_options' property must be present.
+        """
+        layout_type, layout_args = layout if layout is not None else self.resolve_container(element)
+        container = lv.obj(lv.screen_active())
+        if layout_type == "none":
+            container.set_layout(lv.LAYOUT.NONE)
+        elif layout_type == "grid":
+            container.set_layout(lv.LAYOUT.GRID)
+            container.set_grid_dsc_array(layout_args[0], layout_args[1])
+        elif layout_type == "flex":
+            container.set_layout(lv.LAYOUT.FLEX)
+            container.set_flex_flow(layout_args)
+        return container
+
+    def resolve_container(self, element) -> tuple:
+        """
+        **Params:**
+        - `element` The JSON element of the container widget.
+
+        **Returns:**
+        - `tuple` The layout type and its resolved arguments: the flex flow (`flex`), the column and row descriptor arrays (`grid`) or `None` (`none`).
+
         **Raises:**
         - `ValueError` If the `id` or `options` properties are missing or invalid.
         - `ValueError` If the `layout_type` property is missing or invalid.
         - `ValueError` If the layout type is `grid` or `flex` and the `layout_options` property is missing or invalid.
 
-        Create a container widget based on the JSON element.
-        If the layout type is 'grid' or 'flex', the 'layout_options' property must be present.
+        Validate the container element and resolve its layout options to LVGL constants.
         """
         if "id" not in element or type(element["id"]) is not str:
             raise ValueError(f"Container widget must have 'id' of type str: {element}")
@@ -211,19 +303,13 @@ class UiLoader:
         if 'grid' in options["layout_type"] or 'flex' in options["layout_type"]:
             if "layout_options" not in options or type(options["layout_options"]) is not dict:
                 raise ValueError(f"Container widget must have 'layout_options' property of type dict: {options}")
-        container = lv.obj(lv.screen_active())
         layout = options["layout_type"]
-        if layout == "none":
-            container.set_layout(lv.LAYOUT.NONE)
-            # element["layout_type"] = "none"
-        elif layout == "grid":
-            self.configure_grid_layout(container, options['layout_options'])
-            # element["layout_type"] = "grid"
+        if layout == "grid":
+            return (layout, self.resolve_grid_layout(options['layout_options']))
         elif layout == "flex":
-            self.configure_flex_layout(container, options['layout_options'])
-            # element["layout_type"] = "flex"
-        return container
-    
+            return (layout, self.resolve_flex_layout(options['layout_options']))
+        return (layout, None)
+
     def configure_flex_layout(self, container: lv.obj, options):
         """
         **Params:**
@@ -235,22 +321,24 @@ class UiLoader:
 
         Configure the flex layout of a container widget based on the options provided in the JSON element.
         """
+        flow = self.resolve_flex_layout(options)
+        container.set_layout(lv.LAYOUT.FLEX)
+        container.set_flex_flow(flow)
+
+    def resolve_flex_layout(self, options):
+        """
+        **Params:**
+        - `options` The options dictionary for the flex layout.
+
+        **Returns:**
+        - `lv.FLEX_FLOW` The flex flow of the layout.
+
+        **Raises:**
+        - `ValueError` If the `flow` property is missing or invalid.
+        """
         if "flow" not in options or options["flow"] not in self.valid_flow:
             raise ValueError(f"Flex layout must have 'flow' property: {options}. Valid options are: {self.valid_flow}")
-        container.set_layout(lv.LAYOUT.FLEX)
-        flow = options["flow"]
-        if flow == "row":
-            container.set_flex_flow(lv.FLEX_FLOW.ROW)
-        elif flow == "column":
-            container.set_flex_flow(lv.FLEX_FLOW.COLUMN)
-        elif flow == "row_wrap":
-            container.set_flex_flow(lv.FLEX_FLOW.ROW_WRAP)
-        elif flow == "column_wrap":
-            container.set_flex_flow(lv.FLEX_FLOW.COLUMN_WRAP)
-        elif flow == "row_reverse":
-            container.set_flex_flow(lv.FLEX_FLOW.ROW_REVERSE)
-        elif flow == "column_reverse":
-            container.set_flex_flow(lv.FLEX_FLOW.COLUMN_REVERSE)
+        return getattr(lv.FLEX_FLOW, options["flow"].upper())
 
     def configure_grid_layout(self, container: lv.obj, options):
         """
@@ -264,9 +352,24 @@ class UiLoader:
 
         Configure the grid layout of a container widget based on the options provided in the JSON element.
         """
+        col_dsc, row_dsc = self.resolve_grid_layout(options)
+        container.set_layout(lv.LAYOUT.GRID)
+        container.set_grid_dsc_array(col_dsc, row_dsc)
+
+    def resolve_grid_layout(self, options) -> tuple:
+        """
+        **Params:**
+        - `options` The options dictionary for the grid layout.
+
+        **Returns:**
+        - `tuple` The column and row descriptor arrays of the grid.
+
+        **Raises:**
+        - `ValueError` If the `grid_dsc` property is missing or invalid.
+        - `ValueError` If the `col_dsc` or `row_dsc` properties are missing or invalid.
+        """
         if "grid_dsc" not in options or type(options["grid_dsc"]) is not dict:
             raise ValueError(f"Grid layout must have 'grid_dsc' of type dict: {options}")
-        container.set_layout(lv.LAYOUT.GRID)
         # TODO Need to properly handle grid placements of children with grid layout
         if "col_dsc" not in options["grid_dsc"] or type(options["grid_dsc"]["col_dsc"]) is not list or "row_dsc" not in options["grid_dsc"] or type(options["grid_dsc"]["row_dsc"]) is not list:
             raise ValueError(f"grid_dsc must have 'col_dsc' and 'row_dsc' of type list: {options['grid_dsc']}")
@@ -294,7 +397,7 @@ class UiLoader:
             #         row_dsc.append(lv.GRID_CONTENT)
             #     else:
             #         raise ValueError(f"Unsupported row description: {row}. Must be an integer, '#fr' value or 'content'.")
-        container.set_grid_dsc_array(col_dsc, row_dsc)
+        return (col_dsc, row_dsc)
 
     def create_random_widget(self, element):
         """
@@ -311,15 +414,11 @@ class UiLoader:
         A random type is chosen from the 'widget_list' property. The chosen type is then passed to the widget creation function.
         This is done X times based on the 'count' property.
         """
-        if "parent_id" not in element or type(element["parent_id"]) is not str:
-            raise ValueError(f"Random widget must have 'parent_id' of type str: {element}")
-        if "count" not in element or type(element["count"]) is not int:
-            raise ValueError(f"Random widget must have 'count' of type int: {element}")
-        if "widget_list" not in element or type(element["widget_list"]) is not list:
-            raise ValueError(f"Random widget must have 'widget_list' of type list: {element}")
+        self.validate_random_element(element)
+        widget_element = dict(element) # NOTE The element itself is kept unchanged, it is parsed again for every sample of a batch
         for i in range(element["count"]):
-            element["type"] = random.choice(element["widget_list"])
-            widget = self.create_widget(element)
+            widget_element["type"] = random.choice(element["widget_list"])
+            widget = self.create_widget(widget_element)
             widget.set_parent(self.widgets[element["parent_id"]])
             if "style" in element:
                 if type(element["style"]) is list:
@@ -330,21 +429,51 @@ class UiLoader:
             if "placement" in element:
                 # NOTE Assuming parent is grid layout if "placement" is present
                 # FIXME placement should be adjusted for each created random widget, as they can't all be in the same spot
-                self.place_widget_in_grid(widget, element)
+                self.place_widget_in_grid(widget, widget_element)
         return widget
     
-    def place_widget_in_grid(self, widget: lv.obj, child_element):
+    def validate_random_element(self, element):
+        """
+        **Params:**
+        - `element` The JSON element of the random widget.
+
+        **Raises:**
+        - `ValueError` If the `parent_id`, `count`, or `widget_list` properties are missing or invalid.
+        """
+        if "parent_id" not in element or type(element["parent_id"]) is not str:
+            raise ValueError(f"Random widget must have 'parent_id' of type str: {element}")
+        if "count" not in element or type(element["count"]) is not int:
+            raise ValueError(f"Random widget must have 'count' of type int: {element}")
+        if "widget_list" not in element or type(element["widget_list"]) is not list:
+            raise ValueError(f"Random widget must have 'widget_list' of type list: {element}")
+
+    def place_widget_in_grid(self, widget: lv.obj, child_element, placement: tuple = None):
         """
         **Params:**
         - `widget` The widget to place in the grid container.
         - `child_element` The JSON element of the child widget to place in the grid container.
+        - `placement` The resolved grid cell of the widget (see `resolve_grid_placement`), resolved from the element if not provided.
 
         **Raises:**
-        - `ValueError` If the `placement` property is missing or invalid.
-        - `ValueError` If the `col_pos`, `col_span`, `row_pos`, or `row_span` properties are missing or invalid.
+        - `ValueError` If the `placement` property is missing or invalid (see `resolve_grid_placement`).
 
         Place the provided child widget in the grid container widget based on the 'placement' property in the child JSON element.
         """
+        col_align, col_pos, col_span, row_align, row_pos, row_span = placement if placement is not None else self.resolve_grid_placement(child_element)
+        widget.set_grid_cell(col_align, col_pos, col_span, row_align, row_pos, row_span)
+
+    def resolve_grid_placement(self, child_element) -> tuple:
+        """
+        **Params:**
+        - `child_element` The JSON element of the child widget to place in the grid container.
+
+        **Returns:**
+        - `tuple` The arguments of `set_grid_cell`: column align, position and span followed by row align, position and span.
+
+        **Raises:**
+        - `ValueError` If the `placement` property is missing or invalid.
+        - `ValueError` If the `col_pos`, `col_span`, `row_pos`, or `row_span` properties are missing or invalid.
+        """
         if "placement" not in child_element or type(child_element["placement"]) is not dict:
             raise ValueError(f"Child element of grid layout must have 'placement' property of type 'dict': {child_element}")
         # placement options: column_align: Unknown, col_pos: int, col_span: int, row_align: Unknown, row_pos: int, row_span: int
@@ -360,47 +489,62 @@ class UiLoader:
         col_align = child_element["placement"].get("col_align", "space_evenly")
         row_align = getattr(lv.GRID_ALIGN, row_align.upper(), lv.GRID_ALIGN.SPACE_EVENLY)
         col_align = getattr(lv.GRID_ALIGN, col_align.upper(), lv.GRID_ALIGN.SPACE_EVENLY)
-        widget.set_grid_cell(col_align, child_element["placement"]["col_pos"], child_element["placement"]["col_span"], row_align, child_element["placement"]["row_pos"], child_element["placement"]["row_span"])
+        placement = child_element["placement"]
+        return (col_align, placement["col_pos"], placement["col_span"], row_align, placement["row_pos"], placement["row_span"])
 
 # TODO Should update the JSON tree with all randomly created values to export the UI back to JSON again
     
 # NOTE ------------ STYLE CREATION METHODS ------------
     
-    def create_style(self, style_def):
+    def create_style(self, style_def, properties: list = None):
         """
         **Params:**
         - `style_def` The JSON style definition to create the style object from.
+        - `properties` The resolved style properties (see `resolve_style`), resolved from the style definition if not provided.
 
         **Returns:**
         - `lv.style_t` The created style object.
 
         Create an LVGL style object based on the style definition provided in the JSON data.
+        """
+        style = lv.style_t() # FIXME missing parameter 'args' of type '_style_t_type' (unresolved) - ignore?
+        style.init()
+        for setter_name, converted_value in (properties if properties is not None else self.resolve_style(style_def)):
+            try:
+                getattr(style, setter_name)(converted_value)
+            except TypeError as e:
+                print(f"TypeError setting style property {setter_name}: {e}")
+        return style
+
+    def resolve_style(self, style_def) -> list:
+        """
+        **Params:**
+        - `style_def` The JSON style definition to resolve.
+
+        **Returns:**
+        - `list` A list of `(setter name, converted value)` tuples of the style properties.
+
+        Resolve the properties of a style definition to the setters of the LVGL style object and their values.
         Provided style property values are converted to the required type, according to conversion rules of the called conversion function.
         If a style property is not recognized, a message is printed to the console and the property is skipped.
         If value conversion fails, a message is printed to the console and the property is skipped.
         """
         print(f"Creating style: {style_def}")
-        style = lv.style_t() # FIXME missing parameter 'args' of type '_style_t_type' (unresolved) - ignore?
-        style.init()
-
+        probe = lv.style_t() # NOTE Only used to look up the setters, no properties are set
+        properties = []
         for prop, value in style_def.items():
             if prop == "selector":
                 continue
             setter_name = f"set_{prop}"
-            if hasattr(style, setter_name):
-                setter = getattr(style, setter_name)
+            if hasattr(probe, setter_name):
                 converted_value = self.convert_value(prop, value)
                 if(converted_value == None):
                     print(f"Unsupported value conversion: {value} for style property {prop}")
                     continue
-                try:
-                    setter(converted_value)
-                except TypeError as e:
-                    print(f"TypeError setting style property {prop}: {e}")
+                properties.append((setter_name, converted_value))
             else:
                 print(f"Unsupported style property: {prop}")
-
-        return style
+        return properties
     
     def convert_value(self, prop_name, value):
         """
@@ -504,30 +648,48 @@ class UiLoader:
         - `ValueError` If the style does not exist in the JSON data.
 
         Lookup the style name in the list of styles and apply the created style object to the widget.
-        If the style name is not found in the list of styles, a new style is created and added to the list.
+        Style objects are taken from the style cache, keyed by their properties, so identical styles are shared across samples and loaders.
+        """
+        key, selector, properties = self.resolve_style_reference(style_name)
+        style_def = self.ui["styles"][style_name]
+        style = self.style_cache.get(key, lambda key: self.create_style(style_def, properties), len(key) - 3)
+        widget.add_style(style, selector)
+
+    def resolve_style_reference(self, style_name) -> tuple:
+        """
+        **Params:**
+        - `style_name` The name of the style.
+
+        **Returns:**
+        - `tuple` The style cache key, the selector and the resolved properties (`None` if not resolved yet) of the style.
+
+        **Raises:**
+        - `ValueError` If the style does not exist in the JSON data.
+
+        Lookup the style name in the list of styles, resolving its cache key and selector on first use.
+        The key consists of the window size and the raw property values of the style, so loaders of different window sizes do not share styles with relative sizes.
         """
-        # Style application logic goes here
-        # For example, lookup a style in self.data["ui"]["styles"] and apply it to the widget
         if style_name not in self.styles:
-            if style_name not in self.ui["styles"]:
+            if "styles" not in self.ui or style_name not in self.ui["styles"]:
                 raise ValueError(f"Style not found: {style_name}")
-            style = self.create_style(self.ui["styles"][style_name])
-            self.styles[style_name] = style
-            if "selector" in self.ui["styles"][style_name]:
-                selector = self.convert_value("selector", self.ui["styles"][style_name]["selector"])
+            style_def = self.ui["styles"][style_name]
+            # NOTE Relative sizes are converted with the window size of the loader, which is part of the key, since the cache is shared by all loaders
+            key = ('design', self.width, self.height) + tuple(sorted((prop, str(value)) for prop, value in style_def.items() if prop != "selector"))
+            selector = lv.PART.MAIN
+            if "selector" in style_def:
+                selector = self.convert_value("selector", style_def["selector"])
                 if selector == None:
-                    print(f"Invalid selector value for style: {style_name}:{self.ui['styles'][style_name]['selector']}")
-                    self.styles[f"{style_name}_selector"] = lv.PART.MAIN
-                else:
-                    self.styles[f"{style_name}_selector"] = selector
-            else:
-                self.styles[f"{style_name}_selector"] = lv.PART.MAIN
-        widget.add_style(self.styles[style_name], self.styles[f"{style_name}_selector"])
+                    print(f"Invalid selector value for style: {style_name}:{style_def['selector']}")
+                    selector = lv.PART.MAIN
+            self.styles[style_name] = (key, selector, None)
+        return self.styles[style_name]
 
     def update_screen(self):
         """Re-render the screen & update the layout."""
+        start = profiler.start()
         lv.screen_load(self.root_widget)
         self.root_widget.update_layout()
+        profiler.stop('layout', start)
 # NOTE ------------ GETTERS ------------
 
     def get_root_widget(self):
@@ -537,42 +699,40 @@ class UiLoader:
     def get_ui(self) -> UI:
         """
         **Returns:**
-        - `UI` The UI object containing the metadata.
+        - `UI` The annotation store of the UI.
 
-        Return a UI object (special dictionary) containing the screen dimensions and all widget position metadata required for bounding box annotation.
+        Return the annotation store of the UI containing the screen dimensions and the bounding boxes of all widgets.
+        The annotation store is re-used by the next call, so its boxes belong to the last created UI.
         """
-        ui = UI()
-        ui["count"] = len(self.widgets)
+        ui = self.annotations
+        ui.width = self.width
+        ui.height = self.height
         self.update_screen()
-        for id, widget in self.widgets.items():
-            if type(widget) is lv.obj:
-                continue # Skip container widgets
-            widget_info = {}
-            tmp_coords = lv.area_t()
-            widget.get_coords(tmp_coords)
-            widget_info["x"] = (tmp_coords.x1 + tmp_coords.x2) // 2
-            widget_info["y"] = (tmp_coords.y1 + tmp_coords.y2) // 2
-            widget_info["width"] = widget.get_width()
-            widget_info["height"] = widget.get_height()
-            widget_info["class"] = widget.__class__.__name__
-            print(f"Widget {id}: {widget_info}")
-            ui["objects"].append(widget_info)
+        self.box_extractor.extract((widget for widget in self.widgets.values() if type(widget) is not lv.obj), ui) # NOTE Container widgets are not annotated
         return ui
     
-    def cleanup(self):
+    def cleanup(self, screen: lv.obj = None) -> int:
         """
+        **Params:**
+        - `screen` The screen the UI was created on, which is deleted instead of the root widget if provided. It must not be the active screen.
+
+        **Returns:**
+        - `int` The amount of styles freed by the style cache.
+
         Cleanup the screen and widgets, destroying all created objects.
-        Note that this function will cause a known error when sub-widgets are indirectly deleted by destroying their parent container.
-        That error is safe to ignore, as the widgets should be properly deleted by LVGL.
+        All widgets are deleted by a single `delete()` of the root widget (or the screen), since LVGL deletes the children of an object with it.
+        The references of the widgets are discarded and the styles of the UI are released to the style cache, which frees the evicted styles.
         """
-        # Cleanup the screen and widgets (passing twice to delete widgets before containers)
-        for id, widget in self.widgets.items():
-            try:
-                widget.delete()
-                self.widgets.pop(id)
-            except Exception as e:
-                print(f"Error deleting widget {id}: {e}")
-        
+        root = screen if screen is not None else self.root_widget
+        if root is not None:
+            root.delete()
+        count = len(self.widgets)
+        self.root_widget = None
+        self.widgets = {}
+        freed = self.style_cache.release()
+        print(f"Cleanup: deleted {count} widgets, freed {freed} styles")
+        return freed
+
 
 if __name__ == "__main__":
     # Load UI from JSON file
@@ -0,0 +1,200 @@
+import sys
+if sys.implementation.name == "micropython":
+    import lvgl as lv
+    import random
+    from widget import widget_mapping
+    from design_parser import UiLoader
+    from profiler import profiler
+else:
+    import mock
+    import random
+    from .mock.lvgl import lv
+    from .widget import widget_mapping
+    from .design_parser import UiLoader
+    from .profiler import profiler
+
+class TemplateNode:
+    """
+    A compiled element of a design template, with all options validated and resolved to LVGL constants.
+
+    **Object Attributes:**
+    - `type` The widget type of the element (`container`, `random` or a widget type).
+    - `element` The JSON element, passed to the widget creation function.
+    - `id` The explicit ID of the element or `None`.
+    - `layout` The resolved layout of a container (see `UiLoader.resolve_container`), otherwise `None`.
+    - `random_elements` A list of `(widget type, element)` tuples to choose from for a random element, otherwise `None`.
+    - `placement` The resolved grid cell of the element (see `UiLoader.resolve_grid_placement`) or `None`.
+    - `styles` The names of the styles applied to the element.
+    - `children` A list of the compiled child elements.
+    """
+    def __init__(self, element):
+        self.type = element["type"]
+        self.element = element
+        self.id = element.get("id", None)
+        self.layout = None
+        self.random_elements = None
+        self.placement = None
+        styles = element.get("style", [])
+        self.styles = styles if type(styles) is list else [styles]
+        self.children = []
+
+class DesignTemplate(UiLoader):
+    """
+    A design file, which is parsed and validated once and then instantiated many times (design mode datasets).
+
+    On construction, the JSON tree is compiled into a tree of `TemplateNode` objects: element types, container layouts, grid placements and styles are validated
+    and resolved to LVGL constants and converted style values once. Each call of `parse_ui` only creates the LVGL objects and draws the random choices of the design.
+
+    The random sequence of an instance is the same as parsing the design with `UiLoader`, so samples of a given seed do not change.
+
+    **Object Attributes:**
+    - `root` The compiled root element.
+
+    See `UiLoader` for the inherited attributes.
+    """
+    def __init__(self, json_file: str, style_cache = None):
+        super().__init__(json_file, style_cache)
+        self.initialize_screen(create_driver=False) # NOTE Validates the window, the display is created by the caller
+        if "root" not in self.ui or type(self.ui["root"]) is not dict:
+            raise ValueError(f"UI must have 'root' property of type dict: {self.ui}")
+        self.root = self.compile_element(self.ui["root"])
+        self.reserved_ids = self.collect_ids(self.ui["root"])
+
+    def compile_element(self, element, parent_layout: str = None) -> TemplateNode:
+        """
+        **Params:**
+        - `element` The JSON element to compile.
+        - `parent_layout` The layout type of the parent container, if any.
+
+        **Returns:**
+        - `TemplateNode` The compiled element including its compiled children.
+
+        **Raises:**
+        - `ValueError` If the element or one of its children is invalid.
+
+        Validate a JSON element and resolve its options, styles and children.
+        """
+        if "type" not in element or element["type"] not in self.valid_types:
+            raise ValueError(f"Invalid widget type: {element.get('type', None)}. Valid types are: {self.valid_types}")
+        node = TemplateNode(element)
+        if node.type == "container":
+            node.layout = self.resolve_container(element)
+        elif node.type == "random":
+            self.validate_random_element(element)
+            node.random_elements = []
+            for widget_type in element["widget_list"]:
+                if widget_type not in widget_mapping:
+                    raise ValueError(f"Invalid widget type in 'widget_list' of random widget: {widget_type}. Valid types are: {list(widget_mapping.keys())}")
+                random_element = dict(element)
+                random_element["type"] = widget_type
+                node.random_elements.append((widget_type, random_element))
+            if "placement" in element:
+                node.placement = self.resolve_grid_placement(element)
+        elif node.type not in widget_mapping:
+            raise ValueError(f"Failed to create widget: {element}")
+        if node.type != "random" and parent_layout == "grid":
+            node.placement = self.resolve_grid_placement(element)
+        for style_name in node.styles:
+            key, selector, properties = self.resolve_style_reference(style_name)
+            if properties is None:
+                self.styles[style_name] = (key, selector, self.resolve_style(self.ui["styles"][style_name]))
+        if "children" in element:
+            if node.layout is None:
+                raise ValueError(f"Only container widgets can have children: {element}")
+            node.children = [self.compile_element(child, node.layout[0]) for child in element["children"]]
+        return node
+
+    def parse_ui(self):
+        """
+        Create the LVGL objects of a new instance of the design on the active screen.
+        References of previously created widgets are discarded on each call.
+        """
+        self.widgets = {}
+        self.type_counts = {}
+        self.root_widget = self.instantiate(self.root)
+        self.root_widget.set_parent(lv.screen_active())
+        self.root_widget.set_width(self.width)
+        self.root_widget.set_height(self.height)
+
+    def instantiate(self, node: TemplateNode):
+        """
+        **Params:**
+        - `node` The compiled element to instantiate.
+
+        **Returns:**
+        - `lv.obj` The created widget (for random elements the last created widget).
+
+        Create the widget of a compiled element and its children, the counterpart of `UiLoader.parse_element`.
+        """
+        if node.type == "random":
+            widget = self.instantiate_random(node)
+            if widget is None:
+                return widget
+        else:
+            start = profiler.start()
+            if node.type == "container":
+                widget = self.create_container(node.element, node.layout)
+            else:
+                widget = widget_mapping[node.type](node.element)
+            self.set_size(widget, node.element)
+            self.register_widget(node.id, node.type, widget)
+            profiler.stop('widget_creation', start)
+        for child in node.children:
+            child_widget = self.instantiate(child)
+            if child.type == "random": # NOTE Random widget is a special case and places itself
+                continue
+            start = profiler.start()
+            child_widget.set_parent(widget)
+            if child.placement is not None:
+                self.place_widget_in_grid(child_widget, child.element, child.placement)
+            profiler.stop('placement', start)
+        start = profiler.start()
+        for style_name in node.styles:
+            self.apply_style(widget, style_name)
+        profiler.stop('style', start)
+        return widget
+
+    def instantiate_random(self, node: TemplateNode):
+        """
+        **Params:**
+        - `node` The compiled random element.
+
+        **Returns:**
+        - `lv.obj` The last created widget.
+
+        Create the widgets of a random element, the counterpart of `UiLoader.create_random_widget`.
+        """
+        widget = None
+        for i in range(node.element["count"]):
+            start = profiler.start()
+            widget_type, element = random.choice(node.random_elements)
+            widget = widget_mapping[widget_type](element)
+            self.set_size(widget, element)
+            self.register_widget(node.id, widget_type, widget)
+            profiler.stop('widget_creation', start)
+            start = profiler.start()
+            widget.set_parent(self.widgets[element["parent_id"]])
+            profiler.stop('placement', start)
+            start = profiler.start()
+            for style_name in node.styles:
+                self.apply_style(widget, style_name)
+            profiler.stop('style', start)
+            if node.placement is not None:
+                start = profiler.start()
+                self.place_widget_in_grid(widget, element, node.placement)
+                profiler.stop('placement', start)
+        return widget
+
+    @staticmethod
+    def set_size(widget, element):
+        """
+        **Params:**
+        - `widget` The created widget.
+        - `element` The JSON element of the widget.
+
+        Set the width and height of a widget, if provided in the element.
+        """
+        if 'width' in element:
+            widget.set_width(element['width'])
+        if 'height' in element:
+            widget.set_height(element['height'])
@@ -0,0 +1,171 @@
+"""
+Pipelined screenshot encoding for batch runs: the encoding and writing of sample `k` overlaps with building the UI of sample `k + 1`.
+
+The screen of a sample is rendered into one of a small pool of snapshot buffers, which are allocated once and re-used for all samples.
+The buffer is then handed to a worker thread (`_thread`), which encodes the image, writes the files of the sample and returns the buffer to the pool.
+Only the main thread calls LVGL, the worker thread only reads and writes the pixel data of its buffer. If the pool is empty, the main thread waits for the worker.
+
+If the firmware is built without thread support, the jobs are run right away in the main thread (no overlap, but still without per-sample snapshot allocations).
+"""
+import sys
+if sys.implementation.name == "micropython":
+    import lvgl as lv
+    try:
+        import _thread
+    except ImportError:
+        _thread = None
+    from screenshot_v2 import pack_rows, write_image
+else:
+    import mock
+    import _thread
+    from .mock.lvgl import lv
+    from .screenshot_v2 import pack_rows, write_image
+
+class EncodePipeline:
+    """
+    A pool of snapshot buffers and a worker thread encoding them.
+
+    **Object Attributes:**
+    - `depth` The amount of snapshot buffers, i.e. the maximum amount of samples in flight (2 is double buffering).
+    - `quality` The quality of JPG images (0-100).
+    - `threaded` Whether the jobs are run by a worker thread.
+    - `buffers` All allocated snapshot buffers (`lv.draw_buf_t`).
+    - `free` The snapshot buffers, which are not used by a queued job.
+    - `jobs` The queued jobs, a job is a tuple of `(buffer, output file, image format, done callback)`.
+    - `error` The first exception raised by a job, it is raised in the main thread on the next call of `submit` or `close`.
+    """
+    def __init__(self, depth: int = 2, quality: int = 100, threaded: bool = True):
+        if depth < 1:
+            raise ValueError(f'Invalid pipeline depth: {depth} (must be at least 1)')
+        self.depth = depth
+        self.quality = quality
+        self.threaded = threaded and _thread is not None
+        self.buffers = []
+        self.free = []
+        self.jobs = []
+        self.error = None
+        if self.threaded:
+            self._lock = _thread.allocate_lock()
+            self._job_signal = _thread.allocate_lock()
+            self._free_signal = _thread.allocate_lock()
+            self._finished = _thread.allocate_lock()
+            self._job_signal.acquire()
+            self._free_signal.acquire()
+            self._finished.acquire()
+            _thread.start_new_thread(self._worker, ())
+
+    def submit(self, output_file: str, image_format: str, done = None):
+        """
+        **Params:**
+        - `output_file` The file path to save the screenshot to.
+        - `image_format` The output format (`jpg`, `png`, `npy` or `bin`).
+        - `done` A function, which is called without arguments after the screenshot is written (e.g. to write the annotation of the sample).
+          It is called by the worker thread, so it must not call LVGL.
+
+        Take a snapshot of the active screen into a free buffer and queue the encoding of it.
+        The screen can be deleted as soon as this function returns.
+        """
+        self._raise_error()
+        buffer = self._take_buffer()
+        scrn = lv.screen_active()
+        lv.timer_handler()
+        if lv.snapshot_take_to_draw_buf(scrn, lv.COLOR_FORMAT.RGB888, buffer) != lv.RESULT.OK:
+            self._return_buffer(buffer)
+            raise RuntimeError(f'Failed to take snapshot for {output_file}')
+        job = (buffer, output_file, image_format, done)
+        if not self.threaded:
+            self._run(job)
+            self._raise_error()
+            return
+        with self._lock:
+            self.jobs.append(job)
+        self._notify(self._job_signal)
+
+    def close(self):
+        """
+        Wait until all queued jobs are done, stop the worker thread and free the snapshot buffers.
+        """
+        if self.threaded and self._finished is not None:
+            with self._lock:
+                self.jobs.append(None) # NOTE Stops the worker after all queued jobs
+            self._notify(self._job_signal)
+            self._finished.acquire()
+            self._finished = None
+        for buffer in self.buffers:
+            buffer.destroy()
+        self.buffers = []
+        self.free = []
+        self._raise_error()
+
+    def _take_buffer(self):
+        while True:
+            if self.threaded:
+                with self._lock:
+                    buffer = self.free.pop() if self.free else None
+            else:
+                buffer = self.free.pop() if self.free else None
+            if buffer is not None:
+                return buffer
+            if len(self.buffers) < self.depth:
+                buffer = lv.snapshot_create_draw_buf(lv.screen_active(), lv.COLOR_FORMAT.RGB888)
+                if buffer is None:
+                    raise MemoryError('Failed to allocate a snapshot buffer')
+                self.buffers.append(buffer)
+                return buffer
+            self._free_signal.acquire() # NOTE Only reached in threaded mode, all buffers are used by queued jobs
+
+    def _return_buffer(self, buffer):
+        if self.threaded:
+            with self._lock:
+                self.free.append(buffer)
+            self._notify(self._free_signal)
+        else:
+            self.free.append(buffer)
+
+    def _worker(self):
+        while True:
+            self._job_signal.acquire()
+            while True:
+                with self._lock:
+                    job = self.jobs.pop(0) if self.jobs else False
+                if job is False:
+                    break
+                if job is None:
+                    self._finished.release()
+                    return
+                self._run(job)
+
+    def _run(self, job):
+        buffer, output_file, image_format, done = job
+        try:
+            if self.error is None:
+                header = buffer.header
+                data = buffer.data.__dereference__(buffer.data_size)
+                if header.stride != header.w * 3:
+                    data = pack_rows(data, 0, 0, header.w, header.h, header.stride)
+                write_image(output_file, data, header.w, header.h, image_format, self.quality)
+                if done is not None:
+                    done()
+        except Exception as e:
+            self.error = e
+        self._return_buffer(buffer)
+
+    def _raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    @staticmethod
+    def _notify(signal):
+        # The signal locks are binary semaphores, which are released to wake up a waiting thread (releasing an unlocked signal is a no-op)
+        try:
+            signal.release()
+        except RuntimeError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
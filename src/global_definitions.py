@@ -13,7 +13,7 @@ widget_types = ["arc",
                 "scale", "slider", "spangroup", "spinbox", "spinner", "switch", 
                 "table", "tabview", "textarea", "tileview", 
                 "window"]
-"""A list of all LVGL widget types"""
+"""A list of all LVGL widget types, the index of a type is its class ID in the annotations (see `class_registry.py`), so new types must only be appended"""
 
 implemented_types = ["arc", 
                      "bar", "button", "buttonmatrix", 
@@ -23,4 +23,7 @@ implemented_types = ["arc",
                      "roller", 
                      "scale", "slider", "spinbox", "switch", 
                      "table", "textarea"]
-"""A list of all implemented LVGL widget types in the generator"""
\ No newline at end of file
+"""A list of all implemented LVGL widget types in the generator"""
+
+server_result_prefix = "@result "
+"""The prefix of result lines written to stdout by the generator in server mode (other output of the generator is diagnostic)"""
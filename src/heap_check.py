@@ -0,0 +1,146 @@
+"""
+A leak check of the LVGL objects and memory for generators, which are re-used for many samples in one process (batch and server mode).
+
+Every widget or style which is not freed after a sample adds up over a long batch run until the process runs out of memory.
+The check runs a number of generate and cleanup cycles and asserts that the measured usage returns to the baseline measured after the warm-up cycles.
+The style cache is cleared before each measurement, since cached styles are kept on purpose (see `style_cache.StyleCache`).
+
+The usage is measured in one of two ways, depending on the allocator of LVGL (`LV_USE_STDLIB_MALLOC` in `lv_conf.h`):
+- `lvgl_heap` With the builtin allocator (`LV_STDLIB_BUILTIN`), the used LVGL heap in bytes and blocks is reported by `lv.mem_monitor`.
+- `objects` With any other allocator (e.g. `LV_STDLIB_CLIB`, the setting of this project), `lv.mem_monitor` reports nothing.
+  The amount of LVGL objects on the checked screens, the top and system layers and the tracked sample screens which were not deleted yet is counted instead,
+  the allocated MicroPython heap (`gc.mem_alloc`) is reported alongside. Leaked styles are not detected by this measure.
+
+Samples are created on screens of their own, which are not children of any other object. A leaked sample screen is therefore only counted if it is tracked (see `ScreenTracker`).
+"""
+import sys
+if sys.implementation.name == "micropython":
+    import gc
+    import lvgl as lv
+else:
+    import mock
+    import gc
+    from .mock.lvgl import lv
+
+def lvgl_heap_usage() -> tuple[int, int]:
+    """
+    **Returns:**
+    - `tuple[int, int]` The used size of the LVGL heap in bytes and the amount of used blocks.
+
+    **Raises:**
+    - `RuntimeError` If LVGL does not use its builtin allocator, in which case `lv.mem_monitor` does not report the heap.
+    """
+    monitor = lv.mem_monitor_t()
+    lv.mem_monitor(monitor)
+    if not monitor.total_size:
+        raise RuntimeError('lv.mem_monitor does not report the heap, LVGL is not built with its builtin allocator (LV_USE_STDLIB_MALLOC)')
+    return monitor.total_size - monitor.free_size, monitor.used_cnt
+
+def count_objects(obj: lv.obj) -> int:
+    """
+    **Params:**
+    - `obj` The root object.
+
+    **Returns:**
+    - `int` The amount of objects in the tree of the object (including itself).
+    """
+    count = 1
+    for i in range(obj.get_child_count()):
+        count += count_objects(obj.get_child(i))
+    return count
+
+class ScreenTracker:
+    """
+    A registry of the sample screens, which are alive until their `lv.EVENT.DELETE` event.
+
+    **Object Attributes:**
+    - `live` A dictionary of tracking number to the screens which were not deleted yet.
+    - `tracked` The amount of tracked screens.
+    """
+    def __init__(self):
+        self.live = {}
+        self.tracked = 0
+
+    def track(self, screen: lv.obj):
+        """
+        **Params:**
+        - `screen` The screen to track until it is deleted.
+        """
+        number = self.tracked
+        self.tracked += 1
+        self.live[number] = screen
+        screen.add_event_cb(lambda event: self.live.pop(number, None), lv.EVENT.DELETE, None)
+
+    def count_objects(self) -> int:
+        """
+        **Returns:**
+        - `int` The amount of objects on the tracked screens which were not deleted yet (including the screens).
+        """
+        count = 0
+        for screen in self.live.values():
+            count += count_objects(screen)
+        return count
+
+def heap_usage(screens: list = (), tracker: ScreenTracker = None) -> tuple[str, int, int]:
+    """
+    **Params:**
+    - `screens` The screens, whose objects are counted if the LVGL heap can not be measured.
+    - `tracker` The tracker of the sample screens, whose objects are counted if the LVGL heap can not be measured.
+
+    **Returns:**
+    - `tuple[str, int, int]` The measure (`lvgl_heap` or `objects`), the used memory in bytes (LVGL heap or MicroPython heap) and the amount of used LVGL heap blocks or objects.
+
+    The garbage collector is run before the measurement, so objects which are only referenced by freed Python objects are released.
+    """
+    gc.collect()
+    try:
+        used, blocks = lvgl_heap_usage()
+        return 'lvgl_heap', used, blocks
+    except RuntimeError:
+        pass
+    objects = count_objects(lv.layer_top()) + count_objects(lv.layer_sys())
+    for screen in screens:
+        objects += count_objects(screen)
+    if tracker is not None:
+        objects += tracker.count_objects()
+    mem_alloc = getattr(gc, 'mem_alloc', None) # NOTE Only available in MicroPython
+    return 'objects', mem_alloc() if mem_alloc is not None else 0, objects
+
+def check_heap(create, cleanup, cycles: int = 10, warmup: int = 1, tolerance: int = 0, style_cache = None, screens: list = (), tracker: ScreenTracker = None) -> dict:
+    """
+    **Params:**
+    - `create` A function creating a sample.
+    - `cleanup` A function deleting the sample created by the last call of `create`.
+    - `cycles` The amount of generate and cleanup cycles after the baseline is measured.
+    - `warmup` The amount of cycles before the baseline is measured (first use allocations, e.g. of fonts and themes).
+    - `tolerance` The amount of bytes (LVGL heap) or objects the usage may exceed the baseline.
+    - `style_cache` The style cache of the generator, which is cleared before each measurement.
+    - `screens` The screens, which remain after the cleanup (e.g. the idle screen), whose objects are counted if the LVGL heap can not be measured.
+    - `tracker` The tracker of the screens created by `create`, which must be deleted by `cleanup`.
+
+    **Returns:**
+    - `dict` The result of the check: `measure` (see the module documentation), `cycles`, `baseline` and `used` (bytes), `baseline_blocks` and `used_blocks` (LVGL heap blocks or objects) and `leak` (bytes or objects).
+
+    **Raises:**
+    - `AssertionError` If the usage after the cycles exceeds the baseline by more than the tolerance.
+    """
+    for _ in range(warmup):
+        create()
+        cleanup()
+    if style_cache is not None:
+        style_cache.clear()
+    measure, baseline, baseline_blocks = heap_usage(screens, tracker)
+    for _ in range(cycles):
+        create()
+        cleanup()
+    if style_cache is not None:
+        style_cache.clear()
+    measure, used, used_blocks = heap_usage(screens, tracker)
+    leak = used - baseline if measure == 'lvgl_heap' else used_blocks - baseline_blocks # NOTE The MicroPython heap varies with the metadata of the last sample, only the objects are compared
+    result = {'measure': measure, 'cycles': cycles, 'baseline': baseline, 'used': used, 'baseline_blocks': baseline_blocks, 'used_blocks': used_blocks, 'leak': leak}
+    print(f'Heap check: {result}')
+    if leak > tolerance:
+        if measure == 'lvgl_heap':
+            raise AssertionError(f'LVGL heap did not return to baseline after {cycles} cycles: {used} bytes used ({used_blocks} blocks), baseline {baseline} bytes ({baseline_blocks} blocks)')
+        raise AssertionError(f'LVGL objects did not return to baseline after {cycles} cycles: {used_blocks} objects, baseline {baseline_blocks} objects')
+    return result
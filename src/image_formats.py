@@ -0,0 +1,211 @@
+"""
+Writers for the lossless output formats of screenshots.
+
+- `png` A RGB PNG image (8 bit per channel, no interlacing, no row filters).
+- `npy` The raw RGB pixel data with a NumPy (`.npy` version 1.0) header of shape `(height, width, 3)` and type `uint8`.
+  The file can be memory-mapped by training pipelines: `numpy.load(path, mmap_mode='r')`.
+- `bin` The raw snapshot data of LVGL (BGR888, no header), which is written without any conversion.
+  It is meant to be spooled to a RAM disk and encoded by the CPython sidecar of `bin_to_jpg_conversion.py` (`--watch`), so the generator does not spend time on encoding.
+
+JPEG images are encoded by the `jpeg` module of the firmware (see `screenshot_v2.take_screenshot`).
+"""
+import sys
+if sys.implementation.name == "micropython":
+    import io
+    import os
+    from struct import pack
+    try:
+        import deflate
+    except ImportError: # NOTE Firmware without the deflate module, PNG data is stored uncompressed
+        deflate = None
+    zlib = None
+else:
+    import io
+    import os
+    import zlib
+    from struct import pack
+    deflate = None
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+output_formats = ["jpg", "png", "npy", "bin"]
+"""A list of all supported output formats of screenshots"""
+
+format_extensions = {"jpg": "jpg", "jpeg": "jpg", "png": "png", "npy": "npy", "bin": "bin"}
+"""A mapping of (lowercase) file extensions to output formats"""
+
+def format_for_file(output_file: str, image_format: str = None) -> str:
+    """
+    **Params:**
+    - `output_file` The file path of the screenshot.
+    - `image_format` The explicitly requested output format, if any.
+
+    **Returns:**
+    - `str` The output format of the screenshot.
+
+    **Raises:**
+    - `ValueError` If the format is not supported or can not be inferred from the file extension.
+
+    Determine the output format of a screenshot, either from the explicit format or from the extension of the output file.
+    """
+    if image_format is not None:
+        if image_format not in output_formats:
+            raise ValueError(f'Invalid output format: {image_format} (valid options: {", ".join(output_formats)})')
+        return image_format
+    dot = output_file.rfind('.')
+    extension = output_file[dot + 1:].lower() if dot > output_file.rfind('/') else ''
+    if extension not in format_extensions:
+        raise ValueError(f'Can not infer the output format of {output_file}, use one of the extensions {", ".join(output_formats)} or provide the format explicitly')
+    return format_extensions[extension]
+
+def npy_header(width: int, height: int) -> bytes:
+    """
+    **Params:**
+    - `width` The width of the image.
+    - `height` The height of the image.
+
+    **Returns:**
+    - `bytes` The `.npy` version 1.0 header of an RGB image with 8 bit per channel.
+
+    The header is padded with spaces, so the pixel data starts at a multiple of 64 bytes.
+    """
+    header = "{'descr': '|u1', 'fortran_order': False, 'shape': (%d, %d, 3), }" % (height, width)
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + ' ' * padding + '\n'
+    return b'\x93NUMPY\x01\x00' + pack('<H', len(header)) + header.encode()
+
+def write_npy(output_file: str, data, width: int, height: int, stride: int = None):
+    """
+    **Params:**
+    - `output_file` The file path to save the image to.
+    - `data` The RGB pixel data (3 bytes per pixel).
+    - `width` The width of the image.
+    - `height` The height of the image.
+    - `stride` The amount of bytes per row in `data`. Default is `width * 3`.
+
+    Write RGB pixel data to a `.npy` file.
+    """
+    row_size = width * 3
+    stride = stride if stride else row_size
+    view = memoryview(data)
+    with open(output_file, 'wb') as f:
+        f.write(npy_header(width, height))
+        if stride == row_size:
+            f.write(view[:row_size * height])
+        else:
+            for y in range(height):
+                f.write(view[y * stride:y * stride + row_size])
+
+def write_raw(output_file: str, data, size: int):
+    """
+    **Params:**
+    - `output_file` The file path to save the data to.
+    - `data` The raw snapshot data.
+    - `size` The amount of bytes to write.
+
+    Write raw snapshot data to a file without any conversion.
+    The data is written to a temporary file (`<output_file>.part`) first, which is renamed when complete. Readers polling for the output file never see partial data.
+    """
+    with open(output_file + '.part', 'wb') as f:
+        f.write(memoryview(data)[:size])
+    os.rename(output_file + '.part', output_file)
+
+def _png_chunk(kind: bytes, data) -> bytes:
+    checksum = _crc32(data, _crc32(kind))
+    return pack('>I', len(data)) + kind + bytes(data) + pack('>I', checksum)
+
+crc32_table = None
+"""The lookup table of the CRC-32 of all byte values, created on first use by `_crc32` (firmware without `binascii.crc32`)"""
+
+adler32_block = 5552
+"""The maximum amount of bytes the Adler-32 sums can be accumulated over before they must be reduced (`NMAX` of zlib)"""
+
+def _crc32(data, value: int = 0) -> int:
+    global crc32_table
+    if crc32 is not None:
+        return crc32(data, value) & 0xffffffff
+    if crc32_table is None:
+        table = []
+        for byte in range(256):
+            for _ in range(8):
+                byte = (byte >> 1) ^ (0xedb88320 & -(byte & 1))
+            table.append(byte)
+        crc32_table = tuple(table)
+    table = crc32_table
+    value ^= 0xffffffff
+    for byte in data:
+        value = table[(value ^ byte) & 0xff] ^ (value >> 8)
+    return value ^ 0xffffffff
+
+def _adler32(data, value: int = 1) -> int:
+    # The sums are only reduced once per block of `adler32_block` bytes instead of per byte
+    a = value & 0xffff
+    b = value >> 16
+    view = memoryview(data)
+    for start in range(0, len(view), adler32_block):
+        for byte in view[start:start + adler32_block]:
+            a += byte
+            b += a
+        a %= 65521
+        b %= 65521
+    return (b << 16) | a
+
+def _scanlines(data, width: int, height: int, stride: int):
+    # Yield the PNG scanlines of the image, the same row buffer is reused for all rows
+    row_size = width * 3
+    view = memoryview(data)
+    row = bytearray(row_size + 1) # NOTE The first byte of each row is the filter type (0, none)
+    for y in range(height):
+        row[1:] = view[y * stride:y * stride + row_size]
+        yield row
+
+def _stored_zlib(rows) -> bytes:
+    # Create a zlib stream of uncompressed (stored) deflate blocks, one block per row
+    out = bytearray(b'\x78\x01')
+    checksum = 1
+    for row in rows:
+        out += pack('<BHH', 0, len(row), len(row) ^ 0xffff)
+        out += row
+        checksum = _adler32(row, checksum)
+    out += b'\x01\x00\x00\xff\xff' # Empty final block
+    out += pack('>I', checksum)
+    return bytes(out)
+
+def _compress_image(data, width: int, height: int, stride: int) -> bytes:
+    if zlib is not None:
+        compressor = zlib.compressobj(6)
+        return b''.join([compressor.compress(row) for row in _scanlines(data, width, height, stride)] + [compressor.flush()])
+    if deflate is not None:
+        try:
+            out = io.BytesIO()
+            stream = deflate.DeflateIO(out, deflate.ZLIB, 12)
+            for row in _scanlines(data, width, height, stride):
+                stream.write(row)
+            stream.close()
+            return out.getvalue()
+        except OSError: # NOTE Firmware built without deflate compression support
+            pass
+    return _stored_zlib(_scanlines(data, width, height, stride))
+
+def write_png(output_file: str, data, width: int, height: int, stride: int = None):
+    """
+    **Params:**
+    - `output_file` The file path to save the image to.
+    - `data` The RGB pixel data (3 bytes per pixel).
+    - `width` The width of the image.
+    - `height` The height of the image.
+    - `stride` The amount of bytes per row in `data`. Default is `width * 3`.
+
+    Write RGB pixel data to a PNG file.
+    The image data is compressed with the `deflate` module of micropython (or `zlib` in CPython), if the firmware lacks compression support it is stored uncompressed.
+    """
+    stride = stride if stride else width * 3
+    ihdr = pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0) # depth, color type RGB, compression, filter, interlace
+    with open(output_file, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(_png_chunk(b'IHDR', ihdr))
+        f.write(_png_chunk(b'IDAT', _compress_image(data, width, height, stride)))
+        f.write(_png_chunk(b'IEND', b''))
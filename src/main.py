@@ -1,68 +1,383 @@
 import sys
 if sys.implementation.name == "micropython":
     import cli
+    import json
+    import random
+    import lvgl as lv
+    from display_driver_utils import driver
+    from global_definitions import server_result_prefix
+    from image_formats import format_for_file
+    from shards import ShardWriter
+    from style_cache import default_style_cache
+    from heap_check import check_heap, ScreenTracker
+    from encode_pipeline import EncodePipeline
+    from profiler import profiler
+    from seeding import derive_seed, random_base_seed
     from screenshot_v2 import take_screenshot
-    from yolo import write_yolo_normalized, write_yolo_pixel
+    from yolo import write_yolo_normalized, write_yolo_pixel, label_file_for, LabelManifest
     from random_ui import RandomUI
-    from design_parser import UiLoader
+    from design_template import DesignTemplate
 else:
     import mock
+    import json
+    import random
     from .cli import *
+    from .mock.lvgl import lv
+    from .mock.display import driver
+    from .global_definitions import server_result_prefix
+    from .image_formats import format_for_file
+    from .shards import ShardWriter
+    from .style_cache import default_style_cache
+    from .heap_check import check_heap, ScreenTracker
+    from .encode_pipeline import EncodePipeline
+    from .profiler import profiler
+    from .seeding import derive_seed, random_base_seed
     from .screenshot_v2 import take_screenshot
-    from .yolo import write_yolo_normalized, write_yolo_pixel
+    from .yolo import write_yolo_normalized, write_yolo_pixel, label_file_for, LabelManifest
     from .random_ui import RandomUI
-    from .design_parser import UiLoader
+    from .design_template import DesignTemplate
 
 ui = None
 # WINDOW_WIDTH = 800
 # WINDOW_HEIGHT = 800
 
+def numbered_output_file(output_file: str, index: int) -> str:
+    """
+    **Params:**
+    - `output_file` The output file path provided by the user.
+    - `index` The index of the sample in the batch.
+
+    **Returns:**
+    - `str` The output file path with the zero-padded sample index inserted before the file extension.
+
+    Create the output file path of a sample in batch mode, e.g. `screenshot.jpg` becomes `screenshot_000042.jpg`.
+    """
+    dot = output_file.rfind('.')
+    if dot <= output_file.rfind('/'):
+        return f"{output_file}_{index:06d}"
+    return f"{output_file[:dot]}_{index:06d}{output_file[dot:]}"
+
+def create_sample(mode: str, generator):
+    """
+    **Params:**
+    - `mode` The mode of the generator (`design` or `random`).
+    - `generator` The `DesignTemplate` (design mode) or `RandomUI` (random mode) object used to create the UI.
+
+    **Returns:**
+    - `UI` The UI object containing the metadata of the created sample.
+
+    **Raises**:
+    - `ValueError` If UI object is None.
+    - `ValueError` If root widget is None.
+
+    Create the UI of a single sample on the currently active screen.
+    """
+    if mode == 'design':
+        generator.parse_ui()
+    elif mode == 'random':
+        generator.create_random_ui()
+    sample_ui = generator.get_ui()
+    if sample_ui is None:
+        raise ValueError('UI object is None')
+    if generator.get_root_widget() is None:
+        raise ValueError('Root widget is None')
+    return sample_ui
+
+def generate_sample(mode: str, generator, output_file: str, normalize: bool, idle_screen: lv.obj, image_format: str = None, label_writer = None):
+    """
+    **Params:**
+    - `mode` The mode of the generator (`design` or `random`).
+    - `generator` The `DesignTemplate` (design mode) or `RandomUI` (random mode) object used to create the UI.
+    - `output_file` The file path to save the screenshot to.
+    - `normalize` A flag to determine if the bounding boxes should be normalized.
+    - `idle_screen` The screen which is loaded while the sample screen is deleted.
+    - `image_format` The output format of the screenshot, inferred from the output file extension if not provided.
+    - `label_writer` A function, which is called with the UI object to write the annotation instead of the `.txt` file (e.g. `LabelManifest.add`).
+
+    **Returns:**
+    - `UI` The UI object containing the metadata of the created sample.
+
+    Generate a single sample on a fresh screen: create the UI, write the YOLO annotation and take the screenshot next to it.
+    The sample screen is deleted afterwards by the cleanup of the generator, which deletes all widgets of the sample and releases the styles of the sample to the style cache of the generator.
+    The cleanup also runs if the sample fails, so no widgets are leaked by failed samples (e.g. failed jobs in server mode).
+    """
+    global ui
+    screen = lv.obj()
+    lv.screen_load(screen)
+    try:
+        ui = create_sample(mode, generator)
+        write_label(ui, output_file, normalize, label_writer)
+        print(f"Taking screenshot: {output_file}")
+        take_screenshot(output_file, image_format=image_format)
+    finally:
+        # NOTE The sample screen is deleted even if the sample failed, since the server keeps running after failed jobs
+        print(f'Cleanup of sample: {output_file}')
+        lv.screen_load(idle_screen)
+        generator.cleanup(screen)
+    return ui
+
+def write_label(sample_ui, output_file: str, normalize: bool, label_writer = None):
+    """
+    **Params:**
+    - `sample_ui` The UI object of the sample.
+    - `output_file` The file path of the screenshot, the annotation is written next to it (see `yolo.label_file_for`).
+    - `normalize` A flag to determine if the bounding boxes should be normalized.
+    - `label_writer` A function, which is called with the UI object to write the annotation instead of the `.txt` file.
+
+    Write the YOLO annotation of a sample.
+    It is written before the screenshot, so the annotation exists once a consumer of the output directory sees the screenshot (e.g. the encoding sidecar of `bin_to_jpg_conversion.py`).
+    """
+    start = profiler.start()
+    if label_writer is not None:
+        label_writer(sample_ui)
+    elif normalize:
+        write_yolo_normalized(sample_ui, output_file=label_file_for(output_file), width=sample_ui.width, height=sample_ui.height)
+    else:
+        write_yolo_pixel(sample_ui, output_file=label_file_for(output_file))
+    profiler.stop('label_write', start)
+
+def submit_sample(mode: str, generator, output_file: str, normalize: bool, idle_screen: lv.obj, pipeline: EncodePipeline, image_format: str, done = None, label_writer = None):
+    """
+    **Params:**
+    - `mode` The mode of the generator (`design` or `random`).
+    - `generator` The `DesignTemplate` (design mode) or `RandomUI` (random mode) object used to create the UI.
+    - `output_file` The file path to save the screenshot to.
+    - `normalize` A flag to determine if the bounding boxes should be normalized.
+    - `idle_screen` The screen which is loaded while the sample screen is deleted.
+    - `pipeline` The encode pipeline, which writes the screenshot.
+    - `image_format` The output format of the screenshot.
+    - `done` A function, which is called by the pipeline after the files of the sample are written.
+    - `label_writer` A function, which is called with the UI object to write the annotation instead of the `.txt` file (e.g. `LabelManifest.add`).
+
+    **Returns:**
+    - `UI` The UI object containing the metadata of the created sample.
+
+    Generate a single sample like `generate_sample`, but hand the snapshot to the encode pipeline (see `encode_pipeline.EncodePipeline`).
+    The annotation is written right away and the sample screen is cleaned up after the snapshot, so the next sample is built while the screenshot of this sample is encoded.
+    """
+    global ui
+    screen = lv.obj()
+    lv.screen_load(screen)
+    try:
+        sample_ui = create_sample(mode, generator)
+        ui = sample_ui
+        write_label(sample_ui, output_file, normalize, label_writer)
+        print(f"Queueing screenshot: {output_file}")
+        pipeline.submit(output_file, image_format, done)
+    finally:
+        print(f'Cleanup of sample: {output_file}')
+        lv.screen_load(idle_screen)
+        generator.cleanup(screen)
+    return sample_ui
+
+def check_sample_heap(mode: str, generator, cycles: int, idle_screen: lv.obj) -> dict:
+    """
+    **Params:**
+    - `mode` The mode of the generator (`design` or `random`).
+    - `generator` The `DesignTemplate` (design mode) or `RandomUI` (random mode) object used to create the UI.
+    - `cycles` The amount of generate and cleanup cycles.
+    - `idle_screen` The screen which is loaded while the sample screen is deleted.
+
+    **Returns:**
+    - `dict` The result of the heap check (see `heap_check.check_heap`).
+
+    **Raises:**
+    - `AssertionError` If the LVGL heap (or the LVGL objects) do not return to their baseline.
+
+    Check that the generator does not leak LVGL objects: samples are created and cleaned up like in `generate_sample`, but no files are written.
+    If the LVGL heap can not be measured, the objects on the idle screen and on the sample screens which were not deleted are counted (see `heap_check.heap_usage`).
+    """
+    screens = []
+    tracker = ScreenTracker()
+    def create():
+        screen = lv.obj()
+        tracker.track(screen)
+        lv.screen_load(screen)
+        create_sample(mode, generator)
+        screens.append(screen)
+    def cleanup():
+        lv.screen_load(idle_screen)
+        generator.cleanup(screens.pop())
+    return check_heap(create, cleanup, cycles, style_cache=generator.style_cache, screens=[idle_screen], tracker=tracker)
+
+def serve(args):
+    """
+    **Params:**
+    - `args` The parsed CLI arguments of the server mode.
+
+    Run the generator as a long-lived worker process, which generates one sample per job read from stdin.
+    The display driver is created once with the size provided on the command line, all jobs must use that size.
+
+    **Protocol:**
+    - Each job is a single line containing a JSON object. Jobs are processed in order.
+    - Each job is answered by exactly one result line on stdout, which is prefixed with `global_definitions.server_result_prefix` and followed by a JSON object.
+      All other stdout lines are diagnostic output of the generator and should be ignored by the client.
+    - The server exits on end of input or on a job with `"mode": "shutdown"` (which is answered with a result as well).
+
+    **Job keys:**
+    - `id` (optional) Any JSON value, which is echoed in the result.
+    - `mode` Either `random`, `design` or `shutdown`.
+    - `output_file` The file path of the screenshot, the annotation is written next to it (`.txt`).
+    - `format` (optional) The output format of the screenshot (`jpg`, `png`, `npy` or `bin`), inferred from the output file extension by default.
+    - `normalize` (optional) Normalize the bounding boxes. Default is false.
+    - `seed` (optional) The base seed of the sample.
+    - `index` (optional) The index of the sample, the sample is the same as sample `index` of a batch run with the base seed (see `seeding.derive_seed`). Default is 0.
+    - Random mode: `widget_count`, `widget_types` (list), `layout` (optional, default `none`), `random_state` (optional), `spatial_map` (optional), `width` and `height` (optional, must match the display).
+    - Design mode: `file` The path to the JSON design file, the window size must match the display.
+
+    **Result keys:**
+    - `id` The echoed job id (`null` if not provided).
+    - `status` Either `ok` or `error`.
+    - `output_file` and `label_file` The written files (if `ok`).
+    - `count` The amount of annotated widgets (if `ok`).
+    - `error` The error message (if `error`).
+
+    **Example:**
+    ```
+    > {"id": 1, "mode": "random", "output_file": "out/1.jpg", "widget_count": 4, "widget_types": ["button", "slider"], "seed": 1}
+    < @result {"id": 1, "status": "ok", "output_file": "out/1.jpg", "label_file": "out/1.txt", "count": 4}
+    ```
+    """
+    width, height = int(args.width), int(args.height)
+    default_style_cache.budget = int(args.style_budget)
+    driver(width=width, height=height)
+    idle_screen = lv.screen_active()
+    random.seed(random_base_seed()) # NOTE Jobs without a seed continue this random sequence
+    loaders = {}
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        job_id = None
+        try:
+            job = json.loads(line)
+            job_id = job.get('id', None)
+            mode = job.get('mode', None)
+            if mode == 'shutdown':
+                write_server_result({'id': job_id, 'status': 'ok'})
+                break
+            if mode not in ('random', 'design'):
+                raise ValueError(f'Invalid job mode: {mode}')
+            output_file = job['output_file']
+            if mode == 'design':
+                if job['file'] not in loaders:
+                    loaders[job['file']] = DesignTemplate(job['file'])
+                generator = loaders[job['file']]
+            else:
+                generator = RandomUI(job.get('width', width), job.get('height', height), job['widget_count'], job['widget_types'], output_file, job.get('layout', 'none'), job.get('random_state', False), create_driver=False, spatial_map=job.get('spatial_map', 'free'))
+            if generator.width != width or generator.height != height:
+                raise ValueError(f'Job size {generator.width}x{generator.height} does not match the display size {width}x{height}')
+            if job.get('seed', None) is not None:
+                random.seed(derive_seed(int(job['seed']), int(job.get('index', 0))))
+            sample_ui = generate_sample(mode, generator, output_file, job.get('normalize', False), idle_screen, job.get('format', None))
+            write_server_result({'id': job_id, 'status': 'ok', 'output_file': output_file, 'label_file': label_file_for(output_file), 'count': sample_ui.count})
+        except Exception as e:
+            write_server_result({'id': job_id, 'status': 'error', 'error': f'{type(e).__name__}: {e}'})
+
+def write_server_result(result: dict):
+    """
+    **Params:**
+    - `result` The result object of a job.
+
+    Write a result line of the server protocol to stdout (see `serve`).
+    """
+    sys.stdout.write(server_result_prefix + json.dumps(result) + '\n')
+    if hasattr(sys.stdout, 'flush'):
+        sys.stdout.flush()
+
 def main():
     """
     **Raises**:
+    - `ValueError` If the sample count is smaller than 1.
+    - `ValueError` If the output format is invalid or can not be inferred from the output file.
     - `ValueError` If UI object is None.
     - `ValueError` If root widget is None.
 
     Main function to generate UI and take screenshot.
+
+    The display driver and LVGL context are created once, after which `count` samples are generated in a loop.
+    Each sample is built on a fresh screen, which is deleted (including all widgets on it) after the screenshot and annotation are written.
+    When more than one sample is requested or a start index is provided, the output files are numbered with the sample index (see `numbered_output_file`).
+    If a shard prefix is provided, the screenshot and annotation of each sample are appended to tar shards instead (see `shards.ShardWriter`), using the sample index as key.
+    In crop mode, the annotations always contain pixel bounding boxes, which are used to extract the widgets of each screenshot by `crop_extractor.py`.
+    If a pipeline depth is provided, the screenshots and annotations are written by a worker thread while the next samples are built (see `submit_sample`).
+    If a manifest is provided, the annotations of all samples are appended to it instead of writing a `.txt` file per sample (see `yolo.LabelManifest`).
+    If a heap check is requested, the samples are only created and cleaned up to check for leaks of LVGL objects and memory instead (see `check_sample_heap`).
+    Each sample is seeded with a seed derived from the base seed and its index (see `seeding.derive_seed`), so every sample can be re-rendered on its own and any range of indices can be generated by any process.
+    If no base seed is provided, a random base seed is used and printed.
+    In server mode, jobs are read from stdin instead (see `serve`).
     """
-    global ui
     args = cli.process_arguments()
-    root_widget = None
+    if args.mode == 'server':
+        print('Server mode')
+        serve(args)
+        return
+    count = int(args.count) # NOTE Micropythons argparse ignores the type argument
+    if count < 1:
+        raise ValueError(f'Invalid sample count: {count} (must be at least 1)')
+    default_style_cache.budget = int(args.style_budget)
+    writer = ShardWriter(args.shard, int(args.shard_size)) if args.shard else None
+    image_format = format_for_file(args.output_file if args.output_file else 'sample.jpg', args.image_format)
+    normalize = args.normalize
+    if args.crops and normalize:
+        print('Crop mode: writing pixel bounding boxes, --normalize is ignored')
+        normalize = False
     if args.mode == 'design':
         print('Design mode')
-        loader = UiLoader(args.file)
-        loader.initialize_screen()
-        loader.parse_ui()
-        ui = loader.get_ui()
-        root_widget = loader.get_root_widget()
-        ui["width"] = loader.width
-        ui["height"] = loader.height
+        generator = DesignTemplate(args.file)
+        generator.initialize_screen()
     elif args.mode == 'random':
         print('Random mode')
         random_state = args.random_state if args.random_state else False
-        generator = RandomUI(args.width, args.height, args.widget_count, args.widget_types, args.output_file, args.layout, random_state)
+        generator = RandomUI(args.width, args.height, args.widget_count, args.widget_types, args.output_file, args.layout, random_state, spatial_map=args.spatial_map)
         print(f"Width: {generator.width}, Height: {generator.height}, Widget Count: {generator.widget_count}, Widget Types: {generator.widget_types}, Output File: {generator.output_file}, Layout: {generator.layout}")
-        generator.create_random_ui()
-        ui = generator.get_ui()
-        root_widget = generator.get_root_widget()
-        ui["width"] = args.width
-        ui["height"] = args.height
-    if ui is None:
-        raise ValueError('UI object is None')
-    if root_widget is None:
-        raise ValueError('Root widget is None')
-    print("Taking screenshot...")
-    take_screenshot(args.output_file)
-    if args.normalize:
-        write_yolo_normalized(ui, output_file=args.output_file.replace('.jpg', '.txt'), width=ui['width'], height=ui['height'])
-    else:
-        write_yolo_pixel(ui, output_file=args.output_file.replace('.jpg', '.txt'))
-    if args.mode == 'design':
-        print('Design mode cleanup')
-        loader.cleanup()
-    elif args.mode == 'random':
-        print('Random mode cleanup')
-        generator.cleanup()
+    start_index = int(args.start_index) if args.start_index is not None else 0
+    numbered = count > 1 or args.start_index is not None
+    # NOTE The default screen of the display is kept as an idle screen, which is active while a sample screen is deleted
+    idle_screen = lv.screen_active()
+    if args.heap_check:
+        check_sample_heap(args.mode, generator, int(args.heap_check), idle_screen)
+        return
+    base_seed = int(args.seed) if args.seed is not None else random_base_seed()
+    print(f"Base seed: {base_seed}")
+    manifest = LabelManifest(args.manifest, normalize) if args.manifest else None
+    pipeline = EncodePipeline(int(args.pipeline)) if args.pipeline else None
+    try:
+        for index in range(start_index, start_index + count):
+            if writer is not None:
+                output_file = writer.temp_file(image_format, index if pipeline is not None else None)
+            else:
+                output_file = numbered_output_file(args.output_file, index) if numbered else args.output_file
+            random.seed(derive_seed(base_seed, index))
+            print(f"Sample [{index - start_index + 1}/{count}]")
+            files = [output_file] if manifest is not None else [output_file, label_file_for(output_file)]
+            label_writer = None
+            if manifest is not None:
+                image_file = writer.member_name(index, output_file) if writer is not None else output_file
+                label_writer = lambda sample_ui, index=index, image_file=image_file: manifest.add(sample_ui, index, image_file)
+            if pipeline is not None:
+                done = (lambda index=index, files=files: writer.add_sample(index, files)) if writer is not None else None
+                submit_sample(args.mode, generator, output_file, normalize, idle_screen, pipeline, image_format, done, label_writer)
+            else:
+                generate_sample(args.mode, generator, output_file, normalize, idle_screen, image_format, label_writer)
+                if writer is not None:
+                    writer.add_sample(index, files)
+        print(default_style_cache)
+    finally:
+        # NOTE Closing the pipeline raises the first error of its worker, the shards and the manifest are closed regardless
+        try:
+            if pipeline is not None:
+                pipeline.close()
+        finally:
+            try:
+                if writer is not None:
+                    writer.close()
+            finally:
+                if manifest is not None:
+                    manifest.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,74 @@
+import sys
+if sys.implementation.name == "micropython":
+    import time
+    try:
+        from pixel_ops_native import swap_red_blue
+    except (ImportError, SyntaxError): # NOTE Firmware without native code emitter
+        swap_red_blue = None
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    import time
+    swap_red_blue = None
+    ticks_us = lambda: int(time.perf_counter() * 1000000)
+    ticks_diff = lambda end, start: end - start
+
+def bgr_to_rgb_loop(data):
+    """
+    **Params**
+    - `data` A flat bytearray in BGR format.
+
+    Swap the BGR values to RGB in a flat bytearray, using a loop over all pixels. (reference implementation)
+    """
+    for i in range(0, len(data) - 2, 3):
+        data[i], data[i+2] = data[i+2], data[i]  # Swap the B and R values
+    return data
+
+def bgr_to_rgb(data):
+    """
+    **Params**
+    - `data` A flat bytearray (or writable memoryview) in BGR format.
+
+    **Returns**
+    - The same buffer, now in RGB format.
+
+    Swap the BGR values to RGB in place, without copying the buffer.
+    Uses the native viper routine if available, otherwise a stepped slice assignment and only as a last resort a loop over all pixels.
+    """
+    length = len(data) - len(data) % 3
+    if swap_red_blue is not None:
+        swap_red_blue(data, length)
+        return data
+    try:
+        blue = bytes(data[0:length:3]) # NOTE Copy, since slices of a memoryview are views
+        data[0:length:3] = data[2:length:3]
+        data[2:length:3] = blue
+    except NotImplementedError: # NOTE Micropython only supports slices with step 1 on buffers
+        bgr_to_rgb_loop(data)
+    return data
+
+def measure_bgr_to_rgb(width: int = 640, height: int = 640, repeat: int = 3):
+    """
+    **Params**
+    - `width` The width of the measured frame.
+    - `height` The height of the measured frame.
+    - `repeat` The amount of measured conversions per implementation.
+
+    **Returns**
+    - `dict` The throughput in megapixels per second per implementation: `loop` and the path taken by `bgr_to_rgb` (`viper` or `slice`).
+
+    Measure the throughput of the BGR to RGB conversion of a frame, comparing the reference loop with `bgr_to_rgb`.
+    """
+    data = bytearray(width * height * 3)
+    results = {}
+    for name, function in (('loop', bgr_to_rgb_loop), ('viper' if swap_red_blue is not None else 'slice', bgr_to_rgb)):
+        start = ticks_us()
+        for _ in range(repeat):
+            function(data)
+        elapsed = ticks_diff(ticks_us(), start)
+        results[name] = (width * height * repeat) / elapsed if elapsed > 0 else 0
+        print(f"{name}: {elapsed / repeat / 1000:.1f} ms per {width}x{height} frame ({results[name]:.2f} MPixel/s)")
+    return results
+
+if __name__ == "__main__":
+    measure_bgr_to_rgb()
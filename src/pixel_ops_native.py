@@ -0,0 +1,23 @@
+"""
+Native code routines for pixel buffers, compiled with the viper code emitter of micropython.
+
+This module is only available in micropython with native code emitters enabled (e.g. the unix port), use `pixel_ops` instead of importing it directly.
+"""
+import micropython
+
+@micropython.viper
+def swap_red_blue(data, length: int):
+    """
+    **Params**
+    - `data` A writable buffer (bytearray or memoryview) with 3 bytes per pixel.
+    - `length` The amount of bytes to process (must be a multiple of 3).
+
+    Swap the first and third byte of each pixel in place.
+    """
+    buf = ptr8(data)
+    i = 0
+    while i < length:
+        tmp = buf[i]
+        buf[i] = buf[i + 2]
+        buf[i + 2] = tmp
+        i += 3
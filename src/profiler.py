@@ -0,0 +1,107 @@
+"""
+A lightweight stage profiler of the generation pipeline, used by the benchmark (see `benchmark.py`).
+
+The stages of the pipeline (e.g. widget creation, layout update, snapshot, encoding) are instrumented with pairs of `start` and `stop` calls on the shared `profiler` instance:
+
+```python
+start = profiler.start()
+widget = create_widget(element)
+profiler.stop('widget_creation', start)
+```
+
+The profiler is disabled by default, in which case `start` and `stop` return right away, so the instrumentation does not slow down normal runs.
+If heap tracking is enabled, the used LVGL heap is sampled after each stage to record its peak.
+This requires the builtin allocator of LVGL (`LV_STDLIB_BUILTIN`), with any other allocator `lv.mem_monitor` reports nothing and heap tracking is turned off (the peak is `None`).
+"""
+import sys
+if sys.implementation.name == "micropython":
+    import time
+    import lvgl as lv
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    import mock
+    import time
+    from .mock.lvgl import lv
+    ticks_us = lambda: int(time.perf_counter() * 1000000)
+    ticks_diff = lambda end, start: end - start
+
+stages = ['driver_init', 'widget_creation', 'style', 'placement', 'layout', 'snapshot', 'encode', 'label_write']
+"""The instrumented stages of the generation pipeline"""
+
+class Profiler:
+    """
+    Accumulator of the time spent in the stages of the generation pipeline.
+
+    **Object Attributes:**
+    - `enabled` Whether stages are measured.
+    - `track_heap` Whether the used LVGL heap is sampled after each stage.
+    - `stages` A dictionary of stage name to `[total time in microseconds, count]`.
+    - `heap_peak` The peak of the sampled LVGL heap usage in bytes (`None` if the LVGL heap can not be measured).
+    """
+    def __init__(self):
+        self.enabled = False
+        self.track_heap = False
+        self.stages = {}
+        self.heap_peak = 0
+        self._monitor = None
+
+    def reset(self):
+        """Discard all measurements."""
+        self.stages = {}
+        if self.heap_peak is not None:
+            self.heap_peak = 0
+
+    def start(self) -> int:
+        """
+        **Returns:**
+        - `int` The start time of a stage, which is passed to `stop`.
+        """
+        return ticks_us() if self.enabled else 0
+
+    def stop(self, stage: str, start: int):
+        """
+        **Params:**
+        - `stage` The name of the stage (see `stages`).
+        - `start` The start time returned by `start`.
+
+        Add the time since `start` to the stage.
+        """
+        if not self.enabled:
+            return
+        elapsed = ticks_diff(ticks_us(), start)
+        entry = self.stages.get(stage, None)
+        if entry is None:
+            self.stages[stage] = [elapsed, 1]
+        else:
+            entry[0] += elapsed
+            entry[1] += 1
+        if self.track_heap:
+            self.sample_heap()
+
+    def sample_heap(self):
+        """Sample the used LVGL heap and update the peak, heap tracking is turned off if the LVGL heap can not be measured."""
+        if self._monitor is None:
+            self._monitor = lv.mem_monitor_t()
+        lv.mem_monitor(self._monitor)
+        if not self._monitor.total_size:
+            print('Profiler: lv.mem_monitor does not report the heap (LVGL is not built with its builtin allocator), heap tracking is turned off')
+            self.track_heap = False
+            self.heap_peak = None
+            return
+        used = self._monitor.total_size - self._monitor.free_size
+        if used > self.heap_peak:
+            self.heap_peak = used
+
+    def results(self, samples: int = 1) -> dict:
+        """
+        **Params:**
+        - `samples` The amount of samples the measurements are averaged over.
+
+        **Returns:**
+        - `dict` A dictionary of stage name to `{'total_ms', 'count', 'ms_per_sample'}` of all measured stages.
+        """
+        return {stage: {'total_ms': total / 1000, 'count': count, 'ms_per_sample': total / 1000 / samples} for stage, (total, count) in self.stages.items()}
+
+profiler = Profiler()
+"""The profiler shared by all instrumented modules"""
@@ -5,10 +5,12 @@ if sys.implementation.name == "micropython":
     import random
     # NOTE typing not available in micropython and making it work is difficult
     # from typing import List, Tuple, Self
-    import time
     from ui import UI
     from widget import *
     from global_definitions import widget_types, ascii_letters
+    from style_cache import default_style_cache
+    from profiler import profiler
+    from bbox import BoxExtractor
 else:
     import mock
     from .mock.display import driver
@@ -16,9 +18,11 @@ else:
     from .ui import UI
     from .widget import *
     from .global_definitions import widget_types, ascii_letters
+    from .style_cache import default_style_cache
+    from .profiler import profiler
+    from .bbox import BoxExtractor
     import random
     # from typing import List, Tuple, Self
-    import time
 
 class SpatialMap:
     """
@@ -70,6 +74,335 @@ class SpatialMap:
         """
         self.occupied.append({'x': x, 'y': y, 'width': w, 'height': h})
 
+    def find_position(self, w, h, max_attempts: int = 100):
+        """
+        **Params:**
+        - `w` The width of the space.
+        - `h` The height of the space.
+        - `max_attempts` The amount of random positions to try.
+
+        **Returns:**
+        - `tuple[int, int] | None` The position of an available space, or None if no available space was found.
+
+        Find an available space by trying random positions within the container.
+        """
+        if w > self.width or h > self.height:
+            return None
+        for _ in range(max_attempts):
+            x = random.randint(0, self.width - w)
+            y = random.randint(0, self.height - h)
+            if self.is_space_available(x, y, w, h):
+                return x, y
+        return None
+
+class GridSpatialMap(SpatialMap):
+    """
+    A spatial map using a uniform grid of cells as occupancy index to keep track of occupied areas in a container.
+
+    Each cell stores the indices of the occupied areas overlapping it, cells which are completely covered by an occupied area are additionally flagged as full.
+    Checking a space only inspects the areas registered in the cells it covers, which makes the check independent of the total amount of occupied areas.
+    The results are identical to the linear scan of `SpatialMap`.
+
+    **Object Attributes:**
+    - `width` The width of the container.
+    - `height` The height of the container.
+    - `cell_size` The width and height of a grid cell in pixels.
+    - `columns` The amount of grid columns.
+    - `rows` The amount of grid rows.
+    - `occupied` A flat list of occupied areas in the container (x, y, width, height of each area).
+    - `cells` A list of area index lists per grid cell (`None` for cells without areas).
+    - `full` A bytearray flagging the grid cells which are completely covered by an area.
+    """
+    def __init__(self, width, height, cell_size: int = 32):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.columns = max(1, (width + cell_size - 1) // cell_size)
+        self.rows = max(1, (height + cell_size - 1) // cell_size)
+        self.occupied = []
+        self.cells = [None] * (self.columns * self.rows)
+        self.full = bytearray(self.columns * self.rows)
+
+    def _cell_range(self, x, y, w, h):
+        """
+        **Returns:**
+        - `tuple[int, int, int, int]` The first and last column and row of the grid cells covered by the given space (at least one cell).
+        """
+        cs = self.cell_size
+        c0 = min(max(x // cs, 0), self.columns - 1)
+        r0 = min(max(y // cs, 0), self.rows - 1)
+        c1 = min(max((x + max(w, 1) - 1) // cs, c0), self.columns - 1)
+        r1 = min(max((y + max(h, 1) - 1) // cs, r0), self.rows - 1)
+        return c0, c1, r0, r1
+
+    def is_space_available(self, x, y, w, h):
+        """
+        **Params:**
+        - `x` The x-coordinate of the space.
+        - `y` The y-coordinate of the space.
+        - `w` The width of the space.
+        - `h` The height of the space.
+
+        **Returns:**
+        - `bool` True if the space is available, False otherwise.
+
+        Check if the given space is available for a widget.
+        """
+        # Check if within container boundaries
+        if x + w > self.width or y + h > self.height:
+            return False
+
+        # Check for overlap with the widgets registered in the covered cells
+        c0, c1, r0, r1 = self._cell_range(x, y, w, h)
+        cells, full, occupied, columns = self.cells, self.full, self.occupied, self.columns
+        for row in range(r0, r1 + 1):
+            for cell in range(row * columns + c0, row * columns + c1 + 1):
+                if full[cell]:
+                    return False
+                indices = cells[cell]
+                if indices is None:
+                    continue
+                for i in indices:
+                    ox, oy, ow, oh = occupied[i], occupied[i + 1], occupied[i + 2], occupied[i + 3]
+                    if not (x + w <= ox or x >= ox + ow or y + h <= oy or y >= oy + oh):
+                        return False
+
+        return True
+
+    def occupy_space(self, x, y, w, h):
+        """
+        **Params:**
+        - `x` The x-coordinate of the space.
+        - `y` The y-coordinate of the space.
+        - `w` The width of the space.
+        - `h` The height of the space.
+
+        Mark the given space as occupied, by adding it to the list of occupied areas and registering it in all covered grid cells.
+        """
+        index = len(self.occupied)
+        self.occupied.extend((x, y, w, h))
+        cs, columns = self.cell_size, self.columns
+        c0, c1, r0, r1 = self._cell_range(x, y, w, h)
+        for row in range(r0, r1 + 1):
+            for column in range(c0, c1 + 1):
+                cell = row * columns + column
+                if self.cells[cell] is None:
+                    self.cells[cell] = [index]
+                else:
+                    self.cells[cell].append(index)
+                # Flag the cell as full if the area covers it completely
+                if x <= column * cs and y <= row * cs and x + w >= (column + 1) * cs and y + h >= (row + 1) * cs:
+                    self.full[cell] = 1
+
+class FreeRectMap(SpatialMap):
+    """
+    A spatial map keeping track of the maximal free rectangles in a container. (maximal rectangles algorithm)
+
+    Any free space in the container is contained in at least one of the maximal free rectangles.
+    This allows to enumerate all positions a widget fits in without trial and error:
+    the positions of a widget inside a free rectangle form a rectangular region, and the union of these regions are all valid positions.
+
+    **Object Attributes:**
+    - `width` The width of the container.
+    - `height` The height of the container.
+    - `occupied` A flat list of occupied areas in the container (x, y, width, height of each area).
+    - `free` A list of maximal free rectangles in the container as tuples of (x, y, width, height).
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.occupied = []
+        self.free = [(0, 0, width, height)]
+
+    def is_space_available(self, x, y, w, h):
+        """
+        **Params:**
+        - `x` The x-coordinate of the space.
+        - `y` The y-coordinate of the space.
+        - `w` The width of the space.
+        - `h` The height of the space.
+
+        **Returns:**
+        - `bool` True if the space is available, False otherwise.
+
+        Check if the given space is available for a widget, i.e. if it is contained in a free rectangle.
+        """
+        if x < 0 or y < 0 or x + w > self.width or y + h > self.height:
+            return False
+        for fx, fy, fw, fh in self.free:
+            if fx <= x and fy <= y and x + w <= fx + fw and y + h <= fy + fh:
+                return True
+        return False
+
+    def occupy_space(self, x, y, w, h):
+        """
+        **Params:**
+        - `x` The x-coordinate of the space.
+        - `y` The y-coordinate of the space.
+        - `w` The width of the space.
+        - `h` The height of the space.
+
+        Mark the given space as occupied.
+        Each free rectangle overlapping the space is split into the (up to four) maximal rectangles around it,
+        afterwards rectangles contained in other free rectangles are removed.
+        """
+        self.occupied.extend((x, y, w, h))
+        if w <= 0 or h <= 0:
+            return
+        free = []
+        split = []
+        for rect in self.free:
+            fx, fy, fw, fh = rect
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                free.append(rect)
+                continue
+            if x > fx:
+                split.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                split.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                split.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                split.append((fx, y + h, fw, fy + fh - y - h))
+        # Only the new rectangles can be contained in others, untouched rectangles were maximal before
+        for i, rect in enumerate(split):
+            rx, ry, rw, rh = rect
+            contained = False
+            for j, other in enumerate(split):
+                ox, oy, ow, oh = other
+                if i != j and ox <= rx and oy <= ry and rx + rw <= ox + ow and ry + rh <= oy + oh and (other != rect or j < i):
+                    contained = True
+                    break
+            if not contained:
+                for ox, oy, ow, oh in free:
+                    if ox <= rx and oy <= ry and rx + rw <= ox + ow and ry + rh <= oy + oh:
+                        contained = True
+                        break
+            if not contained:
+                free.append(rect)
+        self.free = free
+
+    def find_position(self, w, h, max_attempts: int = 100):
+        """
+        **Params:**
+        - `w` The width of the space.
+        - `h` The height of the space.
+        - `max_attempts` Unused, the search is exhaustive. (kept for interface compatibility)
+
+        **Returns:**
+        - `tuple[int, int] | None` A uniformly chosen position of an available space, or None if the space does not fit anywhere.
+
+        Find an available space by choosing uniformly among all positions the space fits in.
+        A free rectangle is chosen weighted by the amount of positions it offers and a position inside it is chosen uniformly.
+        Since free rectangles overlap, the position is accepted with a probability of 1/n (where n is the amount of free rectangles offering that position),
+        which makes the choice uniform over the union of all positions. Each try is accepted with a probability of at least 1/(amount of free rectangles).
+        """
+        regions = []
+        total = 0
+        for fx, fy, fw, fh in self.free:
+            if w <= fw and h <= fh:
+                count = (fw - w + 1) * (fh - h + 1)
+                regions.append((fx, fy, fx + fw - w, fy + fh - h, count))
+                total += count
+        if total == 0:
+            return None
+        while True:
+            pick = random.randint(0, total - 1)
+            for x0, y0, x1, y1, count in regions:
+                if pick < count:
+                    break
+                pick -= count
+            x = random.randint(x0, x1)
+            y = random.randint(y0, y1)
+            n = 0
+            for rx0, ry0, rx1, ry1, _ in regions:
+                if rx0 <= x <= rx1 and ry0 <= y <= ry1:
+                    n += 1
+            if n == 1 or random.randint(1, n) == 1:
+                return x, y
+
+spatial_map_types = {
+    "free": FreeRectMap,
+    "linear": SpatialMap,
+    "grid": GridSpatialMap
+}
+"""A mapping of spatial map names to their classes (`linear` is the original implementation of random retries, kept for comparison)"""
+
+STYLE_INT = 0
+"""Style property kind: random integer in the range `[low, high]`"""
+STYLE_COLOR = 1
+"""Style property kind: random color, created from a random integer in the range `[low, high]`"""
+STYLE_CHOICE = 2
+"""Style property kind: random choice of the tuple of values in `low`"""
+
+style_properties = (
+    (lv.style_t.set_bg_color, STYLE_COLOR, 0, 0xFFFFFF),
+    (lv.style_t.set_bg_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_border_color, STYLE_COLOR, 0, 0xFFFFFF),
+    (lv.style_t.set_border_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_border_width, STYLE_INT, 0, 10),
+    (lv.style_t.set_outline_width, STYLE_INT, 0, 10),
+    (lv.style_t.set_outline_color, STYLE_COLOR, 0, 0xFFFFFF),
+    (lv.style_t.set_outline_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_shadow_width, STYLE_INT, 0, 15),
+    (lv.style_t.set_shadow_offset_x, STYLE_INT, 0, 10),
+    (lv.style_t.set_shadow_offset_y, STYLE_INT, 0, 10),
+    (lv.style_t.set_shadow_color, STYLE_COLOR, 0, 0xFFFFFF),
+    (lv.style_t.set_shadow_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_line_width, STYLE_INT, 0, 10),
+    (lv.style_t.set_line_dash_width, STYLE_INT, 0, 10),
+    (lv.style_t.set_line_dash_gap, STYLE_INT, 0, 10),
+    (lv.style_t.set_line_rounded, STYLE_CHOICE, (True, False), None),
+    (lv.style_t.set_line_color, STYLE_COLOR, 0, 0xFFFFFF),
+    (lv.style_t.set_line_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_text_color, STYLE_COLOR, 0, 0xFFFFFF),
+    (lv.style_t.set_text_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_text_letter_space, STYLE_INT, 0, 10),
+    (lv.style_t.set_text_line_space, STYLE_INT, 0, 10),
+    (lv.style_t.set_opa, STYLE_INT, 0, 100),
+    (lv.style_t.set_align, STYLE_CHOICE, (lv.ALIGN.CENTER, lv.ALIGN.TOP_LEFT, lv.ALIGN.TOP_RIGHT, lv.ALIGN.TOP_MID, lv.ALIGN.BOTTOM_LEFT, lv.ALIGN.BOTTOM_RIGHT, lv.ALIGN.BOTTOM_MID, lv.ALIGN.LEFT_MID, lv.ALIGN.RIGHT_MID, lv.ALIGN.DEFAULT), None),
+    (lv.style_t.set_pad_all, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_hor, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_ver, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_gap, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_top, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_bottom, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_left, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_right, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_row, STYLE_INT, 0, 10),
+    (lv.style_t.set_pad_column, STYLE_INT, 0, 10),
+    (lv.style_t.set_margin_top, STYLE_INT, 0, 10),
+    (lv.style_t.set_margin_bottom, STYLE_INT, 0, 10),
+    (lv.style_t.set_margin_left, STYLE_INT, 0, 10),
+    (lv.style_t.set_margin_right, STYLE_INT, 0, 10),
+)
+"""
+The precompiled table of randomized style properties used by `RandomUI.randomize_style`.
+Each entry is a tuple of `(setter, kind, low, high)`, see `STYLE_INT`, `STYLE_COLOR` and `STYLE_CHOICE`.
+The setter is the unbound method of `lv.style_t`, called as `setter(style, value)`, so no attribute is looked up by name per property.
+The order of the entries determines the generated styles for a given seed and must not be changed.
+"""
+
+style_property_indices = tuple(range(len(style_properties)))
+"""The indices of `style_properties`, randomly chosen from instead of the entries themselves to create compact style keys (with the same random sequence)"""
+
+def create_random_style(key: tuple):
+    """
+    **Params:**
+    - `key` The style key, a flat tuple of alternating indices of `style_properties` and raw property values.
+
+    **Returns:**
+    - `lv.style_t` The created style object.
+
+    Create a style object from a style key of `RandomUI.randomize_style`, setting the properties in order.
+    """
+    style = lv.style_t()
+    for i in range(0, len(key), 2):
+        setter, kind, low, high = style_properties[key[i]]
+        value = key[i + 1]
+        setter(style, lv.color_hex(value) if kind == STYLE_COLOR else value)
+    return style
+
 def place_widget(container: lv.obj, widget: lv.obj, spatial_map: SpatialMap):
     """
     **Params:**
@@ -82,17 +415,15 @@ def place_widget(container: lv.obj, widget: lv.obj, spatial_map: SpatialMap):
 
     Place a widget in a container, avoiding overlap with other widgets.
     Placement occurs virtually be checking if the widget fits in the container using a spatial map.
-    The placing is done randomly within the container space and by checking the spatial map to avoid overlap with other widgets.
-    Placement is attempted 100 times before giving up.
+    The position is chosen by the spatial map (see `find_position` of the spatial map types).
     """
-    for _ in range(100):  # Try 100 times to find a spot
-        x = random.randint(0, container.width - widget.get_width())
-        y = random.randint(0, container.height - widget.get_height())
-        if spatial_map.is_space_available(x, y, widget.get_width(), widget.get_height()):
-            widget.set_pos(x, y)
-            spatial_map.occupy_space(x, y, widget.get_width(), widget.get_height())
-            return True
-    return False  # Could not place the widget
+    w, h = widget.get_width(), widget.get_height()
+    position = spatial_map.find_position(w, h)
+    if position is None:
+        return False  # Could not place the widget
+    widget.set_pos(position[0], position[1])
+    spatial_map.occupy_space(position[0], position[1], w, h)
+    return True
 
 class RandomUI:
     """
@@ -109,9 +440,17 @@ class RandomUI:
     - `output_file` The output file name.
     - `layout` The layout type to use.
     - `random_state` A boolean flag to randomize widget state.
+    - `spatial_map` The name of the spatial map type used for placement in layout `none` (see `spatial_map_types`).
+    - `style_cache` The cache of style objects, shared with other generators by default (see `style_cache.StyleCache`).
+    - `container` The root container of the created UI (`None` before the first and after each cleanup).
+    - `widgets` The metadata of the created UI: `count` and `objects`, a list of the type, class and index of each annotated widget.
+    - `box_extractor` The bounding box extractor of the annotated widgets (see `bbox.BoxExtractor`).
+    - `annotations` The annotation store of the created UI, which is re-used for every created UI (see `get_ui`).
+
+    The display driver is created on construction, unless `create_driver` is disabled (i.e. when a display of the same size already exists).
     """
     layout_options = ['flex', 'grid', 'none']
-    def __init__(self, width: int, height: int, widget_count: int, widget_types: list[str], output_file: str, layout: str, random_state: bool = False):
+    def __init__(self, width: int, height: int, widget_count: int, widget_types: list[str], output_file: str, layout: str, random_state: bool = False, create_driver: bool = True, spatial_map: str = 'free', style_cache = None):
         # Store the input parameters
         self.width = int(width)
         self.height = int(height)
@@ -120,14 +459,24 @@ class RandomUI:
         self.output_file = output_file
         self.layout = layout
         self.random_state = random_state
+        if spatial_map not in spatial_map_types:
+            raise ValueError(f'Invalid spatial map: {spatial_map} (valid options: {",".join(spatial_map_types.keys())})')
+        self.spatial_map = spatial_map
+        self.style_cache = style_cache if style_cache is not None else default_style_cache
+        self._style_key = []
         # Initialize random UI
         # self.display_driver = display_driver.DisplayDriver()
         # self.display_driver.init()
         self.objects = []
         self.widgets = {'count': 0, 'objects': []}
         self.type_count = {}
-        random.seed(int(time.time() * 1000000))
-        driver(width=self.width, height=self.height)
+        self.container = None
+        self.box_extractor = BoxExtractor()
+        self.annotations = UI(self.width, self.height)
+        if create_driver:
+            start = profiler.start()
+            driver(width=self.width, height=self.height)
+            profiler.stop('driver_init', start)
     
     def create_random_ui(self):
         """
@@ -138,9 +487,14 @@ class RandomUI:
         - `ValueError` If the layout is not a valid option.
 
         Create a random UI window with the specified width and height.
+        The generator can be re-used to create multiple UIs, the metadata of the previous UI is discarded on each call.
         """
         if self.layout not in self.layout_options:
             raise ValueError(f'Invalid layout: {self.layout} (valid options: {",".join(self.layout_options)})')
+        # Reset the metadata of a previously generated UI (batch mode re-uses the generator)
+        self.objects = []
+        self.widgets = {'count': 0, 'objects': []}
+        self.type_count = {}
         # Create a screen
         self.container = lv.obj(lv.screen_active())
         self.container.set_size(self.width, self.height)
@@ -157,29 +511,22 @@ class RandomUI:
     def create_random_layout_flex(self):
         """
         Create a container layout using the flex layout.
+        All widgets are created and styled first, the layout of the container is then computed in a single pass (see `annotate_widgets`).
         """
         self.container.set_layout(lv.LAYOUT.FLEX)
         self.container.set_flex_flow(lv.FLEX_FLOW.ROW_WRAP)
         print(f'{self.widget_count}: {type(self.widget_count)}')
+        created = []
         for i in range(self.widget_count):
             widget_type = random.choice(self.widget_types)
+            start = profiler.start()
             widget_info, widget = self.create_random_widget(widget_type)
-            lv.screen_load(self.container)
-            self.container.update_layout()
+            profiler.stop('widget_creation', start)
+            start = profiler.start()
             self.randomize_style(widget)
-            lv.screen_load(self.container)
-            self.container.update_layout()
-            tmp_coords = lv.area_t()
-            widget.get_coords(tmp_coords)
-            widget_info["x"] = (tmp_coords.x1 + tmp_coords.x2) // 2
-            widget_info["y"] = (tmp_coords.y1 + tmp_coords.y2) // 2
-            widget_info['width'] = widget.get_width()
-            widget_info['height'] = widget.get_height()
-            self.widgets['objects'].append(widget_info)
-            self.objects.append(widget)
-            print(f'[{i}]: {widget_info}')
-        self.widgets['count'] = len(self.widgets['objects'])
-        print(self.widgets)
+            profiler.stop('style', start)
+            created.append((widget_info, widget))
+        self.annotate_widgets(created)
 
     def create_random_layout_grid(self):
         """Create a container layout using the grid layout. **(Not implemented)**"""
@@ -192,33 +539,52 @@ class RandomUI:
         Spacing between widgets is not guaranteed.
         Style properties are randomized for each widget.
         Widget metadata of the UI is stored in the `widgets` dictionary.
+        The size of each widget is refreshed once for its placement, the final positions are computed in a single pass after all widgets are placed (see `annotate_widgets`).
         """
-        spatial_map = SpatialMap(self.width, self.height)
+        spatial_map = spatial_map_types[self.spatial_map](self.width, self.height)
         print(f'{self.widget_count}: {type(self.widget_count)}')
+        placed_widgets = []
         for i in range(self.widget_count):
             widget_type = random.choice(self.widget_types)
+            start = profiler.start()
             widget_info, widget = self.create_random_widget(widget_type)
-            lv.screen_load(self.container)
-            self.container.update_layout()
+            profiler.stop('widget_creation', start)
+            start = profiler.start()
+            widget.update_layout() # NOTE The placement requires the size of the widget
+            profiler.stop('layout', start)
             print(f'Placing {widget_type} with width: {widget.get_width()}, height: {widget.get_height()}')
-            if not self.place_widget(widget, spatial_map):
+            start = profiler.start()
+            placed = self.place_widget(widget, spatial_map)
+            profiler.stop('placement', start)
+            if not placed:
                 print(f'Could not place the widget: {widget_info}')
                 widget.delete()
+                self.objects.pop()
                 continue
+            start = profiler.start()
             self.randomize_style(widget)
-            lv.screen_load(self.container)
-            self.container.update_layout()
-            tmp_coords = lv.area_t()
-            widget.get_coords(tmp_coords)
-            widget_info["x"] = (tmp_coords.x1 + tmp_coords.x2) // 2
-            widget_info["y"] = (tmp_coords.y1 + tmp_coords.y2) // 2
-            widget_info['width'] = widget.get_width()
-            widget_info['height'] = widget.get_height()
+            profiler.stop('style', start)
+            placed_widgets.append((widget_info, widget))
+        self.annotate_widgets(placed_widgets)
+
+    def annotate_widgets(self, widgets: list[tuple[dict, lv.obj]]):
+        """
+        **Params:**
+        - `widgets` The created widgets as tuples of widget metadata and object, in creation order.
+
+        Update the layout of the container once, store the metadata of the widgets in the `widgets` dictionary and extract their bounding boxes into the annotation store in a single sweep (see `bbox.BoxExtractor`).
+        Updating the layout after each added widget would re-compute the layout of all previously added widgets every time (quadratic in the widget count).
+        The bounding boxes are the same, since added widgets do not move the widgets before them (flex row wrap or absolute positions).
+        """
+        start = profiler.start()
+        lv.screen_load(self.container)
+        self.container.update_layout()
+        profiler.stop('layout', start)
+        self.box_extractor.extract((widget for _, widget in widgets), self.annotations)
+        for i, (widget_info, _) in enumerate(widgets):
             self.widgets['objects'].append(widget_info)
-            self.objects.append(widget)
-            print(f'[{i}]: {widget_info}')
+            print(f'[{i}]: {widget_info} {self.annotations.box(i)}')
         self.widgets['count'] = len(self.widgets['objects'])
-        print(self.widgets)
 
     def place_widget(self, widget, spatial_map: SpatialMap):
         """
@@ -231,18 +597,10 @@ class RandomUI:
 
         Place a widget in a container, avoiding overlap with other widgets.
         Placement occurs virtually be checking if the widget fits in the container using a spatial map.
-        The placing is done randomly within the container space and by checking the spatial map to avoid overlap with other widgets.
-        Placement is attempted 100 times before giving up.
+        With the default spatial map (`free`), the position is chosen uniformly among all positions the widget fits in and placement only fails if there is no such position.
+        The other spatial maps try 100 random positions before giving up.
         """
-        max_attempts = 100  # Max attempts to find a suitable spot
-        for _ in range(max_attempts):
-            x = random.randint(0, self.width - widget.get_width())
-            y = random.randint(0, self.height - widget.get_height())
-            if spatial_map.is_space_available(x, y, widget.get_width(), widget.get_height()):
-                widget.set_pos(x, y)
-                spatial_map.occupy_space(x, y, widget.get_width(), widget.get_height())
-                return True
-        return False  # Could not place the widget
+        return place_widget(self.container, widget, spatial_map)
 
     def create_random_widget(self, widget_type: str) -> tuple[dict, lv.obj]:
         """
@@ -276,69 +634,21 @@ class RandomUI:
         - `widget` The widget to randomize the style of.
 
         Randomize the style properties of a widget by creating a style object and setting randomly chosen properties with random values.
+        The properties and their value ranges are taken from the precompiled `style_properties` table.
+        Identical styles are shared via the style cache.
         """
-        # Create style object
-        style = lv.style_t()
         # Choose a random amount of style properties to set
-        # Randomize the chosen style properties, creating property values according to the property type
-        # Apply the style to the widget
-        # List of style properties to randomize
-        properties = [
-            ('set_bg_color', lv.color_make),
-            ('set_bg_opa', lambda: random.randint(0, 100)),
-            ('set_border_color', lv.color_make),
-            ('set_border_opa', lambda: random.randint(0, 100)),
-            ('set_border_width', lambda: random.randint(0, 10)),
-            ('set_outline_width', lambda: random.randint(0, 10)),
-            ('set_outline_color', lv.color_make),
-            ('set_outline_opa', lambda: random.randint(0, 100)),
-            ('set_shadow_width', lambda: random.randint(0, 15)),
-            ('set_shadow_offset_x', lambda: random.randint(0, 10)),
-            ('set_shadow_offset_y', lambda: random.randint(0, 10)),
-            ('set_shadow_color', lv.color_make),
-            ('set_shadow_opa', lambda: random.randint(0, 100)),
-            ('set_line_width', lambda: random.randint(0, 10)),
-            ('set_line_dash_width', lambda: random.randint(0, 10)),
-            ('set_line_dash_gap', lambda: random.randint(0, 10)),
-            ('set_line_rounded', lambda: random.choice([True, False])),
-            ('set_line_color', lv.color_make),
-            ('set_line_opa', lambda: random.randint(0, 100)),
-            ('set_text_color', lv.color_make),
-            ('set_text_opa', lambda: random.randint(0, 100)),
-            ('set_text_letter_space', lambda: random.randint(0, 10)),
-            ('set_text_line_space', lambda: random.randint(0, 10)),
-            ('set_opa', lambda: random.randint(0, 100)),
-            ('set_align', lambda: random.choice([lv.ALIGN.CENTER, lv.ALIGN.TOP_LEFT, lv.ALIGN.TOP_RIGHT, lv.ALIGN.TOP_MID, lv.ALIGN.BOTTOM_LEFT, lv.ALIGN.BOTTOM_RIGHT, lv.ALIGN.BOTTOM_MID, lv.ALIGN.LEFT_MID, lv.ALIGN.RIGHT_MID, lv.ALIGN.DEFAULT])),
-            ('set_pad_all', lambda: random.randint(0, 10)),
-            ('set_pad_hor', lambda: random.randint(0, 10)),
-            ('set_pad_ver', lambda: random.randint(0, 10)),
-            ('set_pad_gap', lambda: random.randint(0, 10)),
-            ('set_pad_top', lambda: random.randint(0, 10)),
-            ('set_pad_bottom', lambda: random.randint(0, 10)),
-            ('set_pad_left', lambda: random.randint(0, 10)),
-            ('set_pad_right', lambda: random.randint(0, 10)),
-            ('set_pad_row', lambda: random.randint(0, 10)),
-            ('set_pad_column', lambda: random.randint(0, 10)),
-            ('set_margin_top', lambda: random.randint(0, 10)),
-            ('set_margin_bottom', lambda: random.randint(0, 10)),
-            ('set_margin_left', lambda: random.randint(0, 10)),
-            ('set_margin_right', lambda: random.randint(0, 10))
-            # Add more properties as needed
-        ]
-
-        # Choose a random amount of style properties to set
-        num_props_to_set = random.randint(3, len(properties))
-
-        # Randomly select and set properties
+        num_props_to_set = random.randint(3, len(style_properties))
+        # Randomly select properties and create their raw values according to the property kind
+        key = self._style_key
+        key.clear()
         for _ in range(num_props_to_set):
-            prop, value_generator = random.choice(properties)
-            if 'color' in prop:
-                # Generate a random color
-                value = lv.color_hex(random.randint(0, 0xFFFFFF))
-            else:
-                # Generate a random value
-                value = value_generator()
-            getattr(style, prop)(value)
+            index = random.choice(style_property_indices)
+            setter, kind, low, high = style_properties[index]
+            key.append(index)
+            key.append(random.choice(low) if kind == STYLE_CHOICE else random.randint(low, high))
+        key = tuple(key)
+        style = self.style_cache.get(key, create_random_style, num_props_to_set)
 
         # Apply the style to the widget
         widget.add_style(style, lv.PART.MAIN)
@@ -350,21 +660,32 @@ class RandomUI:
     def get_ui(self) -> UI:
         """
         **Returns:**
-        - `UI` The UI object containing the metadata.
+        - `UI` The annotation store of the UI.
 
-        Return a UI object (special dictionary) containing the screen dimensions and all widget position metadata required for bounding box annotation.
+        Return the annotation store of the UI containing the screen dimensions and the bounding boxes of all widgets.
+        The annotation store is re-used by the next created UI, so its boxes belong to the last created UI.
         """
-        ui = UI()
-        ui['count'] = self.widgets['count']
-        ui['objects'] = self.widgets['objects']
-        return ui
+        return self.annotations
     
-    def cleanup(self):
+    def cleanup(self, screen: lv.obj = None) -> int:
         """
+        **Params:**
+        - `screen` The screen the UI was created on, which is deleted instead of the container if provided. It must not be the active screen.
+
+        **Returns:**
+        - `int` The amount of styles freed by the style cache.
+
         Cleanup the screen and widgets, destroying all created objects.
-        Note that this function will cause a known error when sub-widgets are indirectly deleted by destroying their parent container.
-        That error is safe to ignore, as the widgets should be properly deleted by LVGL.
+        All widgets are deleted by a single `delete()` of the container (or the screen), since LVGL deletes the children of an object with it.
+        The references of the widgets are discarded and the styles of the UI are released to the style cache, which frees the evicted styles.
+        The metadata of the UI (`get_ui`) is kept.
         """
-        for obj in self.objects:
-            if obj is lv.obj:
-                obj.delete()
\ No newline at end of file
+        root = screen if screen is not None else self.container
+        if root is not None:
+            root.delete()
+        count = len(self.objects)
+        self.container = None
+        self.objects = []
+        freed = self.style_cache.release()
+        print(f"Cleanup: deleted {count} widgets, freed {freed} styles")
+        return freed
@@ -2,10 +2,12 @@ import sys
 if sys.implementation.name == "micropython":
     from struct import pack
     import lvgl as lv
+    from pixel_ops import bgr_to_rgb
 else:
     import mock
     from .mock.lvgl import lv
     from struct import pack
+    from .pixel_ops import bgr_to_rgb
 # import jpeg
 
 # NOTE The following code is taken from the JPEG encoder of: https://github.com/xxyxyz/flat/blob/master/flat/jpeg.py
@@ -179,6 +181,16 @@ def _forward_dct(block):
         block[i+56] = (tmp3 + tmp10 + tmp13) >> 15
 
 
+# Fixed-point RGB to YCbCr lookup tables, each output is the sum of three table entries shifted right by 16
+_y_r = [19595*i + 32768 for i in range(256)]
+_y_g = [38470*i for i in range(256)]
+_y_b = [7471*i for i in range(256)]
+_u_r = [-11056*i for i in range(256)]
+_u_g = [-21712*i for i in range(256)]
+_uv_rb = [32768*i + 8421376 for i in range(256)] # Shared by the blue part of Cb and the red part of Cr
+_v_g = [-27440*i for i in range(256)]
+_v_b = [-5328*i for i in range(256)]
+
 class _entropy_encoder(object):
     
     def __init__(self):
@@ -188,48 +200,79 @@ class _entropy_encoder(object):
         self.codes, self.sizes = c, s
         self.value, self.length = 0, 0
         self.data = bytearray()
+        self.symbols = [] # Pending (value, length) pairs of the current block, flattened
     
     def encode(self, previous, block, scale, dc, ac):
+        codes, sizes, symbols = self.codes, self.sizes, self.symbols
+        v = block[0]
+        if block.count(v) == 64:
+            # NOTE Uniform blocks are common in UI screenshots, the DCT of such a block only has the DC coefficient 64*v - 8192
+            q = ((((64*v - 8192) << 1)//scale[0]) + 1) >> 1
+            d = q - previous
+            if d == 0:
+                symbols.extend(dc[0])
+            else:
+                s = sizes[d]
+                symbols.extend(dc[s])
+                symbols.append(codes[d])
+                symbols.append(s)
+            symbols.extend(ac[0])
+            self.flush()
+            return q
         _forward_dct(block)
         for i in range(64):
             block[i] = (((block[i] << 1)//scale[i]) + 1) >> 1
         d = block[0] - previous
         if d == 0:
-            self.write(*dc[0])
+            symbols.extend(dc[0])
         else:
-            s = self.sizes[d]
-            self.write(*dc[s])
-            self.write(self.codes[d], s)
+            s = sizes[d]
+            symbols.extend(dc[s])
+            symbols.append(codes[d])
+            symbols.append(s)
         n = 0
         for i in _z_z:
-            if block[i] == 0:
+            v = block[i]
+            if v == 0:
                 n += 1
             else:
                 while n > 15:
-                    self.write(*ac[0xf0])
+                    symbols.extend(ac[0xf0])
                     n -= 16
-                s = self.sizes[block[i]]
-                self.write(*ac[n*16 + s])
-                self.write(self.codes[block[i]], s)
+                s = sizes[v]
+                symbols.extend(ac[n*16 + s])
+                symbols.append(codes[v])
+                symbols.append(s)
                 n = 0
         if n > 0:
-            self.write(*ac[0])
+            symbols.extend(ac[0])
+        self.flush()
         return block[0]
     
+    def flush(self):
+        # NOTE Writes all pending symbols in one loop, which avoids a method call per symbol
+        symbols, data = self.symbols, self.data
+        value, length = self.value, self.length
+        for k in range(0, len(symbols), 2):
+            size = symbols[k + 1]
+            value = symbols[k] + (value << size)
+            length += size
+            while length > 7:
+                length -= 8
+                v = (value >> length) & 0xff
+                if v == 0xff:
+                    data.append(0xff)
+                    data.append(0)
+                else:
+                    data.append(v)
+            value &= 0xff
+        self.value, self.length = value, length
+        symbols.clear()
+    
     def write(self, value, length):
-        data = self.data
-        value += (self.value << length)
-        length += self.length
-        while length > 7:
-            length -= 8
-            v = (value >> length) & 0xff
-            if v == 0xff:
-                data.append(0xff)
-                data.append(0)
-            else:
-                data.append(v)
-        self.value = value & 0xff
-        self.length = length
+        self.symbols.append(value)
+        self.symbols.append(length)
+        self.flush()
     
     def dump(self):
         return self.data
@@ -244,10 +287,47 @@ class image():
         self.n = 1 if kind == 'g' else 3 if kind == 'rgb' else 4
         self.data = data
 
+def _rgb_block(data, rows, x, w, yblock, ublock, vblock):
+    # Fill the YCbCr blocks of an 8x8 tile of RGB data, rows contains the (clamped) byte offsets of the 8 rows of the tile
+    y_r, y_g, y_b, u_r, u_g, uv_rb, v_g, v_b = _y_r, _y_g, _y_b, _u_r, _u_g, _uv_rb, _v_g, _v_b
+    i = 0
+    if x + 8 <= w:
+        x *= 3
+        for row in rows:
+            start = row + x
+            for j in range(start, start + 24, 3):
+                r, g, b = data[j], data[j + 1], data[j + 2]
+                yblock[i] = (y_r[r] + y_g[g] + y_b[b]) >> 16
+                ublock[i] = (u_r[r] + u_g[g] + uv_rb[b]) >> 16
+                vblock[i] = (uv_rb[r] + v_g[g] + v_b[b]) >> 16
+                i += 1
+    else: # Tile at the right edge, the last column is repeated
+        columns = [min(xx, w - 1)*3 for xx in range(x, x + 8)]
+        for row in rows:
+            for column in columns:
+                j = row + column
+                r, g, b = data[j], data[j + 1], data[j + 2]
+                yblock[i] = (y_r[r] + y_g[g] + y_b[b]) >> 16
+                ublock[i] = (u_r[r] + u_g[g] + uv_rb[b]) >> 16
+                vblock[i] = (uv_rb[r] + v_g[g] + v_b[b]) >> 16
+                i += 1
+
+def _channel_blocks(data, rows, x, w, n, blocks):
+    # Fill one block per channel with an 8x8 tile of grayscale or CMYK data, rows contains the (clamped) byte offsets of the 8 rows of the tile
+    i = 0
+    columns = [min(xx, w - 1)*n for xx in range(x, x + 8)]
+    for row in rows:
+        for column in columns:
+            j = row + column
+            for c in range(n):
+                blocks[c][i] = data[j + c]
+            i += 1
+
 def serialize(image, quality):
     w, h, n, data = image.width, image.height, image.n, image.data
     ydc = udc = vdc = kdc = 0
     yblock, ublock, vblock, kblock = [0]*64, [0]*64, [0]*64, [0]*64
+    blocks = (yblock, ublock, vblock, kblock)
     lq = _quantization_table(_luminance_quantization, quality)
     ld = _huffman_table(_ld_lengths, _ld_values)
     la = _huffman_table(_la_lengths, _la_values)
@@ -258,25 +338,14 @@ def serialize(image, quality):
         ca = _huffman_table(_ca_lengths, _ca_values)
         cs = _scale_factor(cq)
     e = _entropy_encoder()
+    stride = w*n
     for y in range(0, h, 8):
+        rows = [min(yy, h - 1)*stride for yy in range(y, y + 8)] # The last row is repeated at the bottom edge
         for x in range(0, w, 8):
-            i = 0
-            for yy in range(y, y + 8):
-                for xx in range(x, x + 8):
-                    j = (min(xx, w - 1) + min(yy, h - 1)*w)*n
-                    if n == 1:
-                        yblock[i] = data[j]
-                    elif n == 3:
-                        r, g, b = data[j], data[j + 1], data[j + 2]
-                        yblock[i] = (19595*r + 38470*g + 7471*b + 32768) >> 16
-                        ublock[i] = (-11056*r - 21712*g + 32768*b + 8421376) >> 16
-                        vblock[i] = (32768*r - 27440*g - 5328*b + 8421376) >> 16
-                    else: # n == 4
-                        yblock[i] = data[j]
-                        ublock[i] = data[j + 1]
-                        vblock[i] = data[j + 2]
-                        kblock[i] = data[j + 3]
-                    i += 1
+            if n == 3:
+                _rgb_block(data, rows, x, w, yblock, ublock, vblock)
+            else:
+                _channel_blocks(data, rows, x, w, n, blocks)
             ydc = e.encode(ydc, yblock, ls, ld, la)
             if n == 3:
                 udc = e.encode(udc, ublock, cs, cd, ca)
@@ -310,18 +379,6 @@ def serialize(image, quality):
         e.dump(),
         b'\xff\xd9']) # EOI
 
-def bgr_to_rgb(data):
-    """
-    **Params**
-    - `data` A flat bytearray in BGR format.
-
-    Swap the BGR values to RGB in a flat bytearray.
-    """
-    # Assume data is a flat bytearray in BGR format
-    for i in range(0, len(data), 3):
-        data[i], data[i+2] = data[i+2], data[i]  # Swap the B and R values
-    return data
-
 def take_screenshot(container: lv.obj, output_file: str, quality:int = 100):
     """
     **Params**
@@ -336,8 +393,7 @@ def take_screenshot(container: lv.obj, output_file: str, quality:int = 100):
     print(f"Snapshot: {snapshot} ({type(snapshot)}, {snapshot.data_size} bytes)")
     data_size = snapshot.data_size
     buffer = snapshot.data.__dereference__(data_size)
-    container.update_layout()
-    img = image(container.get_width(), container.get_height(), "rgb", bgr_to_rgb(buffer))
+    img = image(snapshot.header.w, snapshot.header.h, "rgb", bgr_to_rgb(buffer))
     try:
         with open(output_file, 'wb') as f:
             f.write(serialize(img, quality))
@@ -2,43 +2,176 @@ import sys
 if sys.implementation.name == "micropython":
     import jpeg
     import lvgl as lv
+    from pixel_ops import bgr_to_rgb
+    from image_formats import format_for_file, write_png, write_npy, write_raw
+    from profiler import profiler
 else:
     import mock
     from .mock.lvgl import lv
     from .mock.jpeg import jpeg
+    from .pixel_ops import bgr_to_rgb
+    from .image_formats import format_for_file, write_png, write_npy, write_raw
+    from .profiler import profiler
 
-def bgr_to_rgb(data):
+def take_screenshot(output_file: str, quality:int = 100, swap_channels: bool = False, image_format: str = None, obj: lv.obj = None, region: tuple = None):
     """
     **Params**
-    - `data` A flat bytearray in BGR format.
+    - `output_file` The file path to save the screenshot to.
+    - `quality` The quality of the JPG image (0-100).
+    - `swap_channels` Swap the BGR snapshot data to RGB before encoding a JPG image.
+    - `image_format` The output format (`jpg`, `png`, `npy` or `bin`), inferred from the extension of the output file if not provided.
+    - `obj` The object to take a screenshot of. Default is the active screen.
+    - `region` The region `(x, y, width, height)` in screen coordinates to crop the screenshot to (see `Snapshot`).
+
+    Take a screenshot of a container using the LVGL snapshot API and save it to a JPG, PNG, NPY or raw file (see `image_formats`).
+    The snapshot buffer is passed to the encoder directly, channel swaps are done in place (see `pixel_ops.bgr_to_rgb`).
+    A screenshot of the whole screen refreshes the display first. A screenshot of an object only renders that object (see `Snapshot`), which is far cheaper for small objects.
+    """
+    image_format = format_for_file(output_file, image_format)
+    start = profiler.start()
+    if obj is None:
+        lv.timer_handler()
+    snapshot = Snapshot(obj, region)
+    profiler.stop('snapshot', start)
+    print(f"Snapshot: {snapshot.width}x{snapshot.height} ({snapshot.stride * snapshot.height} bytes)")
+    try:
+        start = profiler.start()
+        snapshot.save(output_file, image_format, quality, swap_channels)
+        profiler.stop('encode', start)
+    except MemoryError as e:
+        print(e)
+    finally:
+        snapshot.destroy()
 
-    Swap the BGR values to RGB in a flat bytearray.
+class Snapshot:
     """
-    # Assume data is a flat bytearray in BGR format
-    for i in range(0, len(data), 3):
-        data[i], data[i+2] = data[i+2], data[i]  # Swap the B and R values
-    return data
+    A RGB888 snapshot (in BGR order) of an LVGL object, optionally cropped to a region.
+
+    Only the object (and its children) is rendered into a buffer of the size of the object, which includes the extra draw area of the object (e.g. shadows).
+    The layout is not updated, since the generators update it once after creating a sample. Pass `update_layout` for objects with pending layout changes.
+    A region is cropped into a new buffer sized exactly to the region and the snapshot buffer is freed right away.
 
-def take_screenshot(output_file: str, quality:int = 100):
+    **Object Attributes:**
+    - `x` The screen x coordinate of the first pixel.
+    - `y` The screen y coordinate of the first pixel.
+    - `width` The width of the snapshot.
+    - `height` The height of the snapshot.
+    - `stride` The amount of bytes per row in `data`, which can be larger than `width * 3`.
+    - `data` The pixel data of the snapshot.
+    """
+    def __init__(self, obj: lv.obj = None, region: tuple = None, update_layout: bool = False):
+        obj = obj if obj is not None else lv.screen_active()
+        if update_layout:
+            obj.update_layout()
+        self._draw_buf = lv.snapshot_take(obj, lv.COLOR_FORMAT.RGB888)
+        if self._draw_buf is None:
+            raise MemoryError('Failed to allocate the snapshot buffer')
+        header = self._draw_buf.header
+        self.width = header.w
+        self.height = header.h
+        self.stride = header.stride
+        coords = lv.area_t()
+        obj.get_coords(coords)
+        # NOTE The snapshot is extended on all sides by the extra draw size of the object
+        self.x = coords.x1 - (self.width - (coords.x2 - coords.x1 + 1)) // 2
+        self.y = coords.y1 - (self.height - (coords.y2 - coords.y1 + 1)) // 2
+        self.data = self._draw_buf.data.__dereference__(self._draw_buf.data_size)
+        if region is not None:
+            self.crop(*region)
+
+    def crop(self, x: int, y: int, width: int, height: int):
+        """
+        **Params:**
+        - `x` The screen x coordinate of the region.
+        - `y` The screen y coordinate of the region.
+        - `width` The width of the region.
+        - `height` The height of the region.
+
+        **Raises:**
+        - `ValueError` If the region does not overlap the snapshot.
+
+        Crop the snapshot to a region, which is clipped to the bounds of the snapshot.
+        The pixels are copied into a new buffer without row padding and the snapshot buffer is freed.
+        """
+        x1 = max(x, self.x)
+        y1 = max(y, self.y)
+        x2 = min(x + width, self.x + self.width)
+        y2 = min(y + height, self.y + self.height)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f'Region {(x, y, width, height)} is outside of the snapshot {(self.x, self.y, self.width, self.height)}')
+        data = pack_rows(self.data, x1 - self.x, y1 - self.y, x2 - x1, y2 - y1, self.stride)
+        self.destroy()
+        self.data = data
+        self.x, self.y = x1, y1
+        self.width, self.height = x2 - x1, y2 - y1
+        self.stride = self.width * 3
+
+    def save(self, output_file: str, image_format: str = None, quality: int = 100, swap_channels: bool = False):
+        """
+        **Params**
+        - `output_file` The file path to save the snapshot to.
+        - `image_format` The output format (`jpg`, `png`, `npy` or `bin`), inferred from the extension of the output file if not provided.
+        - `quality` The quality of the JPG image (0-100).
+        - `swap_channels` Swap the BGR snapshot data to RGB before encoding a JPG image.
+
+        Save the snapshot to a file, the pixel data is modified in place (see `write_image`).
+        If the rows of the snapshot buffer are padded, the padding is removed first.
+        """
+        image_format = format_for_file(output_file, image_format)
+        if self.stride != self.width * 3:
+            self.crop(self.x, self.y, self.width, self.height)
+        write_image(output_file, self.data, self.width, self.height, image_format, quality, swap_channels)
+
+    def destroy(self):
+        """Free the snapshot buffer, if it is not freed yet."""
+        if self._draw_buf is not None:
+            self._draw_buf.destroy()
+            self._draw_buf = None
+
+def pack_rows(data, x: int, y: int, width: int, height: int, stride: int) -> bytearray:
+    """
+    **Params:**
+    - `data` The RGB888 pixel data.
+    - `x` The x coordinate of the region in the pixel data.
+    - `y` The y coordinate of the region in the pixel data.
+    - `width` The width of the region.
+    - `height` The height of the region.
+    - `stride` The amount of bytes per row in `data`.
+
+    **Returns:**
+    - `bytearray` The pixel data of the region without row padding (`width * 3` bytes per row).
+    """
+    row_size = width * 3
+    packed = bytearray(row_size * height)
+    view = memoryview(data)
+    start = y * stride + x * 3
+    for row in range(height):
+        offset = start + row * stride
+        packed[row * row_size:(row + 1) * row_size] = view[offset:offset + row_size]
+    return packed
+
+def write_image(output_file: str, data, width: int, height: int, image_format: str, quality: int = 100, swap_channels: bool = False):
     """
     **Params**
-    - `output_file` The file path to save the screenshot to.
+    - `output_file` The file path to save the image to.
+    - `data` The RGB888 snapshot data (in BGR order) without row padding (see `pack_rows`), which is modified in place.
+    - `width` The width of the image.
+    - `height` The height of the image.
+    - `image_format` The output format (`jpg`, `png`, `npy` or `bin`).
     - `quality` The quality of the JPG image (0-100).
+    - `swap_channels` Swap the BGR snapshot data to RGB before encoding a JPG image.
 
-    Take a screenshot of a container using the LVGL snapshot API and save it to a JPG file.
-    """
-    disp = lv.display_get_default()
-    width = disp.get_horizontal_resolution()
-    height = disp.get_vertical_resolution()
-    scrn = lv.screen_active()
-    lv.timer_handler()
-    snapshot = lv.snapshot_take(scrn, lv.COLOR_FORMAT.RGB888)
-    print(f"Snapshot: {snapshot} ({type(snapshot)}, {snapshot.data_size} bytes)")
-    data = snapshot.data.__dereference__(snapshot.data_size)
-    # data = bgr_to_rgb(buffer)
-    try:
+    Encode snapshot data and save it to a file. Only the data is accessed, so it can be called from another thread than LVGL (see `encode_pipeline`).
+    """
+    if image_format == 'bin':
+        write_raw(output_file, data, width * height * 3)
+    elif image_format == 'jpg':
+        if swap_channels:
+            bgr_to_rgb(data)
         jpeg.encode(data, output_file, width, height, quality)
-    except MemoryError as e:
-        print(e)
-    finally:
-        snapshot.destroy()
\ No newline at end of file
+    else:
+        bgr_to_rgb(data) # NOTE The RGB888 format of LVGL stores the channels in BGR order
+        if image_format == 'png':
+            write_png(output_file, data, width, height)
+        else:
+            write_npy(output_file, data, width, height)
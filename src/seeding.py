@@ -0,0 +1,54 @@
+"""
+Seeds of the generated samples, which make every sample a pure function of a base seed and its sample index.
+
+The seed of a sample is derived by hashing the base seed and the sample index (see `derive_seed`), instead of adding them up:
+the random streams of neighboring samples and of different base seeds are unrelated, and the seeds of one base seed never repeat for different indices.
+Any range of sample indices can therefore be generated by any process (e.g. one per shard) without coordination, and a single sample can be re-rendered from its base seed and index.
+"""
+import os
+import time
+
+seed_mask = 0xFFFFFFFF
+"""The mask of seeds, which are 32 bit unsigned integers (the seed size of the MicroPython random module)"""
+
+golden_ratio = 0x9E3779B9
+"""The 32 bit golden ratio, which spreads consecutive sample indices over the seed space"""
+
+def mix32(value: int) -> int:
+    """
+    **Params:**
+    - `value` A 32 bit unsigned integer.
+
+    **Returns:**
+    - `int` The hashed value (finalizer of MurmurHash3), a bijection of the 32 bit unsigned integers.
+    """
+    value ^= value >> 16
+    value = (value * 0x85EBCA6B) & seed_mask
+    value ^= value >> 13
+    value = (value * 0xC2B2AE35) & seed_mask
+    value ^= value >> 16
+    return value
+
+def derive_seed(base_seed: int, index: int) -> int:
+    """
+    **Params:**
+    - `base_seed` The base seed of a run or dataset.
+    - `index` The index of the sample.
+
+    **Returns:**
+    - `int` The seed of the sample.
+
+    The seeds of a base seed are distinct for up to 2^32 sample indices.
+    """
+    return mix32((mix32(base_seed & seed_mask) + index * golden_ratio) & seed_mask)
+
+def random_base_seed() -> int:
+    """
+    **Returns:**
+    - `int` A base seed for runs without a given seed, read from `os.urandom` if available and from the time otherwise.
+    """
+    try:
+        data = os.urandom(4)
+        return data[0] | data[1] << 8 | data[2] << 16 | data[3] << 24
+    except (AttributeError, OSError):
+        return mix32(int(time.time() * 1000000) & seed_mask)
@@ -0,0 +1,229 @@
+"""
+Sharded dataset container: samples are appended to large tar files instead of writing two small files per sample.
+
+The shards follow the [WebDataset](https://github.com/webdataset/webdataset) layout: every sample is stored as a group of tar members sharing
+the same key, e.g. `000042.jpg` and `000042.txt`. The shards are plain (ustar) tar files and can be read by any tar implementation.
+
+Next to each shard `<name>.tar`, an index `<name>.idx` is written with one line per member: `<member name> <data offset> <size>`.
+`ShardReader` uses the index to read single samples without scanning the shard.
+"""
+import os
+
+tar_block_size = 512
+"""The block size of tar files, headers and member data are padded to a multiple of it"""
+
+def tar_header(name: str, size: int) -> bytes:
+    """
+    **Params:**
+    - `name` The name of the member (at most 100 bytes).
+    - `size` The size of the member data in bytes.
+
+    **Returns:**
+    - `bytes` The ustar header block of a regular file member.
+
+    **Raises:**
+    - `ValueError` If the name is too long.
+    """
+    encoded = name.encode()
+    if len(encoded) > 100:
+        raise ValueError(f'Tar member name too long: {name}')
+    header = bytearray(tar_block_size)
+    header[0:len(encoded)] = encoded
+    header[100:108] = b'0000644\0' # mode
+    header[108:116] = b'0000000\0' # uid
+    header[116:124] = b'0000000\0' # gid
+    header[124:136] = ('%011o' % size).encode() + b'\0'
+    header[136:148] = b'00000000000\0' # mtime, fixed to keep shards reproducible
+    header[148:156] = b'        ' # checksum placeholder
+    header[156] = ord('0') # regular file
+    header[257:265] = b'ustar\x0000'
+    header[148:156] = ('%06o' % sum(header)).encode() + b'\0 '
+    return bytes(header)
+
+class ShardWriter:
+    """
+    Writer of sharded datasets, which appends the files of each sample to the current shard and rolls over to a new shard every `shard_size` samples.
+
+    Each shard is named after the index of its first sample (`<prefix>-<index>.tar`), so generator runs with disjoint sample indices never write to the same shard.
+
+    **Object Attributes:**
+    - `prefix` The path prefix of the shard files.
+    - `shard_size` The maximum amount of samples per shard.
+    - `shard_file` The path of the current shard (`None` if no shard is open).
+    - `count` The amount of samples in the current shard.
+    - `offset` The current write offset in the shard.
+    """
+    def __init__(self, prefix: str, shard_size: int = 1000):
+        if shard_size < 1:
+            raise ValueError(f'Invalid shard size: {shard_size} (must be at least 1)')
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shard_file = None
+        self.count = 0
+        self.offset = 0
+        self._tar = None
+        self._index = None
+        self._buffer = bytearray(4096)
+
+    def temp_file(self, extension: str, index: int = None) -> str:
+        """
+        **Params:**
+        - `extension` The file extension (without dot).
+        - `index` The index of the sample, required if the files of multiple samples exist at the same time (pipelined encoding).
+
+        **Returns:**
+        - `str` A path next to the shards, which can be used to write a file of a sample before it is added to the shard.
+        """
+        if index is not None:
+            return f'{self.prefix}.tmp.{index:06d}.{extension}'
+        return f'{self.prefix}.tmp.{extension}'
+
+    def member_name(self, index: int, path: str) -> str:
+        """
+        **Params:**
+        - `index` The index of the sample.
+        - `path` The path of a file of the sample.
+
+        **Returns:**
+        - `str` The name of the file in the shard, `<key>.<extension of file>` with the zero-padded sample index as key.
+        """
+        return f'{index:06d}' + path[path.rfind('.'):]
+
+    def add_sample(self, index: int, files: list):
+        """
+        **Params:**
+        - `index` The index of the sample, used as the key of its members.
+        - `files` The paths of the files of the sample, each file is stored as `<key>.<extension of file>`.
+
+        Append the files of a sample to the current shard and remove them afterwards.
+        A new shard is started if the current shard is full.
+        """
+        if self._tar is None or self.count >= self.shard_size:
+            self._open(index)
+        for path in files:
+            self._add_file(self.member_name(index, path), path)
+            os.remove(path)
+        self.count += 1
+
+    def close(self):
+        """
+        Finish the current shard by writing the end-of-archive marker and closing the shard and its index.
+        """
+        if self._tar is None:
+            return
+        self._tar.write(bytes(tar_block_size * 2))
+        self._tar.close()
+        self._index.close()
+        self._tar = None
+        self._index = None
+        print(f'Shard {self.shard_file} closed ({self.count} samples)')
+
+    def _open(self, index: int):
+        self.close()
+        self.shard_file = f'{self.prefix}-{index:06d}.tar'
+        self._tar = open(self.shard_file, 'wb')
+        self._index = open(self.shard_file[:-4] + '.idx', 'w')
+        self.count = 0
+        self.offset = 0
+
+    def _add_file(self, name: str, path: str):
+        size = os.stat(path)[6]
+        self._tar.write(tar_header(name, size))
+        self.offset += tar_block_size
+        self._index.write(f'{name} {self.offset} {size}\n')
+        buffer = memoryview(self._buffer)
+        with open(path, 'rb') as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                self._tar.write(buffer[:n])
+        padding = -size % tar_block_size
+        if padding:
+            self._tar.write(bytes(padding))
+        self.offset += size + padding
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ShardReader:
+    """
+    Random access reader of a single shard written by `ShardWriter`.
+
+    Samples are accessed by position (`reader[k]`) or key (`reader['000042']`) and returned as a dictionary of extension (e.g. `jpg`, `txt`) to file content.
+    If the index file of the shard is missing, the member offsets are read from the tar headers once.
+
+    **Object Attributes:**
+    - `shard_file` The path of the shard.
+    - `members` A dictionary of member name to `(offset, size)` of its data.
+    - `samples` A dictionary of sample key to the names of its members.
+    - `keys` The sample keys in the order of the shard.
+    """
+    def __init__(self, shard_file: str):
+        self.shard_file = shard_file
+        self.members = {}
+        self.samples = {}
+        self.keys = []
+        index_file = shard_file[:-4] + '.idx' if shard_file.endswith('.tar') else shard_file + '.idx'
+        try:
+            with open(index_file, 'r') as f:
+                entries = [line.split() for line in f if line.strip()]
+            entries = [(name, int(offset), int(size)) for name, offset, size in entries]
+        except OSError:
+            entries = self._scan()
+        for name, offset, size in entries:
+            self.members[name] = (offset, size)
+            key = name[:name.rfind('.')]
+            if key not in self.samples:
+                self.samples[key] = []
+                self.keys.append(key)
+            self.samples[key].append(name)
+        self._file = open(shard_file, 'rb')
+
+    def _scan(self) -> list:
+        entries = []
+        with open(self.shard_file, 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(tar_block_size)
+                if len(header) < tar_block_size or header == bytes(tar_block_size):
+                    break
+                name = header[0:100].split(b'\0')[0].decode()
+                size = int(header[124:136].split(b'\0')[0].strip() or b'0', 8)
+                offset += tar_block_size
+                entries.append((name, offset, size))
+                offset += size + (-size % tar_block_size)
+                f.seek(offset)
+        return entries
+
+    def read(self, name: str) -> bytes:
+        """
+        **Params:**
+        - `name` The name of the member, e.g. `000042.jpg`.
+
+        **Returns:**
+        - `bytes` The content of the member.
+        """
+        offset, size = self.members[name]
+        self._file.seek(offset)
+        return self._file.read(size)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, sample) -> dict:
+        key = self.keys[sample] if isinstance(sample, int) else sample
+        return {name[name.rfind('.') + 1:]: self.read(name) for name in self.samples[key]}
+
+    def close(self):
+        """Close the shard file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
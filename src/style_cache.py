@@ -0,0 +1,108 @@
+"""
+A cache of LVGL style objects, which outlives single samples.
+
+Style objects are interned by a key of their resolved properties, so identical styles are created only once and shared by all widgets using them.
+Styles used by the current sample are pinned. When a sample is done (its widgets are deleted), the pins are released and the least recently used styles are evicted
+until the estimated LVGL heap usage of the cached styles is within the memory budget. Evicted styles are reset, which frees their property memory in the LVGL heap.
+This bounds the memory held by styles in long batch runs, which LVGL allocates from the C library heap (`LV_STDLIB_CLIB` in `lv_conf.h`) and never returns otherwise.
+
+The cache pays off for the design mode, whose styles are the same for every sample. The random mode draws colors, sizes and property sets
+from wide ranges, so its styles almost never repeat: they are interned as well, but the cache only bounds their memory and the hit rate stays near zero.
+"""
+from collections import OrderedDict
+
+style_base_size = 16
+"""The estimated LVGL heap usage of a style with properties (allocation overhead) in bytes"""
+
+style_property_size = 9
+"""The estimated LVGL heap usage of a single style property (value and property ID) in bytes"""
+
+class StyleCache:
+    """
+    An LRU cache of style objects with a memory budget.
+
+    **Object Attributes:**
+    - `budget` The memory budget of the cached styles in bytes (estimated LVGL heap usage).
+    - `size` The estimated LVGL heap usage of all cached styles in bytes.
+    - `styles` An ordered dictionary of key to `(style, size)`, ordered from least to most recently used.
+    - `pinned` A set of the keys used by the current sample, which are not evicted.
+    - `hits` The amount of lookups answered from the cache.
+    - `misses` The amount of created styles.
+    - `evictions` The amount of evicted styles.
+    """
+    def __init__(self, budget: int = 262144):
+        self.budget = budget
+        self.size = 0
+        self.styles = OrderedDict()
+        self.pinned = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, create, property_count: int):
+        """
+        **Params:**
+        - `key` A hashable key of the resolved style properties.
+        - `create` A function, which is called with the key to create the style object if it is not cached.
+        - `property_count` The amount of properties of the style, used to estimate its memory usage.
+
+        **Returns:**
+        - `lv.style_t` The cached or created style object, which is pinned until `release` is called.
+        """
+        if key in self.styles:
+            entry = self.styles.pop(key) # NOTE Re-insert to mark as most recently used
+            self.styles[key] = entry
+            self.hits += 1
+        else:
+            entry = (create(key), style_base_size + style_property_size * property_count)
+            self.styles[key] = entry
+            self.size += entry[1]
+            self.misses += 1
+        self.pinned.add(key)
+        return entry[0]
+
+    def release(self) -> int:
+        """
+        **Returns:**
+        - `int` The amount of evicted styles.
+
+        Release the pins of the current sample and evict the least recently used styles until the cache is within its memory budget.
+        Must only be called after all widgets of the sample are deleted.
+        """
+        self.pinned = set()
+        return self.evict(self.budget)
+
+    def evict(self, budget: int) -> int:
+        """
+        **Params:**
+        - `budget` The memory budget to evict to in bytes.
+
+        **Returns:**
+        - `int` The amount of evicted styles.
+
+        Evict the least recently used styles which are not pinned until the estimated memory usage is within the budget.
+        """
+        evictions = self.evictions
+        if self.size <= budget:
+            return 0
+        for key in [key for key in self.styles if key not in self.pinned]:
+            if self.size <= budget:
+                break
+            style, size = self.styles.pop(key)
+            style.reset()
+            self.size -= size
+            self.evictions += 1
+        return self.evictions - evictions
+
+    def clear(self) -> int:
+        """Evict all styles which are not pinned and return the amount of evicted styles."""
+        return self.evict(0)
+
+    def __len__(self):
+        return len(self.styles)
+
+    def __str__(self):
+        return f'StyleCache({len(self.styles)} styles, {self.size}/{self.budget} bytes, {self.hits} hits, {self.misses} misses, {self.evictions} evictions)'
+
+default_style_cache = StyleCache()
+"""The style cache shared by all generators (`RandomUI` and `UiLoader`) of the process"""
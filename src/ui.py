@@ -1,33 +1,81 @@
-class UI(dict):
+import sys
+if sys.implementation.name == "micropython":
+    from array import array
+    from class_registry import class_names
+else:
+    from array import array
+    from .class_registry import class_names
+
+box_fields = 5
+"""The amount of values per object in the box array: class ID, center x, center y, width and height"""
+
+class UI:
     """
-    Custom dictionary class for UI metadata.
+    Compact annotation store of a sample: the bounding boxes of all annotated objects in a flat integer array.
+
+    The objects are validated when they are added, so the array can be written by the YOLO writers without further checks (see `yolo.py`).
+    The array is allocated once for `capacity` objects (a negative capacity raises a `ValueError`) and grown when a sample has more objects,
+    a generator re-uses its annotation store for every sample (see `clear`).
 
-    **Keys:**
-    - `width`: Width of the UI.
-    - `height`: Height of the UI.
-    - `count`: Number of objects in the UI.
-    - `objects`: List of objects in the UI.
+    **Object Attributes:**
+    - `width` Width of the UI.
+    - `height` Height of the UI.
+    - `count` Number of annotated objects in the UI.
+    - `boxes` Box array of the objects (`array('i')`), holding `box_fields` values per object.
     """
-    def __init__(self):
-        super().__init__()
-        self['count'] = 0
-        self['objects'] = []
+    __slots__ = ('width', 'height', 'count', 'boxes')
+    def __init__(self, width: int = 0, height: int = 0, capacity: int = 64):
+        if capacity < 0:
+            raise ValueError(f'Invalid capacity: {capacity} (must not be negative)')
+        self.width = width
+        self.height = height
+        self.count = 0
+        self.boxes = array('i', [0] * (capacity * box_fields))
+
+    def clear(self):
+        """Remove all objects, keeping the allocated box array."""
+        self.count = 0
+
+    def add(self, class_id: int, x: int, y: int, width: int, height: int):
+        """
+        **Params:**
+        - `class_id` The class ID of the object (see `class_registry`).
+        - `x` The x-coordinate of the center of the bounding box.
+        - `y` The y-coordinate of the center of the bounding box.
+        - `width` The width of the bounding box.
+        - `height` The height of the bounding box.
+
+        **Raises:**
+        - `ValueError` If the class ID is unknown or the size is negative.
 
-    def verify_objects(self):
+        Add an object to the box array.
         """
-        **Raises**:
-        - `KeyError` If any object is missing a required key.
+        if class_id < 0 or class_id >= len(class_names):
+            raise ValueError(f'Invalid class ID: {class_id} (must be in the range 0-{len(class_names) - 1})')
+        if width < 0 or height < 0:
+            raise ValueError(f'Invalid bounding box size: {width}x{height}')
+        boxes = self.boxes
+        offset = self.count * box_fields
+        if offset + box_fields > len(boxes):
+            boxes.extend([0] * max(len(boxes), box_fields * 16)) # NOTE Grows from an empty array as well
+        boxes[offset] = class_id
+        boxes[offset + 1] = x
+        boxes[offset + 2] = y
+        boxes[offset + 3] = width
+        boxes[offset + 4] = height
+        self.count += 1
 
-        Verify that all objects have the required keys.
+    def box(self, index: int) -> tuple:
         """
-        for obj in self['objects']:
-            if 'x' not in obj:
-                raise KeyError(f'"x" not found in object: {obj}')
-            if 'y' not in obj:
-                raise KeyError(f'"y" not found in object: {obj}')
-            if 'width' not in obj:
-                raise KeyError(f'"width" not found in object: {obj}')
-            if 'height' not in obj:
-                raise KeyError(f'"height" not found in object: {obj}')
-            if 'class' not in obj:
-                raise KeyError(f'"class" not found in object: {obj}')
\ No newline at end of file
+        **Params:**
+        - `index` The index of the object.
+
+        **Returns:**
+        - `tuple` The class ID, center x, center y, width and height of the object.
+        """
+        offset = index * box_fields
+        boxes = self.boxes
+        return boxes[offset], boxes[offset + 1], boxes[offset + 2], boxes[offset + 3], boxes[offset + 4]
+
+    def __repr__(self):
+        return f'UI({self.width}x{self.height}, {[self.box(i) for i in range(self.count)]})'
@@ -0,0 +1,155 @@
+"""
+A client to drive generator processes running in server mode (`-m server`) from CPython.
+
+The generator keeps the micropython interpreter, the LVGL context and the display driver alive between jobs,
+which removes the process startup cost from every generated sample.
+
+The request/response protocol is documented in `main.serve`.
+
+The module also contains a stand-in worker, which speaks the same protocol without LVGL.
+It can be used to test orchestration code in CPython:
+
+```shell
+python -m src.worker_client --stand-in
+```
+"""
+
+import json
+import os
+import subprocess
+import sys
+from .global_definitions import server_result_prefix
+from .class_registry import class_id
+from .yolo import label_file_for
+
+class GeneratorWorker:
+    """
+    A long-lived generator process, which is fed with jobs over stdin.
+
+    **Object Attributes:**
+    - `command` The command used to start the worker process.
+    - `process` The worker process.
+    - `diagnostics` A list of diagnostic output lines of the worker since the last job was submitted.
+    """
+    def __init__(self, command: list[str], cwd: str = None):
+        self.command = command
+        self.process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.diagnostics = []
+
+    @classmethod
+    def micropython(cls, micropython: str, main: str, width: int = 640, height: int = 640, cwd: str = None):
+        """
+        **Params:**
+        - `micropython` The path to the micropython binary.
+        - `main` The path to the `main.py` of the generator.
+        - `width` The width of the display.
+        - `height` The height of the display.
+        - `cwd` The working directory of the worker process.
+
+        **Returns:**
+        - `GeneratorWorker` A worker running the generator in server mode.
+        """
+        return cls([micropython, main, '-m', 'server', '-W', str(width), '-H', str(height)], cwd=cwd)
+
+    @classmethod
+    def stand_in(cls, cwd: str = None):
+        """
+        **Params:**
+        - `cwd` The working directory of the worker process.
+
+        **Returns:**
+        - `GeneratorWorker` A worker running the stand-in server of this module.
+        """
+        return cls([sys.executable, '-m', 'src.worker_client', '--stand-in'], cwd=cwd)
+
+    def submit(self, job: dict) -> dict:
+        """
+        **Params:**
+        - `job` The job object (see `main.serve` for the supported keys).
+
+        **Returns:**
+        - `dict` The result object of the job.
+
+        **Raises:**
+        - `RuntimeError` If the worker exited before answering the job.
+
+        Send a job to the worker and wait for its result. Diagnostic output of the worker is collected in `diagnostics`.
+        """
+        self.diagnostics = []
+        self.process.stdin.write(json.dumps(job) + '\n')
+        self.process.stdin.flush()
+        for line in self.process.stdout:
+            if line.startswith(server_result_prefix):
+                return json.loads(line[len(server_result_prefix):])
+            self.diagnostics.append(line.rstrip('\n'))
+        raise RuntimeError(f"Worker exited with code {self.process.wait()} before answering job: {job}")
+
+    def close(self, timeout: float = 10):
+        """
+        **Params:**
+        - `timeout` The time in seconds to wait for the worker to exit before it is killed.
+
+        Shut down the worker process.
+        """
+        if self.process.poll() is None:
+            try:
+                self.submit({'mode': 'shutdown'})
+            except (RuntimeError, BrokenPipeError):
+                pass
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stand_in_server(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    **Params:**
+    - `stdin` The stream to read jobs from.
+    - `stdout` The stream to write results (and diagnostic output) to.
+
+    A stand-in for the generator server, which follows the protocol of `main.serve` without LVGL.
+    Instead of rendering, it writes an empty output file and an annotation with one pixel bounding box per requested widget, labeled with the class ID of the widget type like the generator (see `class_registry`).
+    """
+    def result(obj):
+        stdout.write(server_result_prefix + json.dumps(obj) + '\n')
+        stdout.flush()
+
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        stdout.write(f'Stand-in received job: {line}\n')
+        job_id = None
+        try:
+            job = json.loads(line)
+            job_id = job.get('id', None)
+            if job.get('mode', None) == 'shutdown':
+                result({'id': job_id, 'status': 'ok'})
+                break
+            if job.get('mode', None) not in ('random', 'design'):
+                raise ValueError(f"Invalid job mode: {job.get('mode', None)}")
+            output_file = job['output_file']
+            label_file = label_file_for(output_file)
+            count = job['widget_count'] if job['mode'] == 'random' else 0
+            if job['mode'] == 'design' and not os.path.exists(job['file']):
+                raise OSError(f"Design file not found: {job['file']}")
+            open(output_file, 'wb').close()
+            widget_types = job.get('widget_types', [])
+            with open(label_file, 'w') as f:
+                f.writelines(f"{class_id(widget_types[i % len(widget_types)])} 0 0 1 1\n" for i in range(count))
+            result({'id': job_id, 'status': 'ok', 'output_file': output_file, 'label_file': label_file, 'count': count})
+        except Exception as e:
+            result({'id': job_id, 'status': 'error', 'error': f'{type(e).__name__}: {e}'})
+
+if __name__ == '__main__':
+    if '--stand-in' in sys.argv:
+        stand_in_server()
+    else:
+        print(__doc__)
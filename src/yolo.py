@@ -5,21 +5,71 @@ pdoc['write_yolo_pixel'] = """
 - `ui` The UI object.
 - `output_file` The file path to save the YOLO .txt file to.
 
-This function writes the .txt file in the YOLO format using pixel values, with the widget's bounding boxes and class labels.
+This function writes the .txt file in the YOLO format using pixel values, with the widget's bounding boxes and class IDs (see `class_registry`) read from the box array of the UI.
+"""
+pdoc['format_yolo'] = """
+**Params:**
+- `ui` The UI object.
+- `width` The width the bounding boxes are normalized to, pixel values are formatted if not provided.
+- `height` The height the bounding boxes are normalized to.
+
+**Returns:**
+- `str` The YOLO annotation of the UI, one line per widget.
 """
 pdoc['write_yolo_normalized'] = """
 **Params:**
 - `ui` The UI object.
 - `output_file` The file path to save the YOLO .txt file to.
+- `width` The width of the UI.
+- `height` The height of the UI.
 
-This function writes the .txt file in the YOLO format using normalized values, with the widget's bounding boxes and class labels.
+This function writes the .txt file in the YOLO format using normalized values, with the widget's bounding boxes and class IDs (see `class_registry`) read from the box array of the UI.
 """
 
 import sys
 if sys.implementation.name == "micropython":
-    from ui import UI
+    import json
+    from ui import UI, box_fields
 else:
-    from .ui import UI
+    import json
+    from .ui import UI, box_fields
+
+def label_file_for(output_file: str) -> str:
+    """
+    **Params:**
+    - `output_file` The file path of the screenshot.
+
+    **Returns:**
+    - `str` The file path of the YOLO .txt file, which is the screenshot path with its extension replaced by `.txt`.
+    """
+    dot = output_file.rfind('.')
+    if dot <= output_file.rfind('/'):
+        return output_file + '.txt'
+    return output_file[:dot] + '.txt'
+
+def format_yolo(ui: UI, width: int = None, height: int = None) -> str:
+    """
+    **Params:**
+    - `ui` The UI object.
+    - `width` The width the bounding boxes are normalized to, pixel values are formatted if not provided.
+    - `height` The height the bounding boxes are normalized to.
+
+    **Returns:**
+    - `str` The YOLO annotation of the UI, one line per widget.
+
+    Format the bounding boxes and class IDs (see `class_registry`) of the box array of the UI as YOLO annotation.
+    The normalized values are computed into the lines of the annotation, the box array of the UI is not modified.
+    """
+    boxes = ui.boxes
+    lines = []
+    if width is None:
+        for i in range(0, ui.count * box_fields, box_fields):
+            lines.append(f"{boxes[i]} {boxes[i + 1]} {boxes[i + 2]} {boxes[i + 3]} {boxes[i + 4]}\n")
+    else:
+        width, height = float(width), float(height)
+        for i in range(0, ui.count * box_fields, box_fields):
+            lines.append(f"{boxes[i]} {boxes[i + 1] / width} {boxes[i + 2] / height} {boxes[i + 3] / width} {boxes[i + 4] / height}\n")
+    return ''.join(lines)
 
 def write_yolo_pixel(ui: UI, output_file: str):
     """
@@ -27,30 +77,75 @@ def write_yolo_pixel(ui: UI, output_file: str):
     - `ui` The UI object.
     - `output_file` The file path to save the YOLO .txt file to.
 
-    This function writes the .txt file in the YOLO format using pixel values, with the widget's bounding boxes and class labels.
+    This function writes the .txt file in the YOLO format using pixel values, with the widget's bounding boxes and class IDs (see `class_registry`) read from the box array of the UI.
+    The annotation is written in a single call (see `format_yolo`).
     """
-    ui.verify_objects()
     with open(output_file, 'w') as f:
-        for widget in ui['objects']:
-            x, y, w, h = widget['x'], widget['y'], widget['width'], widget['height']
-            f.write(f"{widget['class']} {x} {y} {w} {h}\n")
+        f.write(format_yolo(ui))
 
 def write_yolo_normalized(ui: UI, output_file: str, width: int, height: int):
     """
     **Params:**
     - `ui` The UI object.
     - `output_file` The file path to save the YOLO .txt file to.
+    - `width` The width of the UI.
+    - `height` The height of the UI.
 
-    This function writes the .txt file in the YOLO format using normalized values, with the widget's bounding boxes and class labels.
+    This function writes the .txt file in the YOLO format using normalized values, with the widget's bounding boxes and class IDs (see `class_registry`) read from the box array of the UI.
+    The annotation is written in a single call (see `format_yolo`), the UI is not modified.
     """
-    ui.verify_objects()
-    for widget in ui['objects']:
-        print(f"X: {widget['x']} ({type(widget['x'])}), Y: {widget['y']} ({type(widget['y'])}), Width: {widget['width']} ({type(widget['width'])}), Height: {widget['height']} ({type(widget['height'])})")
-        widget['x'] = float(widget['x']) / float(width)
-        widget['y'] = float(widget['y']) / float(height)
-        widget['width'] = float(widget['width']) / float(width)
-        widget['height'] = float(widget['height']) / float(height)
     with open(output_file, 'w') as f:
-        for widget in ui['objects']:
-            x, y, w, h = widget['x'], widget['y'], widget['width'], widget['height']
-            f.write(f"{widget['class']} {x} {y} {w} {h}\n")
+        f.write(format_yolo(ui, width, height))
+
+class LabelManifest:
+    """
+    A dataset-level label file, which holds the YOLO annotations of all samples of a run instead of one `.txt` file per sample.
+
+    The manifest is a JSON Lines file with one object per sample: `{"index": <sample index>, "image": <screenshot>, "labels": <YOLO annotation>}`,
+    where `labels` is the content the `.txt` file of the sample would have. The file is opened once and the lines are buffered in memory
+    and written in a single call every `buffer_samples` samples, which saves opening and writing a file per sample.
+    The entries are appended to an existing manifest, so several runs (e.g. of consecutive sample ranges) can write into the same manifest.
+
+    **Object Attributes:**
+    - `output_file` The file path of the manifest.
+    - `normalize` Whether the bounding boxes are normalized.
+    - `buffer_samples` The amount of samples, which are buffered before they are written.
+    - `count` The amount of added samples.
+    """
+    def __init__(self, output_file: str, normalize: bool = False, buffer_samples: int = 64):
+        self.output_file = output_file
+        self.normalize = normalize
+        self.buffer_samples = buffer_samples
+        self.count = 0
+        self._lines = []
+        self._file = open(output_file, 'a')
+
+    def add(self, ui: UI, index: int, image_file: str):
+        """
+        **Params:**
+        - `ui` The UI object of the sample.
+        - `index` The index of the sample.
+        - `image_file` The file path (or shard member name) of the screenshot of the sample.
+
+        Append the annotation of a sample to the manifest.
+        """
+        labels = format_yolo(ui, ui.width, ui.height) if self.normalize else format_yolo(ui)
+        self._lines.append(json.dumps({'index': index, 'image': image_file, 'labels': labels}) + '\n')
+        self.count += 1
+        if len(self._lines) >= self.buffer_samples:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered lines to the manifest."""
+        if self._lines:
+            self._file.write(''.join(self._lines))
+            self._lines = []
+
+    def close(self):
+        """Write the buffered lines and close the manifest."""
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        print(f'Manifest {self.output_file} closed ({self.count} samples)')
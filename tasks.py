@@ -1,23 +1,30 @@
 from invoke import task
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
 import os
 import subprocess
+import time
+from src.class_registry import write_class_names
 
 lv_micropython_dir = os.path.join(os.path.curdir, 'lv_micropython')
 micropython = os.path.join(os.path.curdir, 'lv_micropython', 'ports', 'unix', 'build-standard', 'micropython')
 main = os.path.join(os.path.curdir, 'src', 'main.py')
 jpg_conversion = os.path.join(os.path.curdir, 'src', 'bin_to_jpg_conversion.py')
+crop_extractor = os.path.join(os.path.curdir, 'src', 'crop_extractor.py')
+benchmark_script = os.path.join(os.path.curdir, 'src', 'benchmark.py')
 lv_conf_project = os.path.join(os.path.curdir, 'lv_conf.h')
 lv_conf_original = os.path.join(os.path.curdir, 'lv_micropython', 'lib', 'lv_bindings', 'lv_conf.h')
 lv_conf_temp = os.path.join(os.path.curdir, 'lv_conf.tmp')
 
 @task
-def generate_random(ctx, widget_list: str = 'arc bar button buttonmatrix calendar checkbox dropdown label roller scale slider spinbox switch table textarea', width: int = 640, height: int = 640, count: int = 4, layout: str = 'none', output: str = 'screenshot.jpg', normalize: bool = True, random_state: bool = False):
+def generate_random(ctx, widget_list: str = 'arc bar button buttonmatrix calendar checkbox dropdown label roller scale slider spinbox switch table textarea', width: int = 640, height: int = 640, count: int = 4, layout: str = 'none', output: str = 'screenshot.jpg', normalize: bool = True, random_state: bool = False, batch: int = 1):
     """
     Call the LVGL UI Generator v2 with the specified parameters.
     By default, the generator will generate 4 random widgets (type list includes all implemented types) in a window with a width and height of 640x640 pixels using layout 'none'.
     (with normalize enabled and output file set to 'screenshot.jpg')
+    Use `batch` to generate multiple samples in a single generator run (output files are numbered).
     """
-    args = [micropython, main, '-m', 'random', '-W', str(width), '-H', str(height), '-c', str(count), '-o', output, '-l', layout]
+    args = [micropython, main, '-m', 'random', '-W', str(width), '-H', str(height), '-c', str(count), '-o', output, '-l', layout, '--samples', str(batch)]
     args.append('-t')
     for widget in widget_list.split(' '):
         args.append(widget)
@@ -28,23 +35,163 @@ def generate_random(ctx, widget_list: str = 'arc bar button buttonmatrix calenda
     subprocess.run(args)
 
 @task
-def generate_design(ctx, design_file: str ='designs/widgets_showcase.json', output: str = 'screenshot.jpg', normalize: bool = True):
+def generate_design(ctx, design_file: str ='designs/widgets_showcase.json', output: str = 'screenshot.jpg', normalize: bool = True, batch: int = 1):
     """
     Call the LVGL UI Generator v2 with the specified parameters.
     By default, the generator will generate a screenshot of the widgets_showcase.json design file with normalize enabled and output file set to 'screenshot.jpg'.
+    Use `batch` to generate multiple samples in a single generator run (output files are numbered).
     """
     if not os.path.exists(design_file):
         print(f"Design file {design_file} does not exist.")
         return
-    args = [micropython, main, '-m', 'design', '-f', design_file, '-o', output]
+    args = [micropython, main, '-m', 'design', '-f', design_file, '-o', output, '--samples', str(batch)]
     if normalize:
         args.append('--normalize')
     subprocess.run(args)
 
+def dataset_shard_command(shard_dir: str, start: int, count: int, seed: int, mode: str, widget_list: str, width: int, height: int, widget_count: int, layout: str, design_file: str, normalize: bool, image_format: str = 'jpg', tar: bool = False, pipeline: int = 0, manifest: bool = False):
+    """Create the generator command line for a single shard of a dataset."""
+    args = [micropython, main, '-m', mode, '-o', os.path.join(shard_dir, f'sample.{image_format}'), '--samples', str(count), '--start-index', str(start), '--seed', str(seed)]
+    if mode == 'random':
+        args += ['-W', str(width), '-H', str(height), '-c', str(widget_count), '-l', layout, '-t'] + widget_list.split(' ')
+    else:
+        args += ['-f', design_file]
+    if normalize:
+        args.append('--normalize')
+    if tar:
+        args += ['--shard', os.path.join(shard_dir, 'samples'), '--shard-size', str(count)]
+    if pipeline:
+        args += ['--pipeline', str(pipeline)]
+    if manifest:
+        args += ['--manifest', os.path.join(shard_dir, 'labels.jsonl')]
+    return args
+
+@task
+def generate_dataset(ctx, samples: int = 1000, workers: int = 0, shard_size: int = 250, output_dir: str = 'dataset', seed: int = 0, mode: str = 'random', widget_list: str = 'arc bar button buttonmatrix calendar checkbox dropdown label roller scale slider spinbox switch table textarea', width: int = 640, height: int = 640, count: int = 4, layout: str = 'none', design_file: str = 'designs/widgets_showcase.json', normalize: bool = True, image_format: str = 'jpg', tar: bool = False, pipeline: int = 0, manifest: bool = False):
+    """
+    Generate a dataset of `samples` screenshots and annotations using a pool of generator processes.
+    By default, one worker process is used per CPU core.
+    The sample budget is split into shards of `shard_size` samples, which are queued and picked up by the workers.
+    Each shard covers its own range of sample indices (and thus seeds) and is written to its own directory (`<output_dir>/shard_XXXXX`).
+    The class names of the class IDs in the annotations are written to `<output_dir>/classes.txt` (see `src/class_registry.py`).
+    Completed shards are recorded in `<output_dir>/progress.json`, so an interrupted run continues with the remaining shards when started again with the same parameters.
+    Use `image_format` to write lossless `png` or raw `npy` screenshots instead of `jpg`.
+    Use `tar` to write the samples of each shard into a single tar file with an index (see `src/shards.py`) instead of two files per sample.
+    Use `pipeline` to write the screenshots of each generator process by a worker thread with this number of snapshot buffers (see `src/encode_pipeline.py`).
+    Use `manifest` to write the annotations of each shard into a single JSON Lines file (`<output_dir>/shard_XXXXX/labels.jsonl`, see `src/yolo.py`) instead of one file per sample.
+    """
+    if mode not in ('random', 'design'):
+        print(f"Invalid mode {mode} (valid options: random, design).")
+        return
+    if image_format not in ('jpg', 'png', 'npy'):
+        print(f"Invalid image format {image_format} (valid options: jpg, png, npy).")
+        return
+    if mode == 'design' and not os.path.exists(design_file):
+        print(f"Design file {design_file} does not exist.")
+        return
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    config = {'samples': samples, 'shard_size': shard_size, 'seed': seed, 'mode': mode, 'widget_list': widget_list, 'width': width, 'height': height, 'count': count, 'layout': layout, 'design_file': design_file, 'normalize': normalize, 'image_format': image_format, 'tar': tar, 'manifest': manifest}
+    progress_file = os.path.join(output_dir, 'progress.json')
+    progress = {'config': config, 'completed': []}
+    os.makedirs(output_dir, exist_ok=True)
+    if os.path.exists(progress_file):
+        with open(progress_file, 'r') as f:
+            progress = json.load(f)
+        if progress['config'] != config:
+            print(f"Existing dataset in {output_dir} was generated with different parameters: {progress['config']}")
+            return
+    write_class_names(os.path.join(output_dir, 'classes.txt'))
+    completed = set(progress['completed'])
+    shards = [(shard, start, min(shard_size, samples - start)) for shard, start in enumerate(range(0, samples, shard_size)) if shard not in completed]
+    remaining = sum(shard_count for _, _, shard_count in shards)
+    print(f"Generating {remaining} of {samples} samples in {len(shards)} shards using {workers} workers ({samples - remaining} samples already completed).")
+
+    def run_shard(shard: int, start: int, shard_count: int):
+        shard_dir = os.path.join(output_dir, f'shard_{shard:05d}')
+        os.makedirs(shard_dir, exist_ok=True)
+        manifest_file = os.path.join(shard_dir, 'labels.jsonl')
+        if manifest and os.path.exists(manifest_file):
+            os.remove(manifest_file) # NOTE The manifest is appended to, the entries of a failed attempt of the shard are discarded
+        args = dataset_shard_command(shard_dir, start, shard_count, seed, mode, widget_list, width, height, count, layout, design_file, normalize, image_format, tar, pipeline, manifest)
+        with open(os.path.join(shard_dir, 'generator.log'), 'w') as log:
+            return subprocess.run(args, stdout=log, stderr=subprocess.STDOUT).returncode
+
+    generated = 0
+    failed = []
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_shard, *shard): shard for shard in shards}
+        for future in as_completed(futures):
+            shard, start, shard_count = futures[future]
+            if future.result() != 0:
+                failed.append(shard)
+                print(f"Shard {shard} (samples {start}-{start + shard_count - 1}) failed, see shard_{shard:05d}/generator.log")
+                continue
+            progress['completed'].append(shard)
+            with open(progress_file + '.tmp', 'w') as f:
+                json.dump(progress, f)
+            os.replace(progress_file + '.tmp', progress_file) # NOTE Atomic, an interrupted run never leaves a truncated progress file
+            generated += shard_count
+            elapsed = time.monotonic() - start_time
+            print(f"Shard {shard} done: {generated}/{remaining} samples, {generated / elapsed:.2f} samples/s")
+    elapsed = time.monotonic() - start_time
+    print(f"Generated {generated} samples in {elapsed:.1f}s ({generated / elapsed if elapsed > 0 else 0:.2f} samples/s).")
+    if failed:
+        print(f"{len(failed)} shards failed: {sorted(failed)}. Run the task again to retry them.")
+
 @task
-def convert(ctx, width='640', height='640', input='screenshot.bin', output='screenshot.jpg'):
-    """Convert a screenshot binary dump to a JPEG image."""
-    subprocess.run(['poetry', 'run', 'python', jpg_conversion, '-W', width, '-H', height, '-i', input, '-o', output])
+def check_server(ctx, stand_in: bool = True, jobs: int = 4, output_dir: str = 'server_check'):
+    """
+    Check the server mode protocol by submitting a few random and design jobs to a single worker process.
+    By default, the stand-in worker of `src/worker_client.py` is used, which does not require the micropython binary.
+    Use `--no-stand-in` to check the actual generator.
+    """
+    from src.worker_client import GeneratorWorker
+    os.makedirs(output_dir, exist_ok=True)
+    worker = GeneratorWorker.stand_in() if stand_in else GeneratorWorker.micropython(micropython, main)
+    failed = 0
+    start_time = time.monotonic()
+    with worker:
+        for i in range(jobs):
+            job = {'id': i, 'mode': 'random', 'output_file': os.path.join(output_dir, f'random_{i}.jpg'), 'widget_count': 4, 'widget_types': ['button', 'slider', 'switch'], 'seed': i, 'normalize': True}
+            if i % 2 == 1:
+                job = {'id': i, 'mode': 'design', 'output_file': os.path.join(output_dir, f'design_{i}.jpg'), 'file': 'designs/widgets_showcase.json', 'seed': i}
+            result = worker.submit(job)
+            ok = result.get('status') == 'ok' and result.get('id') == i and os.path.exists(result['output_file']) and os.path.exists(result['label_file'])
+            failed += 0 if ok else 1
+            print(f"Job {i} ({job['mode']}): {'OK' if ok else 'FAILED'} {result}")
+        result = worker.submit({'id': 'invalid', 'mode': 'invalid'})
+        if result.get('status') != 'error' or result.get('id') != 'invalid':
+            failed += 1
+        print(f"Invalid job: {'OK' if result.get('status') == 'error' else 'FAILED'} {result}")
+    elapsed = time.monotonic() - start_time
+    print(f"{jobs + 1 - failed}/{jobs + 1} checks passed in {elapsed:.2f}s.")
+    if failed:
+        raise SystemExit(1)
+
+@task
+def convert(ctx, width='640', height='640', input='screenshot.bin', output='screenshot.jpg', pattern: str = None, output_dir: str = None):
+    """
+    Convert a screenshot binary dump to a JPEG image.
+    Use `pattern` to convert all binary dumps matching a glob pattern using a pool of worker processes (optionally into `output_dir`).
+    """
+    args = ['poetry', 'run', 'python', jpg_conversion, '-W', width, '-H', height, '-i', input, '-o', output]
+    if pattern:
+        args += ['-g', pattern]
+    if output_dir:
+        args += ['-d', output_dir]
+    subprocess.run(args)
+
+@task
+def extract_crops(ctx, pattern: str = 'dataset/*.npy', output_dir: str = 'crops', padding: int = 0, size: int = 0, width: int = 640, height: int = 640):
+    """
+    Extract every annotated widget of the screenshots matching a glob pattern as its own image (see `src/crop_extractor.py`).
+    The screenshots must be generated in crop mode (`--crops`). Use `size` to resample all crops to a square size (e.g. 64).
+    """
+    args = ['poetry', 'run', 'python', crop_extractor, '-g', pattern, '-o', output_dir, '-p', str(padding), '-W', str(width), '-H', str(height)]
+    if size:
+        args += ['-s', str(size)]
+    subprocess.run(args)
 
 @task
 def sample(ctx, type='button', count='1', width='420', height='320', layout='none', output='screenshot.jpg', normalize: bool = False):
@@ -68,7 +215,80 @@ def clear(ctx):
 
 @task
 def test(ctx):
-    ...
+    """
+    Run the unit tests of `tests`, which run in CPython with the mocked `lvgl` module and do not require the micropython binary.
+    """
+    ctx.run('python -m unittest discover tests')
+
+def compare_benchmarks(results: dict, baseline: dict, tolerance: float, min_ms: float) -> list:
+    """
+    Print the changes of a benchmark run compared to a baseline run and return the regressions.
+    Time metrics below `min_ms` in both runs are ignored, since their relative changes are dominated by noise.
+    """
+    regressions = []
+    print(f"{'workload':<32} {'metric':<18} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, workload in results['workloads'].items():
+        base = baseline.get('workloads', {}).get(name)
+        if base is None:
+            print(f"{name:<32} (not in baseline)")
+            continue
+        metrics = [('ms_per_sample', base['ms_per_sample'], workload['ms_per_sample'], True)]
+        if 'heap_peak' in base and 'heap_peak' in workload: # NOTE Only measured with the builtin LVGL allocator (see src/profiler.py)
+            metrics.append(('heap_peak', base['heap_peak'], workload['heap_peak'], False))
+        for stage in sorted(set(base['stages']) | set(workload['stages'])):
+            metrics.append((stage, base['stages'].get(stage, {}).get('ms_per_sample', 0), workload['stages'].get(stage, {}).get('ms_per_sample', 0), True))
+        for metric, old, new, is_time in metrics:
+            if is_time and old < min_ms and new < min_ms:
+                continue
+            change = (new - old) / old if old > 0 else 0
+            regressed = change > tolerance
+            print(f"{name:<32} {metric:<18} {old:>10.2f} {new:>10.2f} {change:>+8.1%}{' REGRESSION' if regressed else ''}")
+            if regressed:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+@task
+def benchmark(ctx, samples: int = 3, seed: int = 0, width: int = 640, height: int = 640, widget_counts: str = '1 10 50 200', layouts: str = 'none flex', designs: bool = True, output: str = 'benchmark.json', baseline: str = None, tolerance: float = 0.1, min_ms: float = 1.0):
+    """
+    Benchmark the generation pipeline with fixed-seed workloads and write the per-stage timings and peak LVGL heap as JSON (see `src/benchmark.py`).
+    The random workloads cover every combination of `widget_counts` and `layouts` (the grid layout is not implemented by the random mode).
+    Each design in `designs/` is benchmarked in its own generator process at its window size (use `--no-designs` to skip them).
+    Use `baseline` to compare the run to a stored result, the task fails if a metric is more than `tolerance` (relative) slower than the baseline.
+    """
+    runs = [('random', [micropython, benchmark_script, '-W', str(width), '-H', str(height), '-c'] + widget_counts.split(' ') + ['-l'] + layouts.split(' '))]
+    if designs:
+        for design_file in sorted(os.listdir('designs')):
+            if not design_file.endswith('.json'):
+                continue
+            with open(os.path.join('designs', design_file), 'r') as f:
+                window = json.load(f).get('ui', {}).get('window', {})
+            runs.append((design_file, [micropython, benchmark_script, '-W', str(window.get('width', width)), '-H', str(window.get('height', height)), '-f', os.path.join('designs', design_file)]))
+    results = {'samples': samples, 'seed': seed, 'driver_init_ms': {}, 'workloads': {}}
+    temp_output = output + '.tmp'
+    for name, args in runs:
+        print(f"Benchmark run: {name}")
+        process = subprocess.run(args + ['-s', str(samples), '--seed', str(seed), '-o', temp_output], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            print(f"Benchmark run {name} failed: {process.stderr.strip().splitlines()[-1] if process.stderr.strip() else process.returncode}")
+            continue
+        with open(temp_output, 'r') as f:
+            run = json.load(f)
+        os.remove(temp_output)
+        results['driver_init_ms'][f"{run['display'][0]}x{run['display'][1]}"] = run['driver_init_ms']
+        for workload, result in run['workloads'].items():
+            result['display'] = run['display']
+            results['workloads'][workload] = result
+            print(f"  {workload}: {result['ms_per_sample']:.1f} ms per sample, {result['widgets']:.1f} widgets, peak heap {result.get('heap_peak', 'n/a')} bytes")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results written to {output}")
+    if baseline:
+        with open(baseline, 'r') as f:
+            regressions = compare_benchmarks(results, json.load(f), tolerance, min_ms)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {tolerance:.0%} compared to {baseline}.")
+            raise SystemExit(1)
+        print(f"No regressions compared to {baseline}.")
 
 def run_and_print(cmd, cwd):
     """Run a subprocess and print the output to the console."""
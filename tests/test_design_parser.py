@@ -0,0 +1,135 @@
+"""
+Tests of the widget IDs of the design parser (`UiLoader` and `DesignTemplate`), run with the mocked `lvgl` module (see `src/mock`).
+
+Run from the project root: `python -m unittest discover tests` (or `invoke test`).
+"""
+import json
+import os
+import random
+import tempfile
+import unittest
+from src.design_parser import UiLoader
+from src.design_template import DesignTemplate
+from src.style_cache import StyleCache
+
+design = {
+    "ui": {
+        "window": {"width": 320, "height": 240},
+        "root": {
+            "id": "root",
+            "type": "container",
+            "options": {"layout_type": "flex", "layout_options": {"flow": "column"}},
+            "children": [
+                {"type": "button", "text": "Created"},
+                {"id": "button_0", "type": "button", "text": "Explicit"},
+                {"type": "button", "text": "Created"},
+                {"id": "button_2", "type": "button", "text": "Explicit"},
+                {"type": "random", "count": 6, "parent_id": "root", "widget_list": ["button", "label"]},
+                {"id": "label_1", "type": "label", "text": "Explicit"},
+                {
+                    "id": "row",
+                    "type": "container",
+                    "options": {"layout_type": "flex", "layout_options": {"flow": "row"}},
+                    "children": [{"type": "label", "text": "Nested"}]
+                }
+            ]
+        }
+    }
+}
+"""A design with explicit IDs, which would be the created IDs of unnamed widgets of the same type preceding them"""
+
+class RecordingIds:
+    """A mixin recording the IDs registered by a loader, in order of registration."""
+    def register_widget(self, id, widget_type: str, widget):
+        created = super().register_widget(id, widget_type, widget)
+        self.registered.append((created, id is None))
+        return created
+
+class RecordingUiLoader(RecordingIds, UiLoader):
+    pass
+
+class RecordingDesignTemplate(RecordingIds, DesignTemplate):
+    pass
+
+class TestWidgetIds(unittest.TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(design, f)
+            self.design_file = f.name
+
+    def tearDown(self):
+        os.remove(self.design_file)
+
+    def parse(self, loader, seed: int) -> list:
+        loader.registered = []
+        random.seed(seed)
+        loader.parse_ui()
+        return loader.registered
+
+    def assert_unique_ids(self, loader, registered: list):
+        ids = [id for id, created in registered]
+        created_ids = set(id for id, created in registered if created)
+        self.assertEqual(len(ids), len(set(ids)), f'Duplicate IDs: {ids}')
+        self.assertEqual(set(ids), set(loader.widgets))
+        self.assertFalse(created_ids & loader.reserved_ids, f'Created IDs collide with the reserved IDs: {created_ids & loader.reserved_ids}')
+        self.assertTrue(loader.reserved_ids <= set(ids))
+
+    def test_ui_loader_ids(self):
+        loader = RecordingUiLoader(self.design_file)
+        loader.initialize_screen(create_driver=False)
+        first = self.parse(loader, 1)
+        self.assert_unique_ids(loader, first)
+        self.assertEqual(self.parse(loader, 1), first, 'IDs of the same seed differ between parse_ui calls')
+        for seed in range(2, 10):
+            self.assert_unique_ids(loader, self.parse(loader, seed))
+
+    def test_design_template_ids(self):
+        template = RecordingDesignTemplate(self.design_file)
+        first = self.parse(template, 1)
+        self.assert_unique_ids(template, first)
+        self.assertEqual(self.parse(template, 1), first, 'IDs of the same seed differ between parse_ui calls')
+        for seed in range(2, 10):
+            self.assert_unique_ids(template, self.parse(template, seed))
+
+    def test_unreserved_explicit_id(self):
+        loader = UiLoader(self.design_file)
+        loader.reserved_ids = set()
+        with self.assertRaisesRegex(ValueError, "button_0"):
+            loader.register_widget("button_0", "button", object())
+
+class TestStyleKeys(unittest.TestCase):
+    def setUp(self):
+        self.design_files = []
+
+    def tearDown(self):
+        for design_file in self.design_files:
+            os.remove(design_file)
+
+    def template(self, width: int, height: int, style_cache: StyleCache) -> DesignTemplate:
+        styled = {"ui": {
+            "window": {"width": width, "height": height},
+            "styles": {"wide": {"width": 0.9, "bg_color": "#336699"}},
+            "root": {
+                "id": "root",
+                "type": "container",
+                "options": {"layout_type": "none"},
+                "style": "wide",
+                "children": [{"type": "button", "text": "Styled", "style": "wide"}]
+            }
+        }}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(styled, f)
+            self.design_files.append(f.name)
+        return DesignTemplate(f.name, style_cache)
+
+    def test_relative_sizes_per_window_size(self):
+        style_cache = StyleCache()
+        for width, height in ((320, 240), (640, 480), (320, 240)):
+            template = self.template(width, height, style_cache)
+            template.parse_ui()
+            template.cleanup()
+        self.assertEqual(style_cache.misses, 2, 'Styles with relative sizes are shared between window sizes')
+        self.assertEqual(len(style_cache), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests of the leak check of `heap_check` with the object count fallback (LVGL built with `LV_STDLIB_CLIB`), run with the mocked `lvgl` module (see `src/mock`).
+
+Run from the project root: `python -m unittest discover tests` (or `invoke test`).
+"""
+import types
+import unittest
+from unittest.mock import patch
+from src import heap_check
+from src.heap_check import check_heap, ScreenTracker
+
+class FakeObject:
+    """A stand-in of an LVGL object with children, which sends its delete event when deleted."""
+    def __init__(self, parent = None):
+        self.children = []
+        self.delete_callbacks = []
+        if parent is not None:
+            parent.children.append(self)
+
+    def get_child_count(self):
+        return len(self.children)
+
+    def get_child(self, index):
+        return self.children[index]
+
+    def add_event_cb(self, callback, event, user_data):
+        self.delete_callbacks.append(callback)
+
+    def delete(self):
+        for child in self.children:
+            child.delete()
+        self.children = []
+        for callback in self.delete_callbacks:
+            callback(None)
+
+class TestHeapCheck(unittest.TestCase):
+    def setUp(self):
+        # NOTE LVGL built with the C library allocator: lv.mem_monitor reports nothing
+        monitor = types.SimpleNamespace(total_size=0, free_size=0, used_cnt=0)
+        layers = (FakeObject(), FakeObject())
+        self.patches = [
+            patch.object(heap_check.lv, 'mem_monitor_t', return_value=monitor),
+            patch.object(heap_check.lv, 'layer_top', return_value=layers[0]),
+            patch.object(heap_check.lv, 'layer_sys', return_value=layers[1]),
+        ]
+        for p in self.patches:
+            p.start()
+        self.idle_screen = FakeObject()
+        self.tracker = ScreenTracker()
+        self.screens = []
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def create(self):
+        # A sample is created on a screen of its own, like `main.check_sample_heap`
+        screen = FakeObject()
+        self.tracker.track(screen)
+        for _ in range(5):
+            FakeObject(screen)
+        self.screens.append(screen)
+
+    def cleanup(self):
+        self.screens.pop().delete()
+
+    def check(self, cleanup):
+        return check_heap(self.create, cleanup, cycles=3, screens=[self.idle_screen], tracker=self.tracker)
+
+    def test_cleaned_up_samples(self):
+        result = self.check(self.cleanup)
+        self.assertEqual(result['measure'], 'objects')
+        self.assertEqual(result['leak'], 0)
+        self.assertFalse(self.tracker.live)
+
+    def test_skipped_cleanup(self):
+        with self.assertRaises(AssertionError):
+            self.check(lambda: None)
+        self.assertEqual(len(self.tracker.live), 4)
+
+if __name__ == '__main__':
+    unittest.main()